@@ -0,0 +1,197 @@
+import os
+import sys
+import json
+import time
+import zlib
+import sqlite3
+import asyncio
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from NovelpiaParser import parse_novel_page, PAGE_FOUND
+
+# --- Raw HTML Response Cache ---
+HTML_CACHE_FILE = "novelpia_html_cache.sqlite3"
+HTML_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024 # Compressed bytes kept before the oldest responses are evicted
+HTML_CACHE_EVICT_TO = 0.9 # Evict down to this fraction of the cap so eviction doesn't run on every write
+HTML_CACHE_VERSIONS_PER_ID = 1 # Fetches kept per novel (newest first)
+HTML_CACHE_COMPRESSION_LEVEL = 6
+HTML_CACHE_COMMIT_EVERY = 200
+REPARSE_BATCH_SIZE = 64 # Cached pages per process-pool task in reparse mode
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS html_cache (
+    id INTEGER NOT NULL,
+    fetched_at REAL NOT NULL,
+    size INTEGER NOT NULL,
+    body BLOB NOT NULL,
+    PRIMARY KEY (id, fetched_at)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_html_cache_fetched_at ON html_cache(fetched_at);
+CREATE TABLE IF NOT EXISTS cache_meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cache_meta (key, value) VALUES ('total_bytes', 0);
+CREATE TRIGGER IF NOT EXISTS html_cache_size_insert AFTER INSERT ON html_cache BEGIN
+    UPDATE cache_meta SET value = value + NEW.size WHERE key = 'total_bytes';
+END;
+CREATE TRIGGER IF NOT EXISTS html_cache_size_delete AFTER DELETE ON html_cache BEGIN
+    UPDATE cache_meta SET value = value - OLD.size WHERE key = 'total_bytes';
+END;
+"""
+
+class HtmlResponseCache(object):
+    """
+    Optional on-disk cache of raw page HTML, zlib-compressed and keyed by (novel ID, fetch time),
+    so pages can be re-parsed later without touching the network. A running byte total (kept by
+    triggers) enforces HTML_CACHE_MAX_BYTES by evicting the oldest fetches first.
+    """
+    def __init__(self, path=HTML_CACHE_FILE, max_bytes=HTML_CACHE_MAX_BYTES, versions_per_id=HTML_CACHE_VERSIONS_PER_ID):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.versions_per_id = versions_per_id
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(_SCHEMA)
+        self.connection.commit()
+        self._pending = []
+        self.evicted = 0
+
+    async def put(self, novel_id, html_content):
+        """Compresses (in a thread; zlib releases the GIL) and buffers one response."""
+        compressed = await asyncio.get_running_loop().run_in_executor(
+            None, zlib.compress, html_content.encode('utf-8'), HTML_CACHE_COMPRESSION_LEVEL
+        )
+        self._pending.append((int(novel_id), time.time(), len(compressed), compressed))
+        if len(self._pending) >= HTML_CACHE_COMMIT_EVERY:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO html_cache (id, fetched_at, size, body) VALUES (?, ?, ?, ?)", self._pending)
+            # Keep only the newest versions of each novel we just wrote
+            self.connection.executemany(
+                "DELETE FROM html_cache WHERE id = ? AND fetched_at NOT IN"
+                " (SELECT fetched_at FROM html_cache WHERE id = ? ORDER BY fetched_at DESC LIMIT ?)",
+                [(novel_id, novel_id, self.versions_per_id) for novel_id in {row[0] for row in self._pending}]
+            )
+        self._pending = []
+        self._evict_if_needed()
+
+    def total_bytes(self):
+        return self.connection.execute("SELECT value FROM cache_meta WHERE key = 'total_bytes'").fetchone()[0]
+
+    def _evict_if_needed(self):
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return
+        target = self.max_bytes * HTML_CACHE_EVICT_TO
+        with self.connection:
+            cursor = self.connection.execute("SELECT id, fetched_at, size FROM html_cache ORDER BY fetched_at")
+            doomed = []
+            for novel_id, fetched_at, size in cursor:
+                if total <= target:
+                    break
+                doomed.append((novel_id, fetched_at))
+                total -= size
+            self.connection.executemany("DELETE FROM html_cache WHERE id = ? AND fetched_at = ?", doomed)
+        self.evicted += len(doomed)
+
+    def iter_latest(self, start_id=0, end_id=None):
+        """Yields (id, compressed_html) for the newest cached fetch of every novel, in ID order."""
+        self.flush()
+        query = ("SELECT id, body FROM html_cache c WHERE id >= ? AND id <= ?"
+                 " AND fetched_at = (SELECT MAX(fetched_at) FROM html_cache WHERE id = c.id) ORDER BY id")
+        yield from self.connection.execute(query, (start_id, end_id if end_id is not None else sys.maxsize))
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+    def stats(self):
+        return {"total_bytes": self.total_bytes(), "max_bytes": self.max_bytes, "evicted": self.evicted}
+
+
+# --- Offline Re-parse ---
+def parse_cached_batch(rows, backend=None):
+    """Process-pool task: decompresses and parses a batch of (id, compressed_html) rows.
+    Returns a list of (novel_id_str, page_status, novel_data).
+    """
+    results = []
+    for novel_id, compressed in rows:
+        novel_id_str = f"{novel_id:06d}"
+        try:
+            page_status, novel_data = parse_novel_page(zlib.decompress(compressed).decode('utf-8'), novel_id_str, backend)
+        except Exception as e:
+            print(f"Error re-parsing cached page {novel_id_str}: {e}", file=sys.stderr)
+            page_status, novel_data = None, None
+        results.append((novel_id_str, page_status, novel_data))
+    return results
+
+def _batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def reparse_cache_to_jsonl(cache, output_file, cover_paths=None, backend=None, process_count=None, on_record=None):
+    """Regenerates `output_file` from the cache using every core and no network.
+    `cover_paths` maps an integer ID to its known cover_local_path (so covers on disk stay linked).
+    Records of the existing file whose pages are not in the cache are carried over unchanged.
+    `on_record(novel_id_str, page_status, novel_data)` is called for every parsed page; pages that fail
+    to parse are left out, so their records (and crawl state) stay as they were.
+    Returns (records_written_from_cache, records_carried_over).
+    """
+    cover_paths = cover_paths or {}
+    temp_file = output_file + ".tmp"
+    regenerated_ids = set()
+    written = 0
+    carried_over = 0
+    process_count = process_count or os.cpu_count() or 1
+    max_in_flight = process_count * 2 # Bounded so the cache is streamed, not loaded into memory
+
+    with ProcessPoolExecutor(max_workers=process_count) as executor, open(temp_file, 'w', encoding='utf-8') as f_out:
+        in_flight = deque()
+
+        def _drain_one():
+            nonlocal written
+            for novel_id_str, page_status, novel_data in in_flight.popleft().result():
+                if page_status is None:
+                    continue # Unparseable cached page: its existing record (if any) is carried over below
+                regenerated_ids.add(novel_id_str)
+                if on_record:
+                    on_record(novel_id_str, page_status, novel_data)
+                if page_status == PAGE_FOUND:
+                    novel_data['cover_local_path'] = cover_paths.get(int(novel_id_str))
+                    f_out.write(json.dumps(novel_data, ensure_ascii=False) + '\n')
+                    written += 1
+
+        for batch in _batched(cache.iter_latest(), REPARSE_BATCH_SIZE):
+            in_flight.append(executor.submit(parse_cached_batch, batch, backend))
+            if len(in_flight) >= max_in_flight:
+                _drain_one()
+        while in_flight:
+            _drain_one()
+
+        # Keep records that aren't (or are no longer) in the cache
+        if os.path.exists(output_file):
+            with open(output_file, 'r', encoding='utf-8') as f_in:
+                for line in f_in:
+                    try:
+                        novel_id_str = json.loads(line).get('id')
+                    except json.JSONDecodeError:
+                        continue
+                    if novel_id_str not in regenerated_ids:
+                        f_out.write(line)
+                        carried_over += 1
+
+    os.replace(temp_file, output_file)
+    return written, carried_over
@@ -0,0 +1,451 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import asyncio
+import argparse
+import functools
+import platform
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from NovelpiaScraper import (
+    AdaptiveConcurrencyController, BatchedParsePool, RetryQueue, ScrapeContext, run_id_pipeline, process_novel,
+    PARSER_BACKEND, DOWNLOAD_COVERS_FOLDER, COVER_PROCESSING_WORKERS, OUTPUT_FILE_METADATA, RATE_LIMIT_ENABLED,
+    COVER_STORE_ENABLED, COVER_DERIVATIVES_ENABLED,
+)
+from NovelpiaDerivatives import DerivativeManifest
+from NovelpiaCovers import CoverStore, covers_folder_size, remove_stale_partial_downloads
+from NovelpiaParser import select_backend
+from NovelpiaState import CrawlStateStore, STATE_DB_FILE, STATUS_OK, DEAD_STATUSES, ID_INDEX_CAPACITY, ID_UNKNOWN
+from NovelpiaTransport import HttpTransport
+from NovelpiaRateLimit import SharedRateLimiter, RATE_LIMIT_DB_FILE
+
+# --- Coordinator Configuration ---
+COORDINATOR_DIR = "novelpia_coordinator" # Shared directory: lease database + per-shard outputs
+COORDINATOR_DB_NAME = "leases.sqlite3"
+REMOVED_COVERS_NAME = "removed_covers.jsonl" # Covers the workers evicted; the next merge rewrites their paths in the output
+SHARD_SIZE = 2000 # IDs per lease
+LEASE_SECONDS = 120.0 # A lease not renewed within this time is handed to another worker
+LEASE_RENEW_INTERVAL = LEASE_SECONDS / 4
+COVER_TOTAL_SYNC_INTERVAL = 10.0 # Seconds between re-reads of the covers folder total, which every local worker adds to
+SHARD_PENDING = "pending"
+SHARD_LEASED = "leased"
+SHARD_DONE = "done"
+SHARD_MERGED = "merged"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS shards (
+    start_id INTEGER PRIMARY KEY,
+    end_id INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    worker TEXT,
+    expires_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    pages INTEGER,
+    found INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_shards_status ON shards(status);
+"""
+
+def shard_output_path(coordinator_dir, start_id, end_id):
+    return os.path.join(coordinator_dir, "shards", f"metadata_{start_id:06d}-{end_id:06d}.jsonl")
+
+def shard_dead_path(shard_file):
+    """The shard's list of IDs found deleted, forbidden or empty (one {"id", "status"} object per line)."""
+    return os.path.splitext(shard_file)[0] + ".dead.jsonl"
+
+def _take_removed_covers(coordinator_dir):
+    """Moves the workers' removed-covers list aside (running workers start a new one) and returns
+    ({novel_id_str: cover state}, path of the list taken). A list left by a failed merge is read again.
+    """
+    removed_file = os.path.join(coordinator_dir, REMOVED_COVERS_NAME)
+    taken_file = removed_file + ".merging"
+    if not os.path.exists(taken_file) and os.path.exists(removed_file):
+        os.replace(removed_file, taken_file)
+    removed_covers = {}
+    if os.path.exists(taken_file):
+        with open(taken_file, 'r', encoding='utf-8') as f_removed:
+            for line in f_removed:
+                removed = json.loads(line)
+                removed_covers[removed['id']] = removed['cover_state']
+    return removed_covers, taken_file
+
+# --- Lease Store ---
+class LeaseStore(object):
+    """
+    Hands out ID-range leases from a SQLite database in a directory shared by every worker process.
+    Claims, renewals and reclaims run in BEGIN IMMEDIATE transactions, so two workers never hold the
+    same live lease. Single host only: SQLite's file locking is not reliable over SMB/NFS, so keep
+    the coordinator directory on a local disk and run all workers on that machine.
+    """
+    def __init__(self, coordinator_dir=COORDINATOR_DIR):
+        self.coordinator_dir = coordinator_dir
+        os.makedirs(os.path.join(coordinator_dir, "shards"), exist_ok=True)
+        # isolation_level=None: transactions are opened explicitly with BEGIN IMMEDIATE
+        self.connection = sqlite3.connect(os.path.join(coordinator_dir, COORDINATOR_DB_NAME), timeout=30, isolation_level=None)
+        self.connection.executescript(_SCHEMA)
+
+    def plan(self, start_id, end_id, shard_size=SHARD_SIZE):
+        """Splits [start_id, end_id] into shards. Already planned shards are left as they are. Returns the number added."""
+        rows = [(shard_start, min(shard_start + shard_size - 1, end_id), SHARD_PENDING)
+                for shard_start in range(start_id, end_id + 1, shard_size)]
+        self.connection.execute("BEGIN IMMEDIATE")
+        before = self.connection.total_changes
+        self.connection.executemany("INSERT OR IGNORE INTO shards (start_id, end_id, status) VALUES (?, ?, ?)", rows)
+        added = self.connection.total_changes - before
+        self.connection.execute("COMMIT")
+        return added
+
+    def claim(self, worker_id, lease_seconds=LEASE_SECONDS):
+        """Leases the lowest pending (or expired) shard to `worker_id`. Returns (start_id, end_id) or None when nothing is left."""
+        now = time.time()
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.connection.execute(
+                "SELECT start_id, end_id FROM shards WHERE status = ? OR (status = ? AND expires_at < ?) ORDER BY start_id LIMIT 1",
+                (SHARD_PENDING, SHARD_LEASED, now)
+            ).fetchone()
+            if row:
+                self.connection.execute(
+                    "UPDATE shards SET status = ?, worker = ?, expires_at = ?, attempts = attempts + 1 WHERE start_id = ?",
+                    (SHARD_LEASED, worker_id, now + lease_seconds, row[0])
+                )
+            self.connection.execute("COMMIT")
+        except Exception:
+            self.connection.execute("ROLLBACK")
+            raise
+        return row
+
+    def renew(self, start_id, worker_id, lease_seconds=LEASE_SECONDS):
+        """Extends a lease. Returns False if the lease was lost (expired and reclaimed by someone else)."""
+        cursor = self.connection.execute(
+            "UPDATE shards SET expires_at = ? WHERE start_id = ? AND worker = ? AND status = ?",
+            (time.time() + lease_seconds, start_id, worker_id, SHARD_LEASED)
+        )
+        return cursor.rowcount == 1
+
+    def complete(self, start_id, worker_id, pages, found):
+        """Marks a shard done if `worker_id` still holds it. Returns False if the lease was lost."""
+        cursor = self.connection.execute(
+            "UPDATE shards SET status = ?, expires_at = NULL, pages = ?, found = ? WHERE start_id = ? AND worker = ? AND status = ?",
+            (SHARD_DONE, pages, found, start_id, worker_id, SHARD_LEASED)
+        )
+        return cursor.rowcount == 1
+
+    def done_shards(self):
+        return self.connection.execute("SELECT start_id, end_id FROM shards WHERE status = ? ORDER BY start_id", (SHARD_DONE,)).fetchall()
+
+    def mark_merged(self, shard_starts):
+        self.connection.execute("BEGIN IMMEDIATE")
+        self.connection.executemany("UPDATE shards SET status = ? WHERE start_id = ? AND status = ?",
+                                    [(SHARD_MERGED, start_id, SHARD_DONE) for start_id in shard_starts])
+        self.connection.execute("COMMIT")
+
+    def status_counts(self):
+        now = time.time()
+        counts = {SHARD_PENDING: 0, SHARD_LEASED: 0, "expired": 0, SHARD_DONE: 0, SHARD_MERGED: 0}
+        for status, expires_at in self.connection.execute("SELECT status, expires_at FROM shards"):
+            counts["expired" if status == SHARD_LEASED and expires_at < now else status] += 1
+        return counts
+
+    def close(self):
+        self.connection.close()
+
+# --- Worker ---
+async def crawl_shard(ctx, start_id, end_id, output_file, download_covers=False):
+    """Crawls one shard into its own output file (rewritten from scratch, since a reclaimed shard may
+    be half-written), then lists the dead IDs it found next to it for the merge. IDs the worker's ID
+    index (state_store.id_index, built once by run_worker) marks done are skipped: dead ones and those
+    already in the main metadata file. Failed fetches are retried with backoff like in a single-process
+    run; IDs that keep failing go on the state store's dead-letter list (NovelpiaScraper menu option 7
+    retries them). `ctx` is the worker's ScrapeContext. Returns (pages, found).
+    """
+    state_store = ctx.state_store
+    id_index = state_store.id_index
+    # What an earlier attempt at this shard wrote is about to be overwritten, so it is pending again
+    for novel_id in state_store.output_only_ids(output_file, OUTPUT_FILE_METADATA):
+        id_index.set(novel_id, ID_UNKNOWN)
+    state_store.clear_output(output_file)
+    retry_queue = RetryQueue(on_give_up=state_store.add_dead_letter)
+    counts = [0, 0]
+    try:
+        with open(output_file, 'w', encoding='utf-8') as f_output:
+            async def _handle_novel(novel_id_str):
+                result_status, _, data_written_flag = await process_novel(
+                    ctx, novel_id_str, f_output, True, False, download_covers, output_file
+                )
+                if result_status == 'network_error':
+                    if retry_queue.schedule(novel_id_str):
+                        return True # Counted when its retry comes back through the pipeline
+                else:
+                    retry_queue.completed(novel_id_str)
+                counts[0] += 1
+                counts[1] += int(data_written_flag)
+                return True
+
+            await run_id_pipeline((f"{i:06d}" for i in id_index.iter_pending(start_id, end_id)), _handle_novel, retry_queue=retry_queue)
+    finally:
+        state_store.flush()
+    with open(shard_dead_path(output_file), 'w', encoding='utf-8') as f_dead:
+        for novel_id, status in state_store.dead_ids(start_id, end_id):
+            f_dead.write(json.dumps({"id": f"{novel_id:06d}", "status": status}) + '\n')
+    return counts[0], counts[1]
+
+async def run_worker(coordinator_dir, worker_id, parser_processes, covers_gb=0.0):
+    """Claims leases until none are left, renewing the current one in the background.
+    A lease that is lost (e.g. this worker stalled past LEASE_SECONDS) aborts its shard.
+    The rate-limit buckets live next to the lease database, so all workers share one request budget.
+    `covers_gb` caps the covers folder all workers share: each re-reads its total every COVER_TOTAL_SYNC_INTERVAL.
+    """
+    leases = LeaseStore(coordinator_dir)
+    state_store = CrawlStateStore(STATE_DB_FILE) # Shared by the worker processes
+    state_store.import_output_file(OUTPUT_FILE_METADATA, is_jsonl=True)
+    state_store.build_id_index(OUTPUT_FILE_METADATA, None, ID_INDEX_CAPACITY) # Anonymous mapping, kept in sync across shards
+    controller = AdaptiveConcurrencyController()
+    rate_limiter = SharedRateLimiter(os.path.join(coordinator_dir, RATE_LIMIT_DB_FILE)) if RATE_LIMIT_ENABLED else None
+    parse_pool = BatchedParsePool(parser_processes, select_backend(PARSER_BACKEND))
+    size_ref = [0]
+    max_storage_bytes = covers_gb * 1024 * 1024 * 1024
+    cover_executor = None
+    cover_store = None
+    derivatives = None
+    if covers_gb > 0:
+        os.makedirs(DOWNLOAD_COVERS_FOLDER, exist_ok=True)
+        remove_stale_partial_downloads(DOWNLOAD_COVERS_FOLDER) # Other workers' live downloads are recent, so they stay
+        cover_executor = ThreadPoolExecutor(max_workers=COVER_PROCESSING_WORKERS, thread_name_prefix="cover")
+        derivatives = DerivativeManifest() if COVER_DERIVATIVES_ENABLED else None
+        cover_store = CoverStore( # One index per machine's covers folder
+            DOWNLOAD_COVERS_FOLDER, on_evict=derivatives.remove if derivatives else None
+        ) if COVER_STORE_ENABLED else None
+        if cover_store: # First run only; hashing the existing covers stays off the event loop
+            await asyncio.get_running_loop().run_in_executor(cover_executor, cover_store.import_legacy_covers)
+        read_cover_total = cover_store.total_bytes if cover_store else functools.partial(covers_folder_size, DOWNLOAD_COVERS_FOLDER)
+        size_ref[0] = read_cover_total() # The cap covers what earlier runs stored, too
+
+    async def _sync_cover_total():
+        """Keeps size_ref at the shared folder's total, which the other workers' downloads raise too."""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(COVER_TOTAL_SYNC_INTERVAL)
+            size_ref[0] = await loop.run_in_executor(cover_executor, read_cover_total)
+
+    shards_done = 0
+    print(f"[{worker_id}] Worker started on {coordinator_dir}")
+    transport = HttpTransport()
+    sync_task = asyncio.create_task(_sync_cover_total()) if covers_gb > 0 else None
+    try:
+        async with transport:
+            ctx = ScrapeContext(
+                state_store, controller, transport.pages, transport.covers, parse_pool, cover_executor,
+                rate_limiter=rate_limiter, cover_store=cover_store, derivatives=derivatives,
+                size_ref=size_ref, max_storage_bytes=max_storage_bytes
+            )
+            while True:
+                lease = leases.claim(worker_id)
+                if lease is None:
+                    break
+                start_id, end_id = lease
+                output_file = shard_output_path(coordinator_dir, start_id, end_id)
+                print(f"[{worker_id}] Leased {start_id:06d}-{end_id:06d}")
+                shard_start_time = time.time()
+                crawl_task = asyncio.create_task(crawl_shard(ctx, start_id, end_id, output_file, covers_gb > 0))
+                lease_lost = False
+                while not crawl_task.done():
+                    await asyncio.wait([crawl_task], timeout=LEASE_RENEW_INTERVAL)
+                    if not crawl_task.done() and not leases.renew(start_id, worker_id):
+                        lease_lost = True
+                        crawl_task.cancel()
+                        await asyncio.gather(crawl_task, return_exceptions=True)
+                if lease_lost:
+                    print(f"[{worker_id}] Lost lease {start_id:06d}-{end_id:06d}; another worker has it now.", file=sys.stderr)
+                    continue
+                pages, found = crawl_task.result()
+                if leases.complete(start_id, worker_id, pages, found):
+                    shards_done += 1
+                    print(f"[{worker_id}] Finished {start_id:06d}-{end_id:06d}: {pages} pages, {found} novels "
+                          f"in {time.time() - shard_start_time:.1f}s (concurrency {int(controller.limit)})")
+                else:
+                    print(f"[{worker_id}] Lease {start_id:06d}-{end_id:06d} expired before completion; its output is left to the new holder.", file=sys.stderr)
+    finally:
+        if sync_task:
+            sync_task.cancel()
+            await asyncio.gather(sync_task, return_exceptions=True)
+        parse_pool.shutdown()
+        if cover_executor:
+            cover_executor.shutdown(wait=True) # No cover thread evicts past this point
+        if cover_store:
+            # The evicted covers may sit in any shard or the main output, so the merge rewrites their paths
+            removed_covers = cover_store.pop_removed_covers()
+            if removed_covers:
+                state_store.set_cover_states(removed_covers)
+                with open(os.path.join(coordinator_dir, REMOVED_COVERS_NAME), 'a', encoding='utf-8') as f_removed:
+                    for novel_id_str, cover_state in removed_covers.items():
+                        f_removed.write(json.dumps({"id": novel_id_str, "cover_state": cover_state}) + '\n')
+            print(f"[{worker_id}] Cover store: {json.dumps(cover_store.stats())}")
+            cover_store.close()
+        state_store.close()
+        leases.close()
+        if derivatives:
+            derivatives.close()
+        print(f"[{worker_id}] Worker finished: {shards_done} shards. Connections: {json.dumps(transport.stats())}")
+        if rate_limiter:
+            print(f"[{worker_id}] Rate limiter: {json.dumps(rate_limiter.stats())}")
+            rate_limiter.close()
+
+# --- Merge ---
+def _index_jsonl(path, source, positions):
+    """Adds {integer novel ID: (source, byte offset)} for each record line of a JSONL file to `positions`,
+    replacing entries of earlier sources. Returns the number of records indexed.
+    """
+    count = 0
+    offset = 0
+    with open(path, 'rb') as f_read:
+        for line in f_read:
+            try:
+                positions[int(json.loads(line)['id'])] = (source, offset)
+                count += 1
+            except (ValueError, KeyError, TypeError):
+                print(f"Warning: Could not parse line in {path}: {line.decode('utf-8', 'replace').strip()}", file=sys.stderr)
+            offset += len(line)
+    return count
+
+def merge_shard_outputs(coordinator_dir, output_file=OUTPUT_FILE_METADATA):
+    """Merges every finished shard into `output_file` in ID order, de-duplicated by novel ID (shard
+    records win, since they are newer). The dead IDs each shard listed go into the local state store,
+    so later runs skip them too, and are dropped from the output. Covers the workers evicted get their
+    cover_local_path replaced by that state. Only line offsets are held in memory.
+    Merged shards are marked so a later merge won't apply them again.
+    Returns (records_from_shards, records_kept_from_output).
+    """
+    leases = LeaseStore(coordinator_dir)
+    state_store = CrawlStateStore(STATE_DB_FILE)
+    state_store.import_output_file(output_file, is_jsonl=True) # So interactive resumes know what was there before
+    shards = leases.done_shards()
+    removed_covers, removed_covers_file = _take_removed_covers(coordinator_dir)
+    temp_file = output_file + ".tmp"
+    paths = [output_file] # Source 0; the shards follow in ID order
+    positions = {}
+    dropped_ids = []
+    from_shards = 0
+    kept = 0
+    try:
+        if os.path.exists(output_file):
+            _index_jsonl(output_file, 0, positions)
+        for start_id, end_id in shards:
+            shard_file = shard_output_path(coordinator_dir, start_id, end_id)
+            if os.path.exists(shard_file):
+                paths.append(shard_file)
+                _index_jsonl(shard_file, len(paths) - 1, positions)
+            dead_file = shard_dead_path(shard_file)
+            if not os.path.exists(dead_file):
+                continue
+            with open(dead_file, 'r', encoding='utf-8') as f_dead:
+                for line in f_dead:
+                    dead = json.loads(line)
+                    if dead['status'] not in DEAD_STATUSES:
+                        continue
+                    state_store.record(dead['id'], dead['status'])
+                    if positions.get(int(dead['id']), (None,))[0] == 0: # Deleted since the output was written
+                        del positions[int(dead['id'])]
+                        dropped_ids.append(dead['id'])
+
+        sources = [open(path, 'rb') if os.path.exists(path) else None for path in paths]
+        try:
+            with open(temp_file, 'wb') as f_out:
+                for novel_id in sorted(positions):
+                    source, offset = positions[novel_id]
+                    sources[source].seek(offset)
+                    line = sources[source].readline()
+                    cover_state = removed_covers.get(f"{novel_id:06d}")
+                    if cover_state:
+                        novel_data = json.loads(line)
+                        novel_data['cover_local_path'] = cover_state
+                        line = (json.dumps(novel_data, ensure_ascii=False) + '\n').encode('utf-8')
+                    f_out.write(line if line.endswith(b'\n') else line + b'\n')
+                    if source == 0:
+                        kept += 1
+                        continue
+                    novel_data = json.loads(line)
+                    state_store.record(novel_data['id'], STATUS_OK, novel_data, novel_data.get('cover_local_path'), output_file)
+                    from_shards += 1
+        finally:
+            for f_source in sources:
+                if f_source:
+                    f_source.close()
+        os.replace(temp_file, output_file)
+        state_store.remove_from_output(dropped_ids, output_file)
+        state_store.set_cover_states(removed_covers)
+        leases.mark_merged([start_id for start_id, _ in shards])
+        if os.path.exists(removed_covers_file):
+            os.remove(removed_covers_file)
+    finally:
+        state_store.close()
+        leases.close()
+    return from_shards, kept
+
+# --- Command Line ---
+def _default_worker_id():
+    return f"{platform.node()}-{os.getpid()}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Split the novel ID space into leases and crawl them with several workers.")
+    parser.add_argument("--dir", default=COORDINATOR_DIR, help="Shared coordinator directory (default: %(default)s)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    plan = commands.add_parser("plan", help="Add the shards of an ID range to the lease table")
+    plan.add_argument("--start", type=int, default=0)
+    plan.add_argument("--end", type=int, default=999999)
+    plan.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+
+    work = commands.add_parser("work", help="Claim and crawl leases until none are left (any number of processes on this machine)")
+    work.add_argument("--worker-id", default=None)
+    work.add_argument("--parser-processes", type=int, default=os.cpu_count() or 1)
+    work.add_argument("--covers-gb", type=float, default=0.0, help="Also download covers, up to this many GB in the covers folder (all workers together)")
+
+    run = commands.add_parser("run", help="Plan a range, start local workers, wait for them and merge")
+    run.add_argument("--start", type=int, default=0)
+    run.add_argument("--end", type=int, default=999999)
+    run.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+    run.add_argument("--workers", type=int, default=4)
+    run.add_argument("--covers-gb", type=float, default=0.0)
+
+    merge = commands.add_parser("merge", help="Merge finished shards into the metadata file")
+    merge.add_argument("--output", default=OUTPUT_FILE_METADATA)
+
+    commands.add_parser("status", help="Show shard counts")
+    args = parser.parse_args()
+
+    if args.command in ("plan", "run"):
+        leases = LeaseStore(args.dir)
+        added = leases.plan(args.start, args.end, args.shard_size)
+        print(f"Planned {added} new shards of {args.shard_size} IDs for {args.start:06d}-{args.end:06d}.")
+        leases.close()
+
+    if args.command == "work":
+        asyncio.run(run_worker(args.dir, args.worker_id or _default_worker_id(), args.parser_processes, args.covers_gb))
+    elif args.command == "run":
+        # The parser pools of all workers share the local cores
+        parser_processes = max(1, (os.cpu_count() or 1) // args.workers)
+        workers = [
+            subprocess.Popen([sys.executable, os.path.abspath(__file__), "--dir", args.dir, "work",
+                              "--worker-id", f"{_default_worker_id()}-w{n}",
+                              "--parser-processes", str(parser_processes), "--covers-gb", str(args.covers_gb)])
+            for n in range(args.workers)
+        ]
+        for worker in workers:
+            worker.wait()
+        from_shards, kept = merge_shard_outputs(args.dir)
+        print(f"Merged {from_shards} records from shards into {OUTPUT_FILE_METADATA} ({kept} existing records kept).")
+    elif args.command == "merge":
+        from_shards, kept = merge_shard_outputs(args.dir, args.output)
+        print(f"Merged {from_shards} records from shards into {args.output} ({kept} existing records kept).")
+
+    if args.command in ("status", "run"):
+        leases = LeaseStore(args.dir)
+        print(f"Shards: {json.dumps(leases.status_counts())}")
+        leases.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,530 @@
+import os
+import sys
+import shutil
+import sqlite3
+import time
+import hashlib
+import threading
+
+from PIL import Image
+
+# --- Cover Storage Policy ---
+COVER_JPEG_QUALITY = 85
+# Format -> size in bytes from which a passthrough cover is still re-encoded to JPEG
+COVER_TRANSCODE_FORMATS = {"png": 200 * 1024, "bmp": 0, "tiff": 0}
+COVER_TRANSCODE_ALPHA = True # Re-encode (flatten) covers with an alpha channel
+COVER_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".webp", ".bmp", ".tiff")
+COVER_PARTIAL_SUFFIXES = (".part", ".part.jpg") # Downloads still streaming or being re-encoded
+COVER_PARTIAL_STALE_SECONDS = 600 # A partial file untouched this long was left by an interrupted run (live ones are written every few seconds)
+
+# --- Content-Addressed Store ---
+COVER_STORE_OBJECTS_FOLDER = "objects" # Blobs live in <covers folder>/objects/<first 2 hex>/<sha256><ext>
+COVER_STORE_INDEX_FILE = "cover_index.sqlite3" # ID -> blob mapping and blob metadata, inside the covers folder
+COVER_PHASH_ENABLED = False # Also fold near-identical covers (difference hash) into one blob; costs a decode per cover
+COVER_PHASH_MAX_DISTANCE = 4 # Differing bits (of 64) at which two covers still count as the same picture
+COVER_PLACEHOLDER_MIN_NOVELS = 20 # A blob shared by this many novels is default artwork: its URLs are skipped from then on
+COVER_PLACEHOLDER_STATE = "SKIPPED_PLACEHOLDER" # Cover state of a novel whose cover is default artwork
+COVER_EVICTED_STATE = "EVICTED" # Cover state of a novel whose cover was evicted to make room (a backfill fetches it again)
+
+# --- Storage Ledger / Eviction ---
+# What happens at the storage cap: "none" skips new covers (SKIPPED_LIMIT); the others evict stored covers
+# ranked lower than the new one: "lru" (least recently seen by a scrape), "likes" (lowest like_count),
+# "adult-complete-first" (adult, then complete novels, then by like_count)
+COVER_EVICTION_POLICIES = ("none", "lru", "likes", "adult-complete-first")
+COVER_EVICTION_POLICY = "likes"
+
+# Magic bytes -> (format, extension). Checked against the first bytes of a download.
+_MAGIC_SIGNATURES = (
+    (b"\xff\xd8\xff", "jpeg", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", "png", ".png"),
+    (b"GIF87a", "gif", ".gif"),
+    (b"GIF89a", "gif", ".gif"),
+    (b"BM", "bmp", ".bmp"),
+    (b"II*\x00", "tiff", ".tiff"),
+    (b"MM\x00*", "tiff", ".tiff"),
+)
+
+def sniff_image_type(header):
+    """Identifies an image from its first bytes. Returns (format, extension) or None if it isn't an image."""
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "webp", ".webp"
+    for magic, image_format, extension in _MAGIC_SIGNATURES:
+        if header.startswith(magic):
+            return image_format, extension
+    return None
+
+def find_existing_cover(covers_folder, novel_id_str):
+    """Returns the path of an already downloaded cover for this novel (any extension), or None."""
+    for extension in COVER_EXTENSIONS:
+        path = os.path.join(covers_folder, f"{novel_id_str}{extension}")
+        if os.path.exists(path):
+            return path
+    return None
+
+def _has_alpha(img):
+    return img.mode in ('RGBA', 'LA', 'PA') or 'transparency' in img.info
+
+def should_transcode(image_format, byte_size, has_alpha):
+    """The passthrough policy: keep the server's bytes unless the format/size/alpha rules say otherwise."""
+    min_size = COVER_TRANSCODE_FORMATS.get(image_format)
+    if min_size is not None and byte_size >= min_size:
+        return True
+    return has_alpha and COVER_TRANSCODE_ALPHA
+
+# --- Cover Finalization (runs in a worker pool, never on the event loop) ---
+def finalize_cover(temp_path, local_path, always_transcode=False):
+    """Verifies a fully streamed download and atomically moves it into place.
+    The magic bytes decide the format and extension; the file is only decoded and re-encoded
+    to JPEG when `always_transcode` is set or the passthrough policy asks for it.
+    Returns (final_local_path, file_size), or (None, 0) if the download is not an image or does not decode.
+    """
+    with open(temp_path, 'rb') as f:
+        sniffed = sniff_image_type(f.read(16))
+    if sniffed is None:
+        os.remove(temp_path)
+        return None, 0
+    image_format, extension = sniffed
+    base_path = os.path.splitext(local_path)[0]
+    byte_size = os.path.getsize(temp_path)
+
+    encoded_path = temp_path + ".jpg"
+    transcoded = False
+    try:
+        with Image.open(temp_path) as img: # Lazy: only the header is read unless we re-encode
+            if always_transcode or should_transcode(image_format, byte_size, _has_alpha(img)):
+                if img.mode not in ('RGB', 'L'): # JPEG has no alpha/palette; flatten RGBA, P, LA, ...
+                    img = img.convert('RGB')
+                img.save(encoded_path, "JPEG", quality=COVER_JPEG_QUALITY)
+                transcoded = True
+        if transcoded:
+            os.remove(temp_path)
+            temp_path, extension = encoded_path, ".jpg"
+    except Exception as e:
+        # Right magic bytes but no decodable image behind them (e.g. a text body that starts with "BM")
+        print(f"Downloaded cover {local_path} does not decode as {image_format}: {e}", file=sys.stderr)
+        for path in (temp_path, encoded_path):
+            if os.path.exists(path):
+                os.remove(path)
+        return None, 0
+
+    final_path = base_path + extension
+    os.replace(temp_path, final_path) # Atomic on the same filesystem
+    return final_path, os.path.getsize(final_path)
+
+def covers_folder_size(covers_folder):
+    """Bytes used by the covers folder, counting hard-linked files once.
+    Partial downloads are not counted; their bytes are added once they are finalized.
+    """
+    total = 0
+    seen_inodes = set()
+    for root, _, files in os.walk(covers_folder):
+        for file in files:
+            if file.endswith(COVER_PARTIAL_SUFFIXES):
+                continue
+            try:
+                file_stat = os.stat(os.path.join(root, file))
+            except OSError:
+                continue # Ignore files that might be inaccessible
+            inode = (file_stat.st_dev, file_stat.st_ino)
+            if file_stat.st_ino and inode in seen_inodes:
+                continue
+            seen_inodes.add(inode)
+            total += file_stat.st_size
+    return total
+
+def remove_stale_partial_downloads(covers_folder, max_age=COVER_PARTIAL_STALE_SECONDS):
+    """Deletes partial downloads left behind by an interrupted run. Called once at startup; only files
+    untouched for `max_age` seconds go, so downloads of other processes sharing the folder are left alone.
+    Returns the number of files removed.
+    """
+    removed = 0
+    cutoff = time.time() - max_age
+    for entry in os.scandir(covers_folder):
+        if not entry.name.endswith(COVER_PARTIAL_SUFFIXES):
+            continue
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except OSError:
+            continue # Finished or removed by its owner in the meantime
+    return removed
+
+def difference_hash(path, hash_size=8):
+    """64-bit dHash: the image shrunk to 9x8 greys, one bit per horizontally adjacent pair.
+    Re-encodes, rescales and small edits of the same artwork land within a few bits of each other.
+    """
+    with Image.open(path) as img:
+        img = img.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS)
+        pixels = list(img.getdata())
+    bits = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            offset = row * (hash_size + 1) + col
+            bits = (bits << 1) | (pixels[offset] > pixels[offset + 1])
+    return bits
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+_STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    phash TEXT,
+    placeholder INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS covers (
+    id INTEGER PRIMARY KEY,
+    digest TEXT NOT NULL,
+    url TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_covers_digest ON covers (digest);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Ledger columns added after the first version of the index; existing index files are migrated on open
+_STORE_ADDED_COLUMNS = {
+    "blobs": {"priority": "REAL NOT NULL DEFAULT 0"}, # Highest priority of the novels using the blob
+    "covers": {"path": "TEXT", "copy_size": "INTEGER NOT NULL DEFAULT 0", "priority": "REAL NOT NULL DEFAULT 0", "last_access": "REAL"},
+}
+
+def cover_priority(novel_data, policy=COVER_EVICTION_POLICY, now=None):
+    """How much a novel's cover is worth keeping under an eviction policy; lower values go first.
+    `novel_data` may be None (a cover found on disk without metadata), which ranks lowest.
+    """
+    if policy == "lru":
+        return now or time.time()
+    if novel_data is None:
+        return 0.0
+    like_count = novel_data.get('like_count') or 0
+    if policy == "likes":
+        return float(like_count)
+    if policy == "adult-complete-first":
+        rank = (0 if novel_data.get('is_adult') else 2) + (0 if novel_data.get('publication_status') == "완결" else 1)
+        return rank * 1e9 + like_count
+    return 0.0
+
+class CoverStore(object):
+    """
+    Stores covers by the SHA-256 of their final bytes. Every novel's usual `{id}{ext}` file stays where
+    the viewer looks for it, but is a hard link into the store, so identical artwork shared by many
+    novels takes its bytes once (and counts once against the storage cap). With COVER_PHASH_ENABLED,
+    near-identical covers are linked to the first blob of their look as well.
+    A blob that COVER_PLACEHOLDER_MIN_NOVELS novels point at is default artwork: its file and the ID
+    files of the novels using it are deleted (those novels are reported to `on_evict`), its URLs are
+    remembered so later novels using them are skipped before download, and a download that still
+    turns out to be that artwork is dropped on arrival.
+
+    The index doubles as the storage ledger: sizes, priority and last access per cover, so the folder
+    size is one query instead of a walk, and a full folder can make room by evicting the blobs with
+    the lowest priority under COVER_EVICTION_POLICY; `on_evict(novel_id_strs)` is then called with
+    the IDs whose covers went (the scraper drops their derivative images). Those IDs and their new
+    cover state are also collected for pop_removed_covers(), so the run can stop pointing at the files.
+    Covers saved before the store existed are brought in by import_legacy_covers(), which hashes every
+    one of them; run it once in a thread before the first download.
+    Calls run in the cover executor's threads; the index is shared by every process on the folder.
+    """
+    def __init__(self, covers_folder, eviction_policy=COVER_EVICTION_POLICY, on_evict=None):
+        if eviction_policy not in COVER_EVICTION_POLICIES:
+            raise ValueError(f"Unknown cover eviction policy {eviction_policy!r}; expected one of {COVER_EVICTION_POLICIES}")
+        self.covers_folder = covers_folder
+        self.eviction_policy = eviction_policy
+        self.on_evict = on_evict
+        self.objects_folder = os.path.join(covers_folder, COVER_STORE_OBJECTS_FOLDER)
+        os.makedirs(self.objects_folder, exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(covers_folder, COVER_STORE_INDEX_FILE), timeout=30.0, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL") # Safe with WAL; skips an fsync per commit
+        self.connection.executescript(_STORE_SCHEMA)
+        for table, columns in _STORE_ADDED_COLUMNS.items():
+            existing_columns = {row[1] for row in self.connection.execute(f"PRAGMA table_info({table})")}
+            for column, column_type in columns.items():
+                if column not in existing_columns:
+                    self.connection.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS idx_blobs_priority ON blobs (priority)")
+        self.connection.commit()
+        self._lock = threading.Lock()
+        self.placeholder_urls = {url for (url,) in self.connection.execute(
+            "SELECT c.url FROM covers c JOIN blobs b ON b.digest = c.digest WHERE b.placeholder = 1 AND c.url IS NOT NULL"
+        )}
+        self._phashes = [(int(phash, 16), digest) for phash, digest in self.connection.execute(
+            "SELECT phash, digest FROM blobs WHERE phash IS NOT NULL"
+        )] if COVER_PHASH_ENABLED else []
+        self.removed_covers = {} # novel_id_str -> COVER_EVICTED_STATE / COVER_PLACEHOLDER_STATE, for files deleted this session
+        self.counts = {"stored": 0, "deduplicated": 0, "near_duplicates": 0, "bytes_saved": 0, "placeholders_skipped": 0,
+                       "placeholders_dropped": 0, "legacy_imported": 0, "evicted": 0, "bytes_evicted": 0}
+
+    @property
+    def evicts(self):
+        return self.eviction_policy != "none"
+
+    def priority_for(self, novel_data):
+        return cover_priority(novel_data, self.eviction_policy)
+
+    def import_legacy_covers(self):
+        """One-time: brings `{id}{ext}` covers saved before the store existed into it (and the ledger).
+        Does nothing once done. Returns the number of covers imported.
+        """
+        with self._lock:
+            if self.connection.execute("SELECT value FROM meta WHERE key = 'legacy_imported'").fetchone() is not None:
+                return 0
+            known_ids = {novel_id for (novel_id,) in self.connection.execute("SELECT id FROM covers")}
+        for entry in os.scandir(self.covers_folder):
+            novel_id_str, extension = os.path.splitext(entry.name)
+            if not entry.is_file() or not novel_id_str.isdigit() or extension.lower() not in COVER_EXTENSIONS:
+                continue
+            if int(novel_id_str) in known_ids:
+                continue
+            priority = entry.stat().st_mtime if self.eviction_policy == "lru" else 0.0
+            self.add(entry.path, None, priority)
+            self.counts["legacy_imported"] += 1
+        with self._lock:
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_imported', '1')")
+            self.connection.commit()
+        return self.counts["legacy_imported"]
+
+    def total_bytes(self):
+        """Bytes the covers folder holds according to the ledger (blobs once, plus copies where links failed)."""
+        with self._lock:
+            blob_bytes, = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()
+            copy_bytes, = self.connection.execute("SELECT COALESCE(SUM(copy_size), 0) FROM covers").fetchone()
+        return blob_bytes + copy_bytes
+
+    def is_placeholder_url(self, url):
+        if url in self.placeholder_urls:
+            self.counts["placeholders_skipped"] += 1
+            return True
+        return False
+
+    def _blob_path(self, digest, extension):
+        return os.path.join(self.objects_folder, digest[:2], digest + extension)
+
+    def _nearest(self, phash):
+        """Digest of the stored cover closest to `phash`, if one is within COVER_PHASH_MAX_DISTANCE."""
+        best = None
+        for other_phash, digest in self._phashes:
+            distance = (phash ^ other_phash).bit_count()
+            if distance <= COVER_PHASH_MAX_DISTANCE and (best is None or distance < best[0]):
+                best = (distance, digest)
+        return best and best[1]
+
+    def add(self, cover_path, url=None, priority=0.0):
+        """Moves a finalized `{id}{ext}` cover into the store and links it back under the ID.
+        Returns (ID file path, bytes added to the folder); a duplicate adds 0 bytes, and the ID file
+        takes the extension of the blob it shares. When the ID had a different cover before, the old
+        blob is dropped once no cover uses it, and its bytes are taken off the result (which may go negative).
+        If the cover is (or with this copy turns out to be) default artwork, nothing is kept and the
+        path is COVER_PLACEHOLDER_STATE.
+        """
+        novel_id_str, extension = os.path.splitext(os.path.basename(cover_path))
+        digest = _file_digest(cover_path)
+        phash = None
+        if COVER_PHASH_ENABLED:
+            try:
+                phash = difference_hash(cover_path)
+            except Exception as e:
+                print(f"Could not hash cover {cover_path}, storing it without near-duplicate check: {e}", file=sys.stderr)
+        size = os.path.getsize(cover_path)
+
+        dropped_ids = []
+        with self._lock:
+            previous = self.connection.execute("SELECT digest, path, copy_size FROM covers WHERE id = ?", (int(novel_id_str),)).fetchone()
+            row = self.connection.execute("SELECT digest, path, placeholder FROM blobs WHERE digest = ?", (digest,)).fetchone()
+            near_duplicate = False
+            if row is None and phash is not None:
+                near_digest = self._nearest(phash)
+                if near_digest:
+                    row = self.connection.execute("SELECT digest, path, placeholder FROM blobs WHERE digest = ?", (near_digest,)).fetchone()
+                    near_duplicate = row is not None
+            if row is not None and row[2]: # Known default artwork
+                digest = row[0]
+                os.remove(cover_path)
+                id_path = None
+                copy_size = bytes_added = 0
+                self.counts["placeholders_dropped"] += 1
+            elif row is not None and os.path.exists(row[1]):
+                digest, blob_path, _ = row
+                os.remove(cover_path)
+                id_path = os.path.join(os.path.dirname(cover_path), novel_id_str + os.path.splitext(blob_path)[1])
+                copy_size = _link_or_copy(blob_path, id_path)
+                bytes_added = copy_size
+                self.connection.execute("UPDATE blobs SET priority = MAX(priority, ?) WHERE digest = ?", (priority, digest))
+                self.counts["near_duplicates" if near_duplicate else "deduplicated"] += 1
+                self.counts["bytes_saved"] += size - bytes_added
+            else:
+                blob_path = self._blob_path(digest, extension)
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                os.replace(cover_path, blob_path)
+                id_path = cover_path
+                copy_size = _link_or_copy(blob_path, id_path)
+                bytes_added = size + copy_size
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO blobs (digest, path, size, phash, placeholder, priority) VALUES (?, ?, ?, ?, 0, ?)",
+                    (digest, blob_path, size, None if phash is None else f"{phash:016x}", priority)
+                )
+                if phash is not None:
+                    self._phashes.append((phash, digest))
+                self.counts["stored"] += 1
+            self.connection.execute(
+                "INSERT OR REPLACE INTO covers (id, digest, url, path, copy_size, priority, last_access) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (int(novel_id_str), digest, url, id_path, copy_size, priority, time.time())
+            )
+            if previous is not None:
+                bytes_added -= self._drop_replaced(previous, id_path, digest)
+            if id_path is None:
+                if url:
+                    self.placeholder_urls.add(url)
+            else:
+                dropped_ids, freed = self._check_placeholder(digest, url)
+                bytes_added -= freed
+                self.removed_covers.pop(novel_id_str, None) # Stored again since it was evicted, or the caller learns its state
+            self.connection.commit()
+        if id_path is None or dropped_ids:
+            other_ids = [dropped_id for dropped_id in dropped_ids if dropped_id != novel_id_str]
+            if other_ids and self.on_evict:
+                self.on_evict(other_ids)
+            return COVER_PLACEHOLDER_STATE, bytes_added
+        return id_path, bytes_added
+
+    def _drop_replaced(self, previous, id_path, digest):
+        """Cleans up after an ID's cover was replaced: its old ID file (if it had another extension) and
+        its old blob, once no cover points at it any more. Returns the bytes freed.
+        """
+        old_digest, old_path, old_copy_size = previous
+        freed = old_copy_size
+        if old_path and old_path != id_path and os.path.exists(old_path):
+            os.remove(old_path)
+        if old_digest == digest or self.connection.execute("SELECT 1 FROM covers WHERE digest = ? LIMIT 1", (old_digest,)).fetchone():
+            return freed
+        blob = self.connection.execute("SELECT path, size FROM blobs WHERE digest = ?", (old_digest,)).fetchone()
+        if blob is not None:
+            if os.path.exists(blob[0]):
+                os.remove(blob[0])
+            self.connection.execute("DELETE FROM blobs WHERE digest = ?", (old_digest,))
+            self._phashes = [(phash, other_digest) for phash, other_digest in self._phashes if other_digest != old_digest]
+            freed += blob[1]
+        return freed
+
+    def touch(self, novel_id_str, priority):
+        """Records that a stored cover was seen again, with its novel's current priority
+        (its new access time under "lru", its current like count under "likes", ...).
+        """
+        with self._lock:
+            self.connection.execute("UPDATE covers SET priority = ?, last_access = ? WHERE id = ?", (priority, time.time(), int(novel_id_str)))
+            self.connection.execute(
+                "UPDATE blobs SET priority = (SELECT MAX(priority) FROM covers WHERE covers.digest = blobs.digest)"
+                " WHERE digest = (SELECT digest FROM covers WHERE id = ?)", (int(novel_id_str),)
+            )
+            self.connection.commit()
+
+    def can_evict(self, priority):
+        """True if eviction could make room for a cover of this priority (something ranks lower)."""
+        if not self.evicts:
+            return False
+        with self._lock:
+            return self.connection.execute("SELECT 1 FROM blobs WHERE priority < ? AND placeholder = 0 LIMIT 1", (priority,)).fetchone() is not None
+
+    def evict_for(self, needed_bytes, priority):
+        """Deletes the lowest-priority blobs (and every ID file linked to them) that rank below
+        `priority`, until `needed_bytes` are freed or nothing lower is left. Returns the bytes freed.
+        """
+        if not self.evicts:
+            return 0
+        freed = 0
+        evicted_ids = []
+        with self._lock:
+            while freed < needed_bytes:
+                victims = self.connection.execute( # Placeholder blobs hold no bytes, only the knowledge
+                    "SELECT digest, path, size FROM blobs WHERE priority < ? AND placeholder = 0 ORDER BY priority LIMIT 32", (priority,)
+                ).fetchall()
+                if not victims:
+                    break
+                for digest, blob_path, size in victims:
+                    blob_extension = os.path.splitext(blob_path)[1]
+                    for novel_id, id_path, copy_size in self.connection.execute(
+                        "SELECT id, path, copy_size FROM covers WHERE digest = ?", (digest,)
+                    ).fetchall():
+                        id_path = id_path or os.path.join(self.covers_folder, f"{novel_id:06d}{blob_extension}")
+                        if os.path.exists(id_path):
+                            os.remove(id_path)
+                        freed += copy_size
+                        evicted_ids.append(f"{novel_id:06d}")
+                        self.removed_covers[f"{novel_id:06d}"] = COVER_EVICTED_STATE
+                    if os.path.exists(blob_path):
+                        os.remove(blob_path)
+                    freed += size
+                    self.connection.execute("DELETE FROM covers WHERE digest = ?", (digest,))
+                    self.connection.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+                    self.counts["evicted"] += 1
+                    if freed >= needed_bytes:
+                        break
+            self.connection.commit()
+        self.counts["bytes_evicted"] += freed
+        if evicted_ids and self.on_evict:
+            self.on_evict(evicted_ids)
+        return freed
+
+    def _check_placeholder(self, digest, url):
+        """Flags the blob as default artwork once enough novels use it, deleting its file and their ID
+        files (the rows stay, so its URLs and digest are still recognized).
+        Returns (IDs whose cover was dropped, bytes freed).
+        """
+        path, size, novels = self.connection.execute(
+            "SELECT b.path, b.size, COUNT(*) FROM blobs b JOIN covers c ON c.digest = b.digest WHERE b.digest = ?", (digest,)
+        ).fetchone()
+        if novels < COVER_PLACEHOLDER_MIN_NOVELS:
+            return [], 0
+        dropped_ids = []
+        freed = size
+        for novel_id, id_path, copy_size, cover_url in self.connection.execute(
+            "SELECT id, path, copy_size, url FROM covers WHERE digest = ?", (digest,)
+        ).fetchall():
+            if id_path and os.path.exists(id_path):
+                os.remove(id_path)
+            freed += copy_size
+            dropped_ids.append(f"{novel_id:06d}")
+            self.removed_covers[f"{novel_id:06d}"] = COVER_PLACEHOLDER_STATE
+            if cover_url:
+                self.placeholder_urls.add(cover_url)
+        if os.path.exists(path):
+            os.remove(path)
+        self.connection.execute("UPDATE covers SET path = NULL, copy_size = 0 WHERE digest = ?", (digest,))
+        self.connection.execute("UPDATE blobs SET placeholder = 1, size = 0 WHERE digest = ?", (digest,))
+        self.counts["placeholders_dropped"] += len(dropped_ids)
+        return dropped_ids, freed
+
+    def pop_removed_covers(self):
+        """Returns {novel_id_str: cover state} for the covers evicted or dropped as default artwork since
+        the last call (and not stored again since), for the caller to record in place of their paths.
+        """
+        with self._lock:
+            removed, self.removed_covers = self.removed_covers, {}
+        return removed
+
+    def stats(self):
+        return dict(self.counts, placeholder_urls=len(self.placeholder_urls), eviction_policy=self.eviction_policy)
+
+    def close(self):
+        self.connection.close()
+
+def _link_or_copy(blob_path, id_path):
+    """Hard-links `id_path` to the blob. Returns the bytes this cost: 0, or the size of a copy where
+    the filesystem has no hard links.
+    """
+    if os.path.exists(id_path):
+        os.remove(id_path)
+    try:
+        os.link(blob_path, id_path)
+        return 0
+    except OSError:
+        shutil.copyfile(blob_path, id_path)
+        return os.path.getsize(id_path)
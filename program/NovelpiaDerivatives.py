@@ -0,0 +1,225 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from PIL import Image, features
+
+from NovelpiaCovers import COVER_EXTENSIONS
+
+# --- Derivative Configuration ---
+DERIVATIVES_FOLDER = "novelpia_covers_derived" # <folder>/<size name>/<id>.<webp|jpg>, next to the covers folder
+DERIVATIVE_MANIFEST_FILE = "manifest.jsonl" # One line per cover, inside DERIVATIVES_FOLDER; the last line for an ID wins
+DERIVATIVE_SIZES = { # Size name -> bounding box; covers are shrunk to fit (aspect kept, never enlarged)
+    "thumb": (150, 225), # The viewer's grid tile
+    "detail": (480, 720),
+}
+DERIVATIVE_WEBP_QUALITY = 80
+DERIVATIVE_WEBP_METHOD = 4 # 0 (fast) .. 6 (smallest)
+DERIVATIVE_JPEG_QUALITY = 82
+WEBP_AVAILABLE = features.check("webp") # Pillow built without libwebp still produces the JPEGs
+DERIVATIVE_FORMATS = ("webp", "jpeg") if WEBP_AVAILABLE else ("jpeg",)
+_FORMAT_EXTENSIONS = {"webp": ".webp", "jpeg": ".jpg"}
+
+def _save_atomically(img, path, image_format, **params):
+    temp_path = path + ".part"
+    img.save(temp_path, image_format.upper(), **params)
+    os.replace(temp_path, path)
+    return os.path.getsize(path)
+
+def generate_derivatives(source_path, output_folder=DERIVATIVES_FOLDER):
+    """Decodes a cover once and writes every size in every format. Returns its manifest entry.
+    JPEG sources are decoded at a reduced scale (draft mode) when the largest size allows it.
+    """
+    novel_id_str = os.path.splitext(os.path.basename(source_path))[0]
+    source_stat = os.stat(source_path)
+    entry = {
+        "id": novel_id_str,
+        "source": source_path,
+        "source_bytes": source_stat.st_size,
+        "source_mtime": source_stat.st_mtime,
+        "derivatives": {},
+    }
+    largest_box = max(DERIVATIVE_SIZES.values())
+    with Image.open(source_path) as img:
+        entry["width"], entry["height"] = img.size
+        img.draft('RGB', largest_box) # No-op for formats other than JPEG
+        img = img.convert('RGB') # Flattens alpha/palette; both outputs are opaque
+        for size_name, box in DERIVATIVE_SIZES.items():
+            resized = img.copy()
+            resized.thumbnail(box, Image.LANCZOS)
+            size_folder = os.path.join(output_folder, size_name)
+            os.makedirs(size_folder, exist_ok=True)
+            outputs = {}
+            for image_format in DERIVATIVE_FORMATS:
+                path = os.path.join(size_folder, novel_id_str + _FORMAT_EXTENSIONS[image_format])
+                if image_format == "webp":
+                    byte_size = _save_atomically(resized, path, image_format, quality=DERIVATIVE_WEBP_QUALITY, method=DERIVATIVE_WEBP_METHOD)
+                else:
+                    byte_size = _save_atomically(resized, path, image_format, quality=DERIVATIVE_JPEG_QUALITY, optimize=True, progressive=True)
+                outputs[image_format] = {"path": path, "width": resized.width, "height": resized.height, "bytes": byte_size}
+            entry["derivatives"][size_name] = outputs
+    return entry
+
+class DerivativeManifest(object):
+    """
+    The derivatives of every cover, read from and appended to DERIVATIVE_MANIFEST_FILE.
+    An entry is current while its source file keeps the same size and modification time.
+    Appends are thread-safe, so the scraper's cover threads can all record into one manifest.
+    """
+    def __init__(self, output_folder=DERIVATIVES_FOLDER):
+        self.output_folder = output_folder
+        self.path = os.path.join(output_folder, DERIVATIVE_MANIFEST_FILE)
+        self.entries = {}
+        self._lock = threading.Lock()
+        os.makedirs(output_folder, exist_ok=True)
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f_in:
+                for line in f_in:
+                    try:
+                        entry = json.loads(line)
+                        if entry.get("removed"):
+                            self.entries.pop(entry["id"], None)
+                        else:
+                            self.entries[entry["id"]] = entry
+                    except (json.JSONDecodeError, KeyError, TypeError):
+                        continue # A line cut short by an interrupted run
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def is_current(self, source_path):
+        entry = self.entries.get(os.path.splitext(os.path.basename(source_path))[0])
+        if entry is None or set(entry["derivatives"]) != set(DERIVATIVE_SIZES):
+            return False
+        try:
+            source_stat = os.stat(source_path)
+        except OSError:
+            return False
+        return entry["source_bytes"] == source_stat.st_size and entry["source_mtime"] == source_stat.st_mtime
+
+    def add(self, entry):
+        with self._lock:
+            self.entries[entry["id"]] = entry
+            self._file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            self._file.flush()
+
+    def generate(self, source_path):
+        """Incremental step for the scraper (runs in its cover executor): derivatives for one cover,
+        unless the manifest already has them for this exact file. Failures are reported, not raised.
+        """
+        if self.is_current(source_path):
+            return None
+        try:
+            entry = generate_derivatives(source_path, self.output_folder)
+        except Exception as e:
+            print(f"Could not generate derivatives of {source_path}: {e}", file=sys.stderr)
+            return None
+        self.add(entry)
+        return entry
+
+    def remove(self, novel_id_strs):
+        """Deletes the derivatives of these covers and appends their removal to the manifest. The
+        scraper's cover store calls this with the covers it evicts. Returns how many were removed.
+        """
+        removed = 0
+        with self._lock:
+            for novel_id_str in novel_id_strs:
+                entry = self.entries.pop(novel_id_str, None)
+                if entry is None:
+                    continue
+                for outputs in entry["derivatives"].values():
+                    for output in outputs.values():
+                        if os.path.exists(output["path"]):
+                            os.remove(output["path"])
+                self._file.write(json.dumps({"id": novel_id_str, "removed": True}) + '\n')
+                removed += 1
+            self._file.flush()
+        return removed
+
+    def prune(self, existing_ids):
+        """Deletes the derivatives of covers that are gone. Returns how many were removed."""
+        with self._lock:
+            stale_ids = [novel_id_str for novel_id_str in self.entries if novel_id_str not in existing_ids]
+        return self.remove(stale_ids)
+
+    def compact(self):
+        """Rewrites the manifest with one line per cover (appends leave superseded lines behind)."""
+        with self._lock:
+            self._file.close()
+            temp_path = self.path + ".tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f_out:
+                for novel_id_str in sorted(self.entries):
+                    f_out.write(json.dumps(self.entries[novel_id_str], ensure_ascii=False) + '\n')
+            os.replace(temp_path, self.path)
+            self._file = open(self.path, 'a', encoding='utf-8')
+
+    def close(self):
+        self._file.close()
+
+# --- Standalone ---
+def iter_cover_files(covers_folder):
+    """The `{id}{ext}` covers of a folder (the content-addressed store's objects are reached through them)."""
+    for entry in os.scandir(covers_folder):
+        novel_id_str, extension = os.path.splitext(entry.name)
+        if entry.is_file() and novel_id_str.isdigit() and extension.lower() in COVER_EXTENSIONS:
+            yield entry.path
+
+def generate_folder(covers_folder, output_folder=DERIVATIVES_FOLDER, workers=None, force=False):
+    """Brings the derivatives of a whole covers folder up to date, decoding and encoding in parallel
+    processes. Covers whose derivatives are current are skipped unless `force`; derivatives of covers
+    that no longer exist are deleted, and the manifest is compacted at the end.
+    """
+    start_time = time.time()
+    manifest = DerivativeManifest(output_folder)
+    sources = list(iter_cover_files(covers_folder))
+    pending = sources if force else [source_path for source_path in sources if not manifest.is_current(source_path)]
+    counts = {"covers": len(sources), "generated": 0, "up_to_date": len(sources) - len(pending), "failed": 0, "pruned": 0}
+    print(f"Generating {', '.join(DERIVATIVE_SIZES)} in {', '.join(DERIVATIVE_FORMATS)} for {len(pending)} of {len(sources)} covers...")
+    if not WEBP_AVAILABLE:
+        print("Pillow has no WebP support here; only JPEG derivatives are written.", file=sys.stderr)
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(generate_derivatives, source_path, output_folder): source_path for source_path in pending}
+            for future in as_completed(futures):
+                try:
+                    manifest.add(future.result())
+                    counts["generated"] += 1
+                except Exception as e:
+                    print(f"Could not generate derivatives of {futures[future]}: {e}", file=sys.stderr)
+                    counts["failed"] += 1
+                done = counts["generated"] + counts["failed"]
+                if done % 100 == 0 or done == len(pending):
+                    sys.stdout.write(f"\rGenerated: {counts['generated']}/{len(pending)} | Failed: {counts['failed']}")
+                    sys.stdout.flush()
+        counts["pruned"] = manifest.prune({os.path.splitext(os.path.basename(source_path))[0] for source_path in sources})
+        manifest.compact()
+    finally:
+        manifest.close()
+    total_bytes = {image_format: 0 for image_format in DERIVATIVE_FORMATS}
+    for entry in manifest.entries.values():
+        for outputs in entry["derivatives"].values():
+            for image_format, output in outputs.items():
+                total_bytes[image_format] = total_bytes.get(image_format, 0) + output["bytes"]
+    print(f"\nDerivatives: {json.dumps(counts)} | Bytes by format: {json.dumps(total_bytes)} | {time.time() - start_time:.2f} seconds")
+    return counts
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=(
+        "Generate cover thumbnails and detail images (WebP + JPEG) with a manifest of their sizes. The scraper does this "
+        "after each cover download; run it standalone over a whole covers folder, e.g. "
+        "python NovelpiaDerivatives.py --covers novelpia_covers --workers 8"
+    ))
+    parser.add_argument("--covers", default="novelpia_covers", help="Covers folder to read (default: %(default)s)")
+    parser.add_argument("--output", default=DERIVATIVES_FOLDER, help="Folder for derivatives and the manifest (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=None, help="Encoder processes (default: one per CPU)")
+    parser.add_argument("--force", action="store_true", help="Regenerate even derivatives that are up to date")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = _parse_args()
+    if not os.path.isdir(args.covers):
+        print(f"Error: covers folder '{args.covers}' does not exist.", file=sys.stderr)
+        sys.exit(1)
+    generate_folder(args.covers, args.output, args.workers, args.force)
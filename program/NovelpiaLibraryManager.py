@@ -1,7 +1,6 @@
 import sys
 import os
 import platform
-import datetime
 import subprocess
 
 # --- Automatic Dependency Installation Check ---
@@ -42,7 +41,6 @@ if missing_packages:
 import requests
 from bs4 import BeautifulSoup
 import re
-import time
 from urllib.parse import quote
 
 from selenium.webdriver.chrome.options import Options
@@ -54,41 +52,14 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, WebDriverException
 from webdriver_manager.chrome import ChromeDriverManager
 
+from NovelpiaLogging import LoggingSession # Queue-backed leveled logging (text + JSON lines, rotated)
+from NovelpiaTransport import create_requests_session, requests_session_stats, REQUESTS_TIMEOUT # Pooled keep-alive HTTP
+from NovelpiaRateLimit import SharedRateLimiter, SEARCH_BUCKET # Search budget shared with any other running instance
 
-# --- Custom Logger Class ---
-class Logger(object):
-    """
-    A custom logger that writes output to both stdout/stderr and a log file.
-    The log file is cleared at the beginning of each script execution.
-    """
-    def __init__(self, filename="log.txt"):
-        self.terminal = sys.stdout
-        self.log_file_path = filename
-        # Open in write mode ("w") to clear the file on each start
-        self.log = open(filename, "w", encoding="utf-8") 
-
-    def write(self, message):
-        self.terminal.write(message)
-        self.log.write(message)
-
-    def flush(self):
-        self.terminal.flush()
-        self.log.flush()
-
-    def __enter__(self):
-        sys.stdout = self
-        sys.stderr = self
-        # Write a single start message with timestamp
-        self.log.write(f"--- Log for session started: {datetime.datetime.now()} ---\n\n")
-        self.log.flush() # Ensure this initial message is written immediately
-        return self
-
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        self.log.write(f"\n--- Log for session ended: {datetime.datetime.now()} ---\n")
-        self.log.close()
-        sys.stdout = self.terminal
-        sys.stderr = self.terminal
-# --- End Custom Logger Class ---
+SEARCH_URL_PREFIX = "https://novelpia.com/search/all//1/"
+SEARCH_URL_SUFFIX = "?page=1&rows=30&novel_type=&start_count_book=&end_count_book=&novel_age=&start_days=&sort_col=last_viewdate&novel_genre=&block_out=0&block_stop=0&is_contest=0&is_complete=&is_challenge=0&list_display=list"
+NO_RESULTS_PHRASES = ["검색 결과가 없습니다", "결과 없음"]
+NOVEL_LINK_PATTERN = re.compile(r'/novel/\d+')
 
 
 def normalize_title(title):
@@ -119,6 +90,81 @@ def find_chromedriver_path():
         print("  and place it in the same directory as this script or in your system PATH.")
         return None
 
+def search_url_for(novel_title):
+    encoded_title = quote(novel_title) # Keep original title for search query
+    return SEARCH_URL_PREFIX + encoded_title + SEARCH_URL_SUFFIX
+
+def match_novel_id(page_source, novel_title):
+    """
+    Finds the search result whose normalized title matches `novel_title` in a search page's HTML.
+
+    Returns:
+        str: The novel ID if found and matched, otherwise None.
+    """
+    soup = BeautifulSoup(page_source, 'html.parser')
+
+    for phrase in NO_RESULTS_PHRASES:
+        if phrase in page_source:
+            print(f"  Detected '{phrase}' in page source. Likely no search results.")
+            return None
+
+    # Find all potential novel link tags
+    novel_link_tags = soup.find_all('a', href=NOVEL_LINK_PATTERN)
+
+    if novel_link_tags:
+        normalized_input_title = normalize_title(novel_title)
+        print(f"  Normalized input title for comparison: '{normalized_input_title}'")
+
+        for novel_link_tag in novel_link_tags:
+            title_h6_tag = novel_link_tag.find('h6')
+            if title_h6_tag:
+                found_title = title_h6_tag.get_text().strip()
+                normalized_found_title = normalize_title(found_title)
+                print(f"  Comparing found title '{found_title}' (normalized: '{normalized_found_title}')")
+
+                if normalized_found_title == normalized_input_title:
+                    novel_url = novel_link_tag['href']
+                    match = re.search(r'/novel/(\d+)', novel_url)
+                    if match:
+                        print(f"  MATCH FOUND: Normalized titles match for '{novel_title}' and '{found_title}'.")
+                        return match.group(1)
+                    else:
+                        print("  Error: ID regex match failed on found URL for a matching title.")
+            else:
+                print(f"  No <h6> title tag found within a potential novel link.")
+
+        # If loop finishes without a match
+        print(f"  No exact normalized title match found among search results for '{novel_title}'.")
+    else:
+        print(f"  No <a> tag with href='/novel/ID' found on the page for '{novel_title}'. This could mean no results or changed HTML structure.")
+
+    return None
+
+def get_novel_id_static(http_session, novel_title, rate_limiter=None):
+    """
+    Tries the search over plain (pooled, keep-alive) HTTP before starting a browser.
+    Only trusted when the server-rendered result list already holds novel links, or the page says
+    there are no results; an empty list may still be filled in by JavaScript.
+    A throttling answer is reported to `rate_limiter`, which then holds back every search for its Retry-After.
+
+    Returns:
+        (bool, str): (answered, novel ID or None). answered=False means fall back to Selenium.
+    """
+    try:
+        response = http_session.get(search_url_for(novel_title), timeout=REQUESTS_TIMEOUT)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        if rate_limiter and e.response is not None:
+            rate_limiter.report_response(SEARCH_BUCKET, e.response.status_code, e.response.headers.get("Retry-After"))
+        print(f"  Plain HTTP search failed ({e}); falling back to the browser.")
+        return False, None
+    result_list = BeautifulSoup(response.text, 'html.parser').select_one('div.rand-lists.list')
+    has_results = result_list is not None and result_list.find('a', href=NOVEL_LINK_PATTERN) is not None
+    if not has_results and not any(phrase in response.text for phrase in NO_RESULTS_PHRASES):
+        return False, None # Results are filled in by JavaScript
+    print("  Search results found in the server-rendered page (no browser needed).")
+    return True, match_novel_id(response.text, novel_title)
+
 def get_novel_id(novel_title, chromedriver_path):
     """
     Searches for a novel by title on Novelpia and returns its ID.
@@ -130,11 +176,7 @@ def get_novel_id(novel_title, chromedriver_path):
     Returns:
         str: The novel ID if found and matched, otherwise None.
     """
-    base_search_url_prefix = "https://novelpia.com/search/all//1/"
-    base_search_url_suffix = "?page=1&rows=30&novel_type=&start_count_book=&end_count_book=&novel_age=&start_days=&sort_col=last_viewdate&novel_genre=&block_out=0&block_stop=0&is_contest=0&is_complete=&is_challenge=0&list_display=list"
-
-    encoded_title = quote(novel_title) # Keep original title for search query
-    search_url = base_search_url_prefix + encoded_title + base_search_url_suffix
+    search_url = search_url_for(novel_title)
 
     print(f"\n--- Searching for: '{novel_title}' ---")
     print(f"Generated URL: {search_url}")
@@ -166,52 +208,7 @@ def get_novel_id(novel_title, chromedriver_path):
         except TimeoutException:
             print("  WebDriverWait timed out: '.rand-lists.list' container not found within 20 seconds. This might indicate no results or a page structure change.")
 
-        page_source = driver.page_source
-        
-        soup = BeautifulSoup(page_source, 'html.parser')
-
-        no_results_phrases = ["검색 결과가 없습니다", "결과 없음"]
-        found_no_results = False
-        for phrase in no_results_phrases:
-            if phrase in page_source:
-                print(f"  Detected '{phrase}' in page source. Likely no search results.")
-                found_no_results = True
-                break
-        
-        if found_no_results:
-            return None
-
-        # Find all potential novel link tags
-        novel_link_tags = soup.find_all('a', href=re.compile(r'/novel/\d+'))
-
-        if novel_link_tags:
-            normalized_input_title = normalize_title(novel_title)
-            print(f"  Normalized input title for comparison: '{normalized_input_title}'")
-
-            for novel_link_tag in novel_link_tags:
-                title_h6_tag = novel_link_tag.find('h6')
-                if title_h6_tag:
-                    found_title = title_h6_tag.get_text().strip()
-                    normalized_found_title = normalize_title(found_title)
-                    print(f"  Comparing found title '{found_title}' (normalized: '{normalized_found_title}')")
-
-                    if normalized_found_title == normalized_input_title:
-                        novel_url = novel_link_tag['href']
-                        match = re.search(r'/novel/(\d+)', novel_url)
-                        if match:
-                            print(f"  MATCH FOUND: Normalized titles match for '{novel_title}' and '{found_title}'.")
-                            return match.group(1)
-                        else:
-                            print("  Error: ID regex match failed on found URL for a matching title.")
-                else:
-                    print(f"  No <h6> title tag found within a potential novel link.")
-            
-            # If loop finishes without a match
-            print(f"  No exact normalized title match found among search results for '{novel_title}'.")
-        else:
-            print(f"  No <a> tag with href='/novel/ID' found on the page for '{novel_title}'. This could mean no results or changed HTML structure.")
-
-        return None
+        return match_novel_id(driver.page_source, novel_title)
 
     except WebDriverException as e:
         print(f"ERROR: A WebDriver error occurred for '{novel_title}': {e}")
@@ -253,26 +250,43 @@ def process_novel_list(input_file, output_file):
         print(f"ERROR: Could not read input file '{input_file}': {e}")
         return
 
-    # Find chromedriver once for the entire process
-    chromedriver_path = find_chromedriver_path()
-    if not chromedriver_path:
-        print("\nFATAL ERROR: Chromedriver could not be found or installed. Exiting.")
-        return
+    # One pooled session for every plain HTTP search; chromedriver is only looked up (once) if a browser is needed
+    http_session = create_requests_session()
+    chromedriver_path = None
+    # Every search (plain or browser) takes a token from the shared search bucket and from the
+    # novelpia.com bucket the scraper draws on, so running this next to the scraper or a second
+    # copy of itself doesn't multiply the request rate
+    rate_limiter = SharedRateLimiter()
 
+    browser_unavailable = False # Set once chromedriver can't be found; the plain search still runs for the rest
     results = []
     print(f"\nStarting to process {len(novel_titles)} novels...")
-    for i, title in enumerate(novel_titles):
-        print(f"\nProcessing novel {i+1}/{len(novel_titles)}: {title}")
-        novel_id = get_novel_id(title, chromedriver_path) # Pass chromedriver_path to get_novel_id
-        if novel_id:
-            results.append(f"{title},{novel_id}")
-            print(f"  SUCCESS: Found ID: {novel_id} for '{title}'")
-        else:
-            results.append(f"{title},ID_NOT_FOUND")
-            print(f"  FAILED: ID Not Found for '{title}'")
+    try:
+        for i, title in enumerate(novel_titles):
+            print(f"\nProcessing novel {i+1}/{len(novel_titles)}: {title}")
+            rate_limiter.acquire(SEARCH_BUCKET)
+            answered, novel_id = get_novel_id_static(http_session, title, rate_limiter)
+            if not answered and chromedriver_path is None and not browser_unavailable:
+                chromedriver_path = find_chromedriver_path()
+                if not chromedriver_path:
+                    browser_unavailable = True
+                    print("\nERROR: Chromedriver could not be found or installed. "
+                          "Titles the plain search can't answer are marked ID_NOT_FOUND.")
+            if not answered and chromedriver_path:
+                rate_limiter.acquire(SEARCH_BUCKET)
+                novel_id = get_novel_id(title, chromedriver_path) # Pass chromedriver_path to get_novel_id
+            if novel_id:
+                results.append(f"{title},{novel_id}")
+                print(f"  SUCCESS: Found ID: {novel_id} for '{title}'")
+            else:
+                results.append(f"{title},ID_NOT_FOUND")
+                print(f"  FAILED: ID Not Found for '{title}'")
 
-        # Be polite to the server, especially with multiple searches
-        time.sleep(1.0) # Increased sleep to 1 second for better reliability
+        print(f"\nHTTP connections: {requests_session_stats(http_session)}")
+        print(f"Rate limiter: {rate_limiter.stats()}")
+    finally:
+        http_session.close()
+        rate_limiter.close()
 
     try:
         with open(output_file, 'w', encoding='utf-8', newline='') as f:
@@ -331,8 +345,8 @@ if __name__ == "__main__":
     script_dir = os.path.dirname(os.path.abspath(sys.argv[0]))
     log_file_path = os.path.join(script_dir, "log.txt")
 
-    # Use the custom Logger as a context manager
-    with Logger(log_file_path):
+    # Route prints through the background logger (terminal, log.txt and log.jsonl)
+    with LoggingSession(log_file_path):
         if len(sys.argv) == 3:
             # Mode 1: Generate Novel IDs from an input list (command-line arguments)
             input_novel_list_file = sys.argv[1]
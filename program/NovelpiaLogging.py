@@ -0,0 +1,235 @@
+import os
+import re
+import sys
+import json
+import time
+import queue
+import logging
+import datetime
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# --- Logging Configuration ---
+LOG_LEVEL = logging.INFO
+LOG_MAX_BYTES = 10 * 1024 * 1024 # Rotate a log file beyond this size...
+LOG_BACKUP_COUNT = 10 # ...keeping this many older files (log.txt.1, log.txt.2, ...); every run also starts a new file
+DUPLICATE_WINDOW = 10.0 # Seconds over which repeated warnings/errors are counted
+DUPLICATE_BURST = 5 # Identical (modulo numbers) warnings/errors let through per window; the rest are summarized
+CONSOLE_FORMAT = "%(message)s"
+FILE_FORMAT = "%(asctime)s %(levelname)-7s %(message)s"
+
+_NUMBER_PATTERN = re.compile(r"\d+")
+
+class JsonLineFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message and any `fields` passed via extra=."""
+    def format(self, record):
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "fields", None):
+            entry.update(record.fields)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+class DuplicateSuppressionFilter(logging.Filter):
+    """
+    Lets the first DUPLICATE_BURST copies of a warning/error through per DUPLICATE_WINDOW, keyed by
+    the message with its numbers masked (so "Timeout fetching .../000123" and ".../000124" match).
+    When a window closes, one summary record reports how many copies were dropped.
+    Runs before the record is queued, so a suppressed message costs almost nothing.
+    """
+    def __init__(self, window=DUPLICATE_WINDOW, burst=DUPLICATE_BURST):
+        super().__init__()
+        self.window = window
+        self.burst = burst
+        self._seen = {} # key -> [window_start, count, suppressed, logger, level]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING or getattr(record, "summary", False):
+            return True
+        key = _NUMBER_PATTERN.sub("#", record.getMessage())
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            entry = self._seen.get(key)
+            if entry is None or now - entry[0] >= self.window:
+                if entry and entry[2]:
+                    expired.append((key, entry))
+                entry = self._seen[key] = [now, 0, 0, record.name, record.levelno]
+            entry[1] += 1
+            allowed = entry[1] <= self.burst
+            if not allowed:
+                entry[2] += 1
+        for expired_key, (_, _, suppressed, logger_name, level) in expired:
+            _report_suppressed(logger_name, level, expired_key, suppressed, self.window)
+        return allowed
+
+    def flush_summaries(self):
+        """Reports everything still being suppressed (called on shutdown)."""
+        with self._lock:
+            pending = [(key, entry) for key, entry in self._seen.items() if entry[2]]
+            self._seen.clear()
+        for key, (_, _, suppressed, logger_name, level) in pending:
+            _report_suppressed(logger_name, level, key, suppressed, self.window)
+
+def _report_suppressed(logger_name, level, key, suppressed, window):
+    logging.getLogger(logger_name).log(
+        level, f"(suppressed {suppressed} more like: {key})",
+        extra={"summary": True, "fields": {"suppressed": suppressed, "pattern": key, "window_seconds": window}}
+    )
+
+class _ConsoleHandler(logging.StreamHandler):
+    """Terminal handler: INFO and above, plus partial lines (prompts, '\r' progress) written without a newline.
+    With `errors`, it takes only WARNING and above (meant for stderr); otherwise only what is below WARNING.
+    Records flagged console=False (session markers) only go to the files.
+    """
+    def __init__(self, stream, errors=False):
+        super().__init__(stream)
+        self.errors = errors
+
+    def filter(self, record):
+        if not getattr(record, "console", True):
+            return False
+        if self.errors:
+            return record.levelno >= logging.WARNING
+        return record.levelno < logging.WARNING and (record.levelno >= logging.INFO or getattr(record, "partial", False))
+
+    def emit(self, record):
+        if getattr(record, "partial", False):
+            try:
+                self.stream.write(record.raw_text)
+                self.flush()
+            except Exception:
+                self.handleError(record)
+        else:
+            super().emit(record)
+
+class StreamToLogger(object):
+    """
+    File-like replacement for sys.stdout / sys.stderr that turns every complete line written by
+    print() into a log record, so existing prints need no changes. Lines starting with ERROR or
+    FATAL are logged at ERROR and lines starting with Warning at WARNING; anything else gets
+    `default_level` (WARNING for stderr, where per-page fetch failures and skips are printed).
+    Partial lines that are flushed (input() prompts, '\\r' progress lines) are queued as "partial"
+    records the terminal shows verbatim; progress lines are logged at DEBUG only.
+    Each thread has its own partial-line buffer, kept under a lock, since the cover threads print
+    while the event loop does (print() writes the text and the newline separately); records are
+    logged outside the lock. Writes from forked worker processes (which have no listener thread)
+    bypass the queue.
+    """
+    def __init__(self, logger, default_level, terminal):
+        self.logger = logger
+        self.default_level = default_level
+        self.terminal = terminal
+        self._buffers = {} # Thread ident -> partial line
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _level_for(self, line):
+        stripped = line.lstrip()
+        if stripped[:5].upper() in ("ERROR", "FATAL"):
+            return logging.ERROR
+        if stripped[:7].upper() == "WARNING":
+            return logging.WARNING
+        return self.default_level
+
+    def write(self, message):
+        if os.getpid() != self._pid:
+            self.terminal.write(message)
+            return len(message)
+        thread_id = threading.get_ident()
+        with self._lock:
+            *lines, rest = (self._buffers.pop(thread_id, "") + message).split("\n")
+            if rest:
+                self._buffers[thread_id] = rest
+        for line in lines:
+            self.logger.log(self._level_for(line), line.lstrip("\r"))
+        return len(message)
+
+    def flush(self):
+        if os.getpid() != self._pid:
+            self.terminal.flush()
+            return
+        with self._lock:
+            text = self._buffers.pop(threading.get_ident(), "")
+        if not text:
+            self.terminal.flush()
+            return
+        self.logger.log(logging.DEBUG if text.startswith("\r") else self.default_level, text.strip(),
+                        extra={"partial": True, "raw_text": text})
+
+    def isatty(self):
+        return self.terminal.isatty()
+
+    @property
+    def encoding(self):
+        return self.terminal.encoding
+
+def _rotating_file_handler(path, formatter, level):
+    handler = RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8", delay=True)
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        handler.doRollover() # Keep the previous run as path.1 instead of truncating it
+    handler.setFormatter(formatter)
+    handler.setLevel(level)
+    return handler
+
+class LoggingSession(object):
+    """
+    Replaces the old tee Logger. Inside the `with` block, sys.stdout/sys.stderr feed a queue; a
+    background listener thread does all terminal and disk I/O, so a burst of error prints never
+    blocks the event loop. Output goes to the terminal (warnings and errors to stderr), a rotating text log (`filename`) and a
+    rotating JSON-lines log (`json_filename`, default: filename with a .jsonl extension).
+    """
+    def __init__(self, filename="log.txt", json_filename=None, level=LOG_LEVEL, logger_name="novelpia"):
+        self.log_file_path = filename
+        self.json_file_path = json_filename or os.path.splitext(filename)[0] + ".jsonl"
+        self.level = level
+        self.logger = logging.getLogger(logger_name)
+        self.terminal = sys.stdout
+        self.terminal_error = sys.stderr
+        self._listener = None
+        self._queue_handler = None
+        self._duplicate_filter = DuplicateSuppressionFilter()
+
+    def __enter__(self):
+        log_queue = queue.SimpleQueue()
+        console_handler = _ConsoleHandler(self.terminal)
+        console_handler.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+        error_console_handler = _ConsoleHandler(self.terminal_error, errors=True) # Warnings and errors stay on stderr
+        error_console_handler.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+        text_handler = _rotating_file_handler(self.log_file_path, logging.Formatter(FILE_FORMAT), self.level)
+        json_handler = _rotating_file_handler(self.json_file_path, JsonLineFormatter(), self.level)
+        self._listener = QueueListener(log_queue, console_handler, error_console_handler, text_handler, json_handler, respect_handler_level=True)
+        self._listener.start()
+
+        self._queue_handler = QueueHandler(log_queue)
+        self._queue_handler.addFilter(self._duplicate_filter)
+        self.logger.addHandler(self._queue_handler)
+        self.logger.setLevel(logging.DEBUG) # Handlers decide; partial console lines are DEBUG records
+        self.logger.propagate = False
+
+        sys.stdout = StreamToLogger(self.logger.getChild("stdout"), logging.INFO, self.terminal)
+        sys.stderr = StreamToLogger(self.logger.getChild("stderr"), logging.WARNING, self.terminal_error)
+        self.logger.info(f"--- Log for session started: {datetime.datetime.now()} ---", extra={"console": False})
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        sys.stdout.flush()
+        sys.stderr.flush()
+        self._duplicate_filter.flush_summaries()
+        self.logger.info(f"--- Log for session ended: {datetime.datetime.now()} ---", extra={"console": False})
+        sys.stdout = self.terminal
+        sys.stderr = self.terminal_error
+        self._listener.stop() # Drains the queue before returning
+        self.logger.removeHandler(self._queue_handler)
+        for handler in self._listener.handlers:
+            handler.close()
+
+def get_logger(name):
+    """Returns a logger under the session's 'novelpia' root, for code that logs directly instead of printing."""
+    return logging.getLogger(f"novelpia.{name}")
@@ -0,0 +1,399 @@
+import re
+import sys
+import html as html_lib # For unescaping entities in the single-pass scanner
+
+from bs4 import BeautifulSoup
+
+# Optional fast tree parsers. The scraper works without them, it just parses slower.
+try:
+    from selectolax.lexbor import LexborHTMLParser as SelectolaxHTMLParser
+except ImportError:
+    try:
+        from selectolax.parser import HTMLParser as SelectolaxHTMLParser # selectolax < 0.3.13 (Modest only)
+    except ImportError:
+        SelectolaxHTMLParser = None
+
+try:
+    import lxml.html as lxml_html
+    from lxml.etree import ParserError as LxmlParserError
+except ImportError:
+    lxml_html = None
+
+# --- Page Markers ---
+DELETED_NOVEL_TEXT = "삭제된 소설 입니다."
+WRONG_ACCESS_TEXT = "잘못된 접근입니다."
+TITLE_PATTERN = re.compile(r'노벨피아 - 웹소설로 꿈꾸는 세상! - (.+)')
+NUMBER_PATTERN = re.compile(r'(\d{1,3}(?:,\d{3})*)') # "123" or "123,456"
+ADD_OWN_TAG_TEXT = '+나만의태그 추가' # The "Add my own tag" button inside the tag list
+
+# Fastest first; the first one that is installed is used when no backend is requested.
+BACKEND_PREFERENCE = ("selectolax", "lxml", "scanner", "bs4")
+
+# Page statuses returned by parse_novel_page()
+PAGE_FOUND = "found"
+PAGE_DELETED = "deleted"
+PAGE_WRONG_ACCESS = "wrong_access"
+PAGE_NO_DATA = "no_data"
+
+XML_DECLARATION_PATTERN = re.compile(r'^\s*<\?xml[^>]*\?>') # lxml refuses str input that declares an encoding
+
+def _empty_raw():
+    return {
+        'alert_text': None, 'twitter_title': None, 'twitter_description': None,
+        'og_image': None, 'og_image_type': None, 'author': None, 'tags': [],
+        'age_text': None, 'complete_text': None, 'discontinued': False, 'info_texts': [],
+    }
+
+# --- Backend: BeautifulSoup (html.parser) ---
+def _extract_bs4(html_content):
+    """Reference extractor. Slowest, but always available."""
+    soup = BeautifulSoup(html_content, 'html.parser')
+    raw = {}
+
+    # The specific div to look for is <div id="alert_modal" class="modal fade" ...>
+    alert_modal_div = soup.find('div', id='alert_modal', class_='modal')
+    raw['alert_text'] = alert_modal_div.get_text(strip=True) if alert_modal_div else None
+
+    def _meta_content(**attrs):
+        tag = soup.find('meta', attrs=attrs)
+        if tag and 'content' in tag.attrs:
+            return tag['content']
+        return None
+
+    raw['twitter_title'] = _meta_content(name='twitter:title')
+    raw['twitter_description'] = _meta_content(name='twitter:description')
+    raw['og_image'] = _meta_content(property='og:image')
+    raw['og_image_type'] = _meta_content(property='og:image:type')
+
+    author_tag = soup.find('a', class_='writer-name')
+    raw['author'] = author_tag.get_text(strip=True) if author_tag else None
+
+    tags_container = soup.find('p', class_='writer-tag')
+    raw['tags'] = [span.get_text(strip=True) for span in tags_container.find_all('span', class_='tag')] if tags_container else []
+
+    # <span class="b_19 s_inv">19</span>
+    age_tag = soup.find('span', class_='b_19 s_inv')
+    raw['age_text'] = age_tag.get_text(strip=True) if age_tag else None
+
+    # <span class="b_comp s_inv">완결</span> / <span class="s_inv" style="...">연재중단</span>
+    complete_tag = soup.find('span', class_='b_comp s_inv')
+    raw['complete_text'] = complete_tag.get_text(strip=True) if complete_tag else None
+    raw['discontinued'] = soup.find('span', class_='s_inv', string='연재중단') is not None
+
+    info_count_div = soup.find('div', class_='info-count2')
+    raw['info_texts'] = [p.get_text(strip=True) for p in info_count_div.find_all('p')] if info_count_div else []
+    return raw
+
+
+# --- Backend: selectolax (Lexbor/Modest, C) ---
+def _extract_selectolax(html_content):
+    tree = SelectolaxHTMLParser(html_content)
+    tree.strip_tags(['script', 'style']) # Their text would otherwise end up in text(deep=True), unlike the other backends
+    raw = {}
+
+    def _text(node):
+        return node.text(deep=True, separator='', strip=True) if node is not None else None
+
+    raw['alert_text'] = _text(tree.css_first('div#alert_modal.modal'))
+
+    def _meta_content(selector):
+        node = tree.css_first(selector)
+        return node.attributes.get('content') if node is not None else None
+
+    raw['twitter_title'] = _meta_content('meta[name="twitter:title"]')
+    raw['twitter_description'] = _meta_content('meta[name="twitter:description"]')
+    raw['og_image'] = _meta_content('meta[property="og:image"]')
+    raw['og_image_type'] = _meta_content('meta[property="og:image:type"]')
+
+    raw['author'] = _text(tree.css_first('a.writer-name'))
+
+    tags_container = tree.css_first('p.writer-tag')
+    raw['tags'] = [_text(span) for span in tags_container.css('span.tag')] if tags_container is not None else []
+
+    # Exact class attribute match, like BeautifulSoup's multi-class string lookup
+    raw['age_text'] = _text(tree.css_first('span[class="b_19 s_inv"]'))
+    raw['complete_text'] = _text(tree.css_first('span[class="b_comp s_inv"]'))
+    raw['discontinued'] = any(span.text(deep=True) == '연재중단' for span in tree.css('span.s_inv'))
+
+    info_count_div = tree.css_first('div.info-count2')
+    raw['info_texts'] = [_text(p) for p in info_count_div.css('p')] if info_count_div is not None else []
+    return raw
+
+
+# --- Backend: lxml ---
+def _lxml_has_class(class_name):
+    return f'contains(concat(" ", normalize-space(@class), " "), " {class_name} ")'
+
+def _extract_lxml(html_content):
+    try:
+        root = lxml_html.document_fromstring(XML_DECLARATION_PATTERN.sub('', html_content, count=1))
+    except LxmlParserError: # "Document is empty" (e.g. a whitespace-only body)
+        return _empty_raw()
+    raw = {}
+
+    def _first(xpath):
+        found = root.xpath(xpath)
+        return found[0] if found else None
+
+    def _text(node):
+        if node is None:
+            return None
+        return ''.join(piece.strip() for piece in node.xpath('.//text()[not(parent::script or parent::style)]'))
+
+    raw['alert_text'] = _text(_first(f'//div[@id="alert_modal" and {_lxml_has_class("modal")}]'))
+
+    def _meta_content(attr, value):
+        node = _first(f'//meta[@{attr}="{value}"]')
+        return node.get('content') if node is not None else None
+
+    raw['twitter_title'] = _meta_content('name', 'twitter:title')
+    raw['twitter_description'] = _meta_content('name', 'twitter:description')
+    raw['og_image'] = _meta_content('property', 'og:image')
+    raw['og_image_type'] = _meta_content('property', 'og:image:type')
+
+    raw['author'] = _text(_first(f'//a[{_lxml_has_class("writer-name")}]'))
+
+    tags_container = _first(f'//p[{_lxml_has_class("writer-tag")}]')
+    raw['tags'] = [_text(span) for span in tags_container.xpath(f'.//span[{_lxml_has_class("tag")}]')] if tags_container is not None else []
+
+    raw['age_text'] = _text(_first('//span[@class="b_19 s_inv"]'))
+    raw['complete_text'] = _text(_first('//span[@class="b_comp s_inv"]'))
+    raw['discontinued'] = any(span.text_content() == '연재중단' for span in root.xpath(f'//span[{_lxml_has_class("s_inv")}]'))
+
+    info_count_div = _first(f'//div[{_lxml_has_class("info-count2")}]')
+    raw['info_texts'] = [_text(p) for p in info_count_div.xpath('.//p')] if info_count_div is not None else []
+    return raw
+
+
+# --- Backend: targeted single-pass scanner (pure Python) ---
+# Comments and <script>/<style> bodies are matched (and skipped) so markup inside them is never mistaken for tags
+_START_TAG_PATTERN = re.compile(
+    r'<!--.*?-->|<(?:script|style)\b.*?</(?:script|style)\s*>|<(meta|div|a|p|span)\b((?:"[^"]*"|\'[^\']*\'|[^\'">])*)>',
+    re.IGNORECASE | re.DOTALL)
+_ATTR_PATTERN = re.compile(r'([^\s"\'>/=]+)(?:\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+)))?')
+_TAG_OR_TEXT_PATTERN = re.compile(r'<[^>]*>')
+_COMMENT_OR_RAWTEXT_PATTERN = re.compile(r'<!--.*?-->|<(script|style)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+
+def _scan_attrs(attr_string):
+    attrs = {}
+    for match in _ATTR_PATTERN.finditer(attr_string):
+        name = match.group(1).lower()
+        if name not in attrs: # First occurrence wins, as in the HTML spec
+            value = match.group(2) if match.group(2) is not None else match.group(3) if match.group(3) is not None else match.group(4)
+            attrs[name] = html_lib.unescape(value) if value is not None else ''
+    return attrs
+
+def _scan_inner_html(html_content, tag, start):
+    """Returns the inner HTML of the `tag` element whose start tag ends at `start`, honouring nesting."""
+    depth = 1
+    pattern = re.compile(rf'<(/?){tag}\b[^>]*>', re.IGNORECASE)
+    for match in pattern.finditer(html_content, start):
+        depth += -1 if match.group(1) else 1
+        if depth == 0:
+            return html_content[start:match.start()]
+    return html_content[start:] # Unclosed element runs to the end of the document
+
+def _scan_text(inner_html):
+    """Equivalent of get_text(strip=True): every text node stripped and concatenated."""
+    inner_html = _COMMENT_OR_RAWTEXT_PATTERN.sub('<>', inner_html)
+    pieces = (html_lib.unescape(piece).strip() for piece in _TAG_OR_TEXT_PATTERN.split(inner_html))
+    return ''.join(piece for piece in pieces if piece)
+
+def _scan_raw_text(inner_html):
+    """Unstripped text content, used for exact string comparisons."""
+    inner_html = _COMMENT_OR_RAWTEXT_PATTERN.sub('<>', inner_html)
+    return html_lib.unescape(''.join(_TAG_OR_TEXT_PATTERN.split(inner_html)))
+
+def _extract_scanner(html_content):
+    """Walks the start tags once and only materializes the handful of elements we care about."""
+    raw = _empty_raw()
+    seen_meta = set()
+    found_alert = found_author = found_tags = found_age = found_complete = found_info = False
+
+    for match in _START_TAG_PATTERN.finditer(html_content):
+        if match.group(1) is None: # Comment or raw-text block
+            continue
+        tag = match.group(1).lower()
+        attr_string = match.group(2)
+        if tag == 'meta':
+            attrs = _scan_attrs(attr_string)
+            key = ('name', attrs.get('name')) if 'name' in attrs else ('property', attrs.get('property'))
+            if key in seen_meta:
+                continue
+            seen_meta.add(key)
+            field = {
+                ('name', 'twitter:title'): 'twitter_title',
+                ('name', 'twitter:description'): 'twitter_description',
+                ('property', 'og:image'): 'og_image',
+                ('property', 'og:image:type'): 'og_image_type',
+            }.get(key)
+            if field:
+                raw[field] = attrs.get('content')
+            continue
+
+        # Cheap substring test before parsing attributes of the (many) uninteresting tags
+        if 'class' not in attr_string and 'id' not in attr_string:
+            continue
+        attrs = _scan_attrs(attr_string)
+        class_value = attrs.get('class', '')
+        classes = class_value.split()
+
+        if tag == 'div':
+            if not found_alert and attrs.get('id') == 'alert_modal' and 'modal' in classes:
+                found_alert = True
+                raw['alert_text'] = _scan_text(_scan_inner_html(html_content, 'div', match.end()))
+            elif not found_info and 'info-count2' in classes:
+                found_info = True
+                inner = _scan_inner_html(html_content, 'div', match.end())
+                raw['info_texts'] = [
+                    _scan_text(_scan_inner_html(inner, 'p', p_match.end()))
+                    for p_match in re.finditer(r'<p\b[^>]*>', inner, re.IGNORECASE)
+                ]
+        elif tag == 'a':
+            if not found_author and 'writer-name' in classes:
+                found_author = True
+                raw['author'] = _scan_text(_scan_inner_html(html_content, 'a', match.end()))
+        elif tag == 'p':
+            if not found_tags and 'writer-tag' in classes:
+                found_tags = True
+                inner = _scan_inner_html(html_content, 'p', match.end())
+                for span_match in _START_TAG_PATTERN.finditer(inner):
+                    if (span_match.group(1) or '').lower() == 'span' and 'tag' in _scan_attrs(span_match.group(2)).get('class', '').split():
+                        raw['tags'].append(_scan_text(_scan_inner_html(inner, 'span', span_match.end())))
+        elif tag == 'span':
+            if not found_age and class_value == 'b_19 s_inv':
+                found_age = True
+                raw['age_text'] = _scan_text(_scan_inner_html(html_content, 'span', match.end()))
+            elif not found_complete and class_value == 'b_comp s_inv':
+                found_complete = True
+                raw['complete_text'] = _scan_text(_scan_inner_html(html_content, 'span', match.end()))
+            if not raw['discontinued'] and 's_inv' in classes:
+                if _scan_raw_text(_scan_inner_html(html_content, 'span', match.end())) == '연재중단':
+                    raw['discontinued'] = True
+    return raw
+
+
+_BACKEND_EXTRACTORS = {
+    "selectolax": (_extract_selectolax, lambda: SelectolaxHTMLParser is not None),
+    "lxml": (_extract_lxml, lambda: lxml_html is not None),
+    "scanner": (_extract_scanner, lambda: True),
+    "bs4": (_extract_bs4, lambda: True),
+}
+
+def available_backends():
+    """Returns the names of the backends usable in this environment, fastest first."""
+    return [name for name in BACKEND_PREFERENCE if _BACKEND_EXTRACTORS[name][1]()]
+
+def select_backend(preferred=None):
+    """Returns `preferred` if it is available, otherwise the fastest available backend."""
+    usable = available_backends()
+    if preferred:
+        if preferred in usable:
+            return preferred
+        print(f"Warning: Parser backend '{preferred}' is not available, falling back to '{usable[0]}'.", file=sys.stderr)
+    return usable[0]
+
+DEFAULT_BACKEND = select_backend()
+
+
+# --- Shared Post-Processing ---
+def _build_novel_data(raw, novel_id_str):
+    """Turns raw extracted strings into the metadata dict. Returns (page_status, novel_data)."""
+    alert_text = raw['alert_text']
+    if alert_text:
+        if DELETED_NOVEL_TEXT in alert_text:
+            return PAGE_DELETED, None
+        elif WRONG_ACCESS_TEXT in alert_text:
+            return PAGE_WRONG_ACCESS, None
+
+    # 1. Title
+    title = None
+    if raw['twitter_title'] is not None:
+        match = TITLE_PATTERN.search(raw['twitter_title'])
+        if match:
+            title = match.group(1).strip()
+
+    # 2. Synopsis
+    synopsis = raw['twitter_description'].strip() if raw['twitter_description'] is not None else None
+
+    # 3. Tags (exclude empty tags and the "Add my own tag" button)
+    tags = [tag_text for tag_text in raw['tags'] if tag_text and tag_text != ADD_OWN_TAG_TEXT]
+
+    # 4. Publication status, defaulting to "serializing"
+    publication_status = "연재중"
+    if raw['complete_text'] == '완결':
+        publication_status = "완결"
+    elif raw['discontinued']:
+        publication_status = "연재중단"
+
+    # 5. Cover image URL, skipping known placeholder images
+    cover_url = None
+    extracted_url = raw['og_image']
+    if extracted_url is not None and not ("novelpia.com/img/" in extracted_url and ".jpg" in extracted_url):
+        cover_url = extracted_url
+    cover_mime_type = raw['og_image_type'].strip() if raw['og_image_type'] is not None else None
+
+    # 6. Like count ("선호") and chapter count ("회차")
+    like_count = None
+    chapter_count = None
+    for text in raw['info_texts']:
+        number_match = NUMBER_PATTERN.search(text)
+        if number_match:
+            extracted_number_str = number_match.group(1).replace(',', '') # Remove commas
+            try:
+                extracted_number = int(extracted_number_str)
+                if '선호' in text:
+                    like_count = extracted_number
+                elif '회차' in text:
+                    chapter_count = extracted_number
+            except ValueError:
+                print(f"Warning: Could not convert '{extracted_number_str}' to int in '{text}'", file=sys.stderr)
+
+    # Only return data if a title was found, indicating a valid novel page
+    if not title:
+        return PAGE_NO_DATA, None
+    return PAGE_FOUND, {
+        "id": novel_id_str,
+        "title": title,
+        "synopsis": synopsis,
+        "author": raw['author'],
+        "tags": tags,
+        "is_adult": raw['age_text'] == '19',
+        "publication_status": publication_status,
+        "cover_url": cover_url,
+        "cover_mime_type": cover_mime_type,
+        "cover_local_path": None, # Placeholder for local path, will be filled later
+        "like_count": like_count,
+        "chapter_count": chapter_count
+    }
+
+
+# --- Public API ---
+def parse_novel_page(html_content, novel_id_str, backend=None):
+    """Parses a novel page with the given (or fastest available) backend.
+    Returns (page_status, novel_data) where page_status is one of PAGE_FOUND, PAGE_DELETED,
+    PAGE_WRONG_ACCESS or PAGE_NO_DATA, and novel_data is None unless the novel was found.
+    """
+    if not html_content:
+        return PAGE_NO_DATA, None
+    extractor = _BACKEND_EXTRACTORS[backend or DEFAULT_BACKEND][0]
+    return _build_novel_data(extractor(html_content), novel_id_str)
+
+def parse_novel_data(html_content, novel_id_str, backend=None):
+    """Parses the HTML content to extract novel title, synopsis, author, tags, age rating, publication status, cover URL, like count, and chapter count.
+    Returns None if the page indicates a deleted novel or incorrect access.
+    """
+    return parse_novel_page(html_content, novel_id_str, backend)[1]
+
+def parse_novel_batch(pages, backend=None):
+    """Parses a batch of (html_content, novel_id_str) pairs in one call (used by the process pool).
+    Returns a list aligned with `pages` holding (page_status, novel_data) tuples, or the exception
+    raised for that page so one bad page doesn't fail the whole batch.
+    """
+    results = []
+    for html_content, novel_id_str in pages:
+        try:
+            results.append(parse_novel_page(html_content, novel_id_str, backend))
+        except Exception as e:
+            results.append(e)
+    return results
@@ -0,0 +1,179 @@
+import time
+import sqlite3
+import asyncio
+import threading
+import email.utils
+from urllib.parse import urlsplit
+
+# --- Rate Limit Configuration ---
+RATE_LIMIT_DB_FILE = "novelpia_rate_limit.sqlite3" # Shared by every scraper/worker/library-manager process started in this directory
+SEARCH_BUCKET = "novelpia.com/search" # The library manager's title searches get a slower bucket of their own
+RATE_LIMITS = { # Bucket -> (tokens per second, burst); the budget for the whole fleet, not per process
+    "novelpia.com": (5.0, 10), # The original scraper made one request at a time; stay in that range
+    "images.novelpia.com": (5.0, 10),
+    SEARCH_BUCKET: (1.0, 1),
+}
+BUCKET_PARENTS = { # Bucket -> the bucket it is a sub-limit of; a take from it takes from the parent too
+    SEARCH_BUCKET: "novelpia.com",
+}
+DEFAULT_RATE_LIMIT = (30.0, 60) # Any other host (e.g. a local fixture server)
+THROTTLE_STATUS_CODES = (429, 503)
+THROTTLE_PAUSE_WITHOUT_RETRY_AFTER = 2.0 # Fleet-wide pause after a throttling answer that carries no Retry-After
+MAX_RETRY_AFTER = 600.0 # Longer Retry-After values are capped (a misconfigured header shouldn't park the fleet for hours)
+LOCK_TIMEOUT = 30.0 # Seconds to wait for another process holding the bucket database
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    bucket TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL,
+    blocked_until REAL NOT NULL DEFAULT 0
+);
+"""
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date), or None."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return min(float(value), MAX_RETRY_AFTER)
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return min(max(0.0, retry_at.timestamp() - time.time()), MAX_RETRY_AFTER)
+
+def bucket_for_url(url):
+    return urlsplit(url).hostname or ""
+
+class SharedRateLimiter(object):
+    """
+    Token buckets kept in a small SQLite file, so every process on this machine draws from the same
+    budget per host. Each take is one short BEGIN IMMEDIATE transaction (SQLite's file lock makes it
+    atomic across processes): refill by elapsed time, then take a token or report how long to wait.
+    A throttling answer blocks the whole bucket until its Retry-After has passed, for every process.
+    A sub-limit bucket (BUCKET_PARENTS) only hands out a token when its parent has one as well.
+    """
+    def __init__(self, path=RATE_LIMIT_DB_FILE, limits=None):
+        self.path = path
+        self.limits = dict(RATE_LIMITS, **(limits or {}))
+        self.connection = sqlite3.connect(path, timeout=LOCK_TIMEOUT, isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL") # No fsync per take; in WAL mode a crash can only lose the last few token updates
+        self.connection.executescript(_SCHEMA)
+        self._lock = threading.Lock() # One connection, possibly used from executor threads
+        self.counts = {"tokens": 0, "waits": 0, "wait_seconds": 0.0, "blocks": 0}
+
+    def _take(self, bucket):
+        """Takes a token from the bucket and its parents if each has one available.
+        Returns 0.0, or the seconds to wait before trying again.
+        """
+        chain = [bucket]
+        while chain[-1] in BUCKET_PARENTS:
+            chain.append(BUCKET_PARENTS[chain[-1]])
+        with self._lock:
+            now = time.time()
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                states = []
+                for name in chain:
+                    rate, burst = self.limits.get(name, DEFAULT_RATE_LIMIT)
+                    row = self.connection.execute("SELECT tokens, updated, blocked_until FROM buckets WHERE bucket = ?", (name,)).fetchone()
+                    tokens, updated, blocked_until = row if row else (float(burst), now, 0.0)
+                    states.append([name, min(float(burst), tokens + max(0.0, now - updated) * rate), blocked_until, rate])
+                wait = 0.0
+                for _, tokens, blocked_until, rate in states:
+                    if now < blocked_until:
+                        wait = max(wait, blocked_until - now)
+                    elif tokens < 1.0:
+                        wait = max(wait, (1.0 - tokens) / rate)
+                for state in states:
+                    if not wait:
+                        state[1] -= 1.0
+                    self.connection.execute(
+                        "INSERT OR REPLACE INTO buckets (bucket, tokens, updated, blocked_until) VALUES (?, ?, ?, ?)",
+                        (state[0], state[1], now, state[2])
+                    )
+                self.connection.execute("COMMIT")
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+        return wait
+
+    def _count(self, waited):
+        self.counts["tokens"] += 1
+        if waited:
+            self.counts["waits"] += 1
+            self.counts["wait_seconds"] += waited
+
+    def acquire(self, bucket):
+        """Blocks until a token is taken from `bucket`. Returns the seconds spent waiting."""
+        waited = 0.0
+        while True:
+            wait = self._take(bucket)
+            if not wait:
+                self._count(waited)
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    async def acquire_async(self, bucket):
+        """Like acquire(), without blocking the event loop: each take runs in the default executor
+        (it may wait on another process's lock) and waits are asyncio sleeps.
+        """
+        loop = asyncio.get_running_loop()
+        waited = 0.0
+        while True:
+            wait = await loop.run_in_executor(None, self._take, bucket)
+            if not wait:
+                self._count(waited)
+                return waited
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def block(self, bucket, seconds):
+        """Stops every process from taking tokens from `bucket` for `seconds` (never shortens a block)."""
+        with self._lock:
+            until = time.time() + seconds
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                self.connection.execute(
+                    "INSERT INTO buckets (bucket, tokens, updated, blocked_until) VALUES (?, 0, ?, ?)"
+                    " ON CONFLICT(bucket) DO UPDATE SET blocked_until = MAX(blocked_until, excluded.blocked_until)",
+                    (bucket, time.time(), until)
+                )
+                self.connection.execute("COMMIT")
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+        self.counts["blocks"] += 1
+
+    @staticmethod
+    def _block_seconds(status, retry_after_header):
+        """How long a response should block its bucket, or None if it is not a throttling answer."""
+        if status not in THROTTLE_STATUS_CODES:
+            return None
+        retry_after = parse_retry_after(retry_after_header)
+        if retry_after is None and status == 429: # A 503 without Retry-After is more likely an outage than throttling
+            retry_after = THROTTLE_PAUSE_WITHOUT_RETRY_AFTER
+        return retry_after
+
+    def report_response(self, bucket, status, retry_after_header):
+        """Honors a throttling answer: blocks the bucket for its Retry-After (or a short default pause)."""
+        seconds = self._block_seconds(status, retry_after_header)
+        if seconds is not None:
+            self.block(bucket, seconds)
+
+    async def report_response_async(self, bucket, status, retry_after_header):
+        """Like report_response(), with the block written in the default executor (it may wait on another process's lock)."""
+        seconds = self._block_seconds(status, retry_after_header)
+        if seconds is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.block, bucket, seconds)
+
+    def stats(self):
+        return dict(self.counts, wait_seconds=round(self.counts["wait_seconds"], 3))
+
+    def close(self):
+        with self._lock: # A take cancelled on the loop may still be running in the executor
+            self.connection.close()
@@ -0,0 +1,180 @@
+import heapq
+import random
+
+# --- Density Scheduler Configuration ---
+DENSITY_BLOCK_SIZE = 1000 # IDs per block whose live/dead density is tracked
+DENSITY_CHUNK_SIZE = 50 # IDs handed out from one block before the best block is picked again
+DENSITY_PRIOR_WEIGHT = 5 # Pseudo-observations of the global live share given to every block (unvisited blocks start there)
+DENSITY_SPARSE_THRESHOLD = 0.03 # Blocks whose estimated live share is below this are sampled, not swept...
+DENSITY_MIN_OBSERVATIONS = 100 # ...once at least this many of their IDs have a known outcome
+DENSITY_SPARSE_SAMPLE_SIZE = 20 # Random pending IDs fetched per sparse block per run
+DENSITY_SWEEP_SPARSE_BLOCKS = False # True: after everything else, sweep the rest of the sparse blocks too
+
+# --- Refresh Schedule Configuration ---
+DAY = 24 * 60 * 60
+REFRESH_MIN_INTERVAL = 1 * DAY # Shortest gap between two refreshes of a serializing (연재중) novel
+REFRESH_SETTLED_MIN_INTERVAL = 14 * DAY # ...and of a complete (완결) or discontinued (연재중단) one
+REFRESH_MAX_INTERVAL = 120 * DAY
+REFRESH_BACKOFF_FACTOR = 2.0 # Interval multiplied by this after an unchanged check, divided by it after a change
+REFRESH_JITTER = 0.1 # +/- share of the interval, so novels checked together don't stay in lockstep
+SETTLED_PUBLICATION_STATUSES = ("완결", "연재중단")
+
+def next_refresh_interval(interval, changed, publication_status):
+    """Exponential backoff for stable records: the gap to the next refresh doubles while a novel stays
+    unchanged and halves when it changes, within bounds that are wider for complete novels.
+    `interval` is None for a novel that has never been refreshed.
+    """
+    if interval is None:
+        interval = REFRESH_MIN_INTERVAL
+    else:
+        interval = interval / REFRESH_BACKOFF_FACTOR if changed else interval * REFRESH_BACKOFF_FACTOR
+    floor = REFRESH_SETTLED_MIN_INTERVAL if publication_status in SETTLED_PUBLICATION_STATUSES else REFRESH_MIN_INTERVAL
+    return min(REFRESH_MAX_INTERVAL, max(floor, interval))
+
+def next_refresh_due(now, interval, rng=random):
+    return now + interval * rng.uniform(1 - REFRESH_JITTER, 1 + REFRESH_JITTER)
+
+class _Block(object):
+    __slots__ = ("number", "low", "high", "cursor", "live", "dead", "sampled", "sample_taken", "version")
+
+    def __init__(self, number, low, high, live, dead):
+        self.number = number
+        self.low = low
+        self.high = high
+        self.cursor = low # Next ID the sweep looks at
+        self.live = live
+        self.dead = dead
+        self.sampled = set() # IDs already handed out as samples (the sweep skips them)
+        self.sample_taken = False
+        self.version = 0 # Bumped on every observation; stale heap entries are skipped
+
+class DensityScheduler(object):
+    """
+    Orders the pending IDs of a range by how likely they are to be live novels, instead of walking
+    them in ID order. Each block of DENSITY_BLOCK_SIZE IDs keeps live/dead counts, seeded from the
+    crawl state store (which already holds forbidden.txt and the JSONL output once imported) and
+    updated as results come back through observe(). The producer always draws its next chunk from
+    the block with the best estimate; blocks that turn out nearly dead are only sampled, and the
+    rest of them is left pending for a later run (or swept last if DENSITY_SWEEP_SPARSE_BLOCKS).
+    """
+    def __init__(self, id_index, block_counts, start_id, end_id, block_size=DENSITY_BLOCK_SIZE, seed=None):
+        self.id_index = id_index
+        self.block_size = block_size
+        self.random = random.Random(seed) # A different sample per run, so sparse blocks get covered over time
+        total_live = sum(live for live, _ in block_counts.values())
+        total_known = sum(live + dead for live, dead in block_counts.values())
+        self.prior_live_share = (total_live + 1) / (total_known + 2)
+        self.blocks = {}
+        for number in range(start_id // block_size, end_id // block_size + 1):
+            live, dead = block_counts.get(number, (0, 0))
+            low = max(start_id, number * block_size)
+            high = min(end_id, (number + 1) * block_size - 1)
+            self.blocks[number] = _Block(number, low, high, live, dead)
+        self._heap = [(-self.estimate(block), block.number, block.version) for block in self.blocks.values()]
+        heapq.heapify(self._heap)
+        self._dirty = set()
+        self.sparse_blocks = set()
+        self.ids_scheduled = 0
+
+    def estimate(self, block):
+        """Estimated live share of a block: its own counts, smoothed towards the global share."""
+        return (block.live + DENSITY_PRIOR_WEIGHT * self.prior_live_share) / (block.live + block.dead + DENSITY_PRIOR_WEIGHT)
+
+    def is_sparse(self, block):
+        return block.live + block.dead >= DENSITY_MIN_OBSERVATIONS and self.estimate(block) < DENSITY_SPARSE_THRESHOLD
+
+    def observe(self, novel_id, is_live):
+        """Feeds back one fetched ID's outcome."""
+        block = self.blocks.get(int(novel_id) // self.block_size)
+        if block is None:
+            return
+        if is_live:
+            block.live += 1
+        else:
+            block.dead += 1
+        block.version += 1
+        self._dirty.add(block.number)
+
+    def _sweep(self, block, limit):
+        """Next `limit` pending IDs of a block from its cursor, skipping ones already sampled."""
+        chunk = []
+        for novel_id in self.id_index.iter_pending(block.cursor, block.high):
+            block.cursor = novel_id + 1
+            if novel_id in block.sampled:
+                continue
+            chunk.append(novel_id)
+            if len(chunk) >= limit:
+                return chunk
+        block.cursor = block.high + 1
+        return chunk
+
+    def _sample(self, block):
+        block.sample_taken = True
+        candidates = range(block.cursor, block.high + 1)
+        picks = self.random.sample(candidates, min(len(candidates), DENSITY_SPARSE_SAMPLE_SIZE * 4))
+        chunk = [novel_id for novel_id in picks if self.id_index.is_pending(novel_id)][:DENSITY_SPARSE_SAMPLE_SIZE]
+        block.sampled.update(chunk)
+        return sorted(chunk)
+
+    def _next_chunk(self):
+        for number in self._dirty:
+            block = self.blocks[number]
+            heapq.heappush(self._heap, (-self.estimate(block), number, block.version))
+        self._dirty.clear()
+        while self._heap:
+            _, number, version = heapq.heappop(self._heap)
+            block = self.blocks[number]
+            if version != block.version or block.cursor > block.high:
+                continue # Stale entry, or the block is exhausted
+            if self.is_sparse(block):
+                self.sparse_blocks.add(number)
+                if block.sample_taken:
+                    continue # Comes back only if observe() lifts its estimate
+                chunk = self._sample(block)
+            else:
+                chunk = self._sweep(block, DENSITY_CHUNK_SIZE)
+            self._dirty.add(number) # Re-queued with its latest estimate on the next call
+            if chunk:
+                return chunk
+        return None
+
+    def iter_ids(self):
+        """Lazily yields pending IDs, best blocks first. Meant as run_id_pipeline()'s ID source:
+        since the queue is bounded, every chunk is chosen with up-to-date observations.
+        """
+        while True:
+            chunk = self._next_chunk()
+            if chunk is None:
+                break
+            self.ids_scheduled += len(chunk)
+            yield from chunk
+        if DENSITY_SWEEP_SPARSE_BLOCKS:
+            for number in sorted(self.sparse_blocks):
+                block = self.blocks[number]
+                while block.cursor <= block.high:
+                    chunk = self._sweep(block, DENSITY_CHUNK_SIZE)
+                    self.ids_scheduled += len(chunk)
+                    yield from chunk
+
+    def deferred_at_start(self):
+        """(sparse blocks, pending IDs this run leaves in them) for the blocks the seed counts already
+        mark sparse: all but DENSITY_SPARSE_SAMPLE_SIZE of each block's pending IDs, or none if
+        DENSITY_SWEEP_SPARSE_BLOCKS. Blocks found sparse during the run defer more.
+        """
+        sparse = [block for block in self.blocks.values() if self.is_sparse(block)]
+        if DENSITY_SWEEP_SPARSE_BLOCKS:
+            return len(sparse), 0
+        return len(sparse), sum(max(0, self.id_index.count_pending(block.low, block.high) - DENSITY_SPARSE_SAMPLE_SIZE) for block in sparse)
+
+    def stats(self):
+        left_pending = sum(
+            1 for number in self.sparse_blocks for novel_id in range(self.blocks[number].cursor, self.blocks[number].high + 1)
+            if novel_id not in self.blocks[number].sampled and self.id_index.is_pending(novel_id)
+        )
+        return {
+            "blocks": len(self.blocks),
+            "sparse_blocks": len(self.sparse_blocks),
+            "ids_scheduled": self.ids_scheduled,
+            "ids_left_in_sparse_blocks": left_pending,
+            "prior_live_share": round(self.prior_live_share, 4),
+        }
@@ -1,23 +1,19 @@
 import asyncio
 import aiohttp
-from bs4 import BeautifulSoup
 import re
 import time
 import os
 import sys
 import json # Import json for structured output
 import platform # For platform specific path handling
-import datetime # For logging timestamps
 import subprocess # For automatic dependency installation
-from io import BytesIO # For handling image content in memory
 
 # --- Automatic Dependency Installation Check ---
 required_packages = {
     "requests": "requests",
     "bs4": "beautifulsoup4", # Package name for pip is 'beautifulsoup4'
     "aiohttp": "aiohttp",
-    "Pillow": "Pillow", # Added Pillow as it's used for image conversion
-    "exifread": "exifread" # Added exifread for EXIF data parsing
+    "Pillow": "Pillow" # Cover verification and re-encoding (NovelpiaCovers) and derivatives
 }
 
 missing_packages = []
@@ -32,8 +28,6 @@ for module_name, pip_name in required_packages.items():
             import requests
         elif module_name == "Pillow": # Check for Pillow
             from PIL import Image
-        elif module_name == "exifread": # Check for exifread
-            import exifread
         else:
             __import__(module_name)
     except ImportError:
@@ -62,42 +56,25 @@ if missing_packages:
 # (Some might be imported above for the check, but re-importing ensures consistency)
 import asyncio
 import aiohttp
-from bs4 import BeautifulSoup
-from PIL import Image # Ensure Image is imported for cover conversion
-import exifread # Ensure exifread is imported
 import time
-
-# --- Custom Logger Class ---
-class Logger(object):
-    """
-    A custom logger that writes output to both stdout/stderr and a log file.
-    The log file is cleared at the beginning of each script execution.
-    """
-    def __init__(self, filename="log.txt"):
-        self.terminal = sys.stdout
-        self.log_file_path = filename
-        self.log = open(filename, "w", encoding="utf-8") 
-
-    def write(self, message):
-        self.terminal.write(message)
-        self.log.write(message)
-
-    def flush(self):
-        self.terminal.flush()
-        self.log.flush()
-
-    def __enter__(self):
-        sys.stdout = self
-        sys.stderr = self
-        self.log.write(f"--- Log for session started: {datetime.datetime.now()} ---\n\n")
-        self.log.flush()
-        return self
-
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        self.log.write(f"\n--- Log for session ended: {datetime.datetime.now()} ---\n")
-        self.log.close()
-        sys.stdout = self.terminal
-        sys.stderr = self.terminal
+import heapq
+import random
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from NovelpiaDerivatives import DerivativeManifest
+from NovelpiaCovers import finalize_cover, find_existing_cover, covers_folder_size, remove_stale_partial_downloads, CoverStore, COVER_PLACEHOLDER_STATE, COVER_EVICTED_STATE
+from NovelpiaParser import parse_novel_page, parse_novel_batch, select_backend
+from NovelpiaParser import PAGE_FOUND, PAGE_DELETED, PAGE_WRONG_ACCESS, PAGE_NO_DATA
+from NovelpiaState import CrawlStateStore, STATE_DB_FILE, ID_INDEX_FILE, ID_INDEX_CAPACITY
+from NovelpiaState import STATUS_OK, STATUS_DELETED, STATUS_WRONG_ACCESS, STATUS_NO_DATA, STATUS_NETWORK_ERROR, STATUS_PARSE_ERROR, content_hash
+from NovelpiaCache import HtmlResponseCache, reparse_cache_to_jsonl, HTML_CACHE_FILE
+from NovelpiaStats import ScrapeStats, StatsExporter
+from NovelpiaScheduler import DensityScheduler, DENSITY_BLOCK_SIZE
+from NovelpiaScheduler import next_refresh_interval, next_refresh_due
+from NovelpiaTransport import HttpTransport, create_session, PAGE_LIMIT_PER_HOST, PAGE_TIMEOUT, COVER_LIMIT_PER_HOST, COVER_TIMEOUT
+from NovelpiaRateLimit import SharedRateLimiter, bucket_for_url
+from NovelpiaLogging import LoggingSession
 
 # --- Configuration (Defaults, will be overridden by user input) ---
 DEFAULT_START_ID = 0 # Default start ID
@@ -105,93 +82,558 @@ DEFAULT_END_ID = 999999 # Default end ID
 OUTPUT_FILE_TITLES = "novelpia_titles.txt"
 OUTPUT_FILE_METADATA = "novelpia_metadata.jsonl"
 DOWNLOAD_COVERS_FOLDER = "novelpia_covers"
-FORBIDDEN_FILE = "forbidden.txt"
+FORBIDDEN_FILE = "forbidden.txt" # Legacy; imported once into the state store (STATE_DB_FILE)
+PAGE_STATUS_TO_STATE = {PAGE_DELETED: STATUS_DELETED, PAGE_WRONG_ACCESS: STATUS_WRONG_ACCESS, PAGE_NO_DATA: STATUS_NO_DATA}
 CONCURRENT_REQUESTS_LIMIT = 1
+ADAPTIVE_MIN_CONCURRENCY = 1
+ADAPTIVE_MAX_CONCURRENCY = 32
+ADAPTIVE_WINDOW_SIZE = 50
+ADAPTIVE_TARGET_SUCCESS_RATE = 0.95
+ADAPTIVE_LATENCY_TOLERANCE = 2.0
+ADAPTIVE_BACKOFF_FACTOR = 0.5
+ADAPTIVE_LATENCY_BACKOFF_FACTOR = 0.8
+ADAPTIVE_BACKOFF_COOLDOWN = 5.0
+THROTTLE_STATUS_CODES = (429, 503)
+RATE_LIMIT_ENABLED = True
+NOVELPIA_BASE_URL = "https://novelpia.com" # Point at a local fixture server (benchmarks/fixture_server.py) to test without the real site
+NOT_MODIFIED = "NOT_MODIFIED"
+PARSER_BACKEND = None # None = fastest available; or one of "selectolax", "lxml", "scanner", "bs4"
+PARSER_PROCESS_COUNT = os.cpu_count() or 1 # Parser worker processes; 0 parses inline on the event loop
+PARSER_BATCH_SIZE = 16
+PARSER_BATCH_MAX_DELAY = 0.05
 MAX_CONSECUTIVE_NETWORK_ERRORS_FOR_PROMPT = 100000
 MAX_CONSECUTIVE_COVER_DOWNLOAD_ERRORS = 10
+COVER_PROCESSING_WORKERS = os.cpu_count() or 1
+COVER_STORAGE_MODE = "passthrough" # "passthrough": keep the server's bytes unless the NovelpiaCovers policy says re-encode; "transcode": always re-encode to JPEG
+COVER_STREAM_CHUNK_SIZE = 64 * 1024
+COVER_STORE_ENABLED = True
+COVER_DERIVATIVES_ENABLED = True
+COVER_BACKFILL_STATES = ("SKIPPED_LIMIT", "DOWNLOAD_FAILED", COVER_EVICTED_STATE)
+PIPELINE_WORKER_COUNT = ADAPTIVE_MAX_CONCURRENCY * 2
+PIPELINE_QUEUE_SIZE = PIPELINE_WORKER_COUNT * 4
+RETRY_MAX_ATTEMPTS = 4
+RETRY_BASE_DELAY = 2.0
+RETRY_MAX_DELAY = 60.0
+HTML_CACHE_ENABLED = False
+HTML_CACHE_MAX_GB = 2.0
+STATS_JSON_FILE = "novelpia_stats.json"
+STATS_EXPORT_INTERVAL = 10.0
+STATS_PROMETHEUS_PORT = None # e.g. 9109 to serve /metrics (Prometheus text) and /stats.json on 127.0.0.1
+FRONTIER_DISCOVERY_ENABLED = True
+FRONTIER_EXISTING_STATUSES = (PAGE_FOUND, PAGE_DELETED)
+FRONTIER_INITIAL_STEP = 1024
+FRONTIER_PROBE_WIDTH = 16
+FRONTIER_GAP_WINDOWS = 3
+FRONTIER_GAP_SPACING = 256
+FRONTIER_MAX_ID = DEFAULT_END_ID
+FRONTIER_PROBE_RETRIES = 3
+FRONTIER_MARGIN = 200
+FRONTIER_TAIL_LOOKBACK = 100
+FRONTIER_LIMIT_END_ID = None # Crawl only up to the discovered frontier? None = ask; True / False answer for unattended runs
+REFRESH_REQUEST_BUDGET = 5000 # Most page requests one refresh run makes, most overdue novels first (None = every due novel)
+DENSITY_SCHEDULING_ENABLED = False # True: densest blocks first; nearly-dead blocks are only sampled and the rest is deferred
+
+# --- Adaptive Concurrency Controller ---
+def _percentile(values, percent):
+    """Returns the given percentile (0-100) of a list of numbers, or None if it is empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(percent / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+class AdaptiveConcurrencyController(object):
+    """
+    AIMD (additive-increase / multiplicative-decrease) limiter used in place of a fixed semaphore.
+    The window grows by one slot after every healthy evaluation window in which it was saturated,
+    and shrinks multiplicatively on throttling responses (429/503), timeouts, a low success rate
+    or p95 latency rising well above the healthy baseline.
+    """
+    def __init__(self, initial_limit=CONCURRENT_REQUESTS_LIMIT, min_limit=ADAPTIVE_MIN_CONCURRENCY,
+                 max_limit=ADAPTIVE_MAX_CONCURRENCY, window_size=ADAPTIVE_WINDOW_SIZE):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(max(min_limit, min(max_limit, initial_limit)))
+        self.window_size = window_size
+        self.in_flight = 0
+        self.baseline_latency = None # EWMA of p50 latency over healthy windows
+        self.decisions = {"increase": 0, "decrease": 0, "hold": 0}
+        self.last_decision = None
+        self.totals = {"ok": 0, "throttled": 0, "timeout": 0, "error": 0}
+        self._condition = asyncio.Condition()
+        self._last_backoff_time = 0.0
+        self._reset_window()
+
+    def _reset_window(self):
+        self._window_latencies = []
+        self._window_outcomes = {"ok": 0, "throttled": 0, "timeout": 0, "error": 0}
+        self._window_peak_in_flight = self.in_flight
+
+    async def acquire(self):
+        """Waits until a slot is free under the current window."""
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+            self._window_peak_in_flight = max(self._window_peak_in_flight, self.in_flight)
+
+    async def release(self, outcome, latency):
+        """Frees a slot and records the request outcome ('ok', 'throttled', 'timeout' or 'error')."""
+        async with self._condition:
+            self.in_flight -= 1
+            self._record(outcome, latency)
+            self._condition.notify_all()
+
+    def _record(self, outcome, latency):
+        self.totals[outcome] += 1
+        self._window_outcomes[outcome] += 1
+        if outcome == "ok":
+            self._window_latencies.append(latency)
+
+        # Throttling and timeouts are strong signals: back off right away instead of waiting
+        # for the window to fill, but at most once per cooldown so a burst doesn't collapse it to 1.
+        if outcome in ("throttled", "timeout"):
+            now = time.monotonic()
+            if now - self._last_backoff_time >= ADAPTIVE_BACKOFF_COOLDOWN:
+                self._last_backoff_time = now
+                self._decide("decrease", ADAPTIVE_BACKOFF_FACTOR, f"{outcome} response")
+                self._reset_window()
+                return
+
+        if sum(self._window_outcomes.values()) >= self.window_size:
+            self._evaluate_window()
+            self._reset_window()
+
+    def _evaluate_window(self):
+        samples = sum(self._window_outcomes.values())
+        success_rate = self._window_outcomes["ok"] / samples
+        p50 = _percentile(self._window_latencies, 50)
+        p95 = _percentile(self._window_latencies, 95)
+
+        if success_rate < ADAPTIVE_TARGET_SUCCESS_RATE:
+            self._decide("decrease", ADAPTIVE_BACKOFF_FACTOR, f"success rate {success_rate:.2%}")
+        elif self.baseline_latency and p95 is not None and p95 > self.baseline_latency * ADAPTIVE_LATENCY_TOLERANCE:
+            self._decide("decrease", ADAPTIVE_LATENCY_BACKOFF_FACTOR,
+                         f"p95 {p95:.3f}s > {ADAPTIVE_LATENCY_TOLERANCE}x baseline {self.baseline_latency:.3f}s")
+        else:
+            if p50 is not None: # Healthy window: fold its median into the baseline
+                self.baseline_latency = p50 if self.baseline_latency is None else 0.8 * self.baseline_latency + 0.2 * p50
+            if self._window_peak_in_flight >= int(self.limit):
+                self._decide("increase", None, "healthy and saturated")
+            else:
+                self._decide("hold", None, "healthy but not saturated")
+
+    def _decide(self, decision, factor, reason):
+        if decision == "increase":
+            self.limit = min(self.max_limit, self.limit + 1)
+        elif decision == "decrease":
+            self.limit = max(self.min_limit, self.limit * factor)
+        self.decisions[decision] += 1
+        self.last_decision = {"decision": decision, "reason": reason, "limit": int(self.limit), "time": time.time()}
+
+    def stats(self):
+        """Returns a JSON-serializable snapshot of the controller state."""
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "baseline_latency": self.baseline_latency,
+            "window_p95_latency": _percentile(self._window_latencies, 95),
+            "totals": dict(self.totals),
+            "decisions": dict(self.decisions),
+            "last_decision": self.last_decision,
+        }
+
+# --- Process-Pool HTML Parsing ---
+class BatchedParsePool(object):
+    """
+    Parses pages in a ProcessPoolExecutor so CPU-heavy HTML parsing never blocks the event loop.
+    Pages are grouped into batches (up to PARSER_BATCH_SIZE, or whatever arrived within
+    PARSER_BATCH_MAX_DELAY) so the pickling/IPC cost is paid once per batch instead of once per page.
+    """
+    def __init__(self, process_count=PARSER_PROCESS_COUNT, backend=None,
+                 batch_size=PARSER_BATCH_SIZE, max_delay=PARSER_BATCH_MAX_DELAY):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.process_count = process_count
+        self.executor = ProcessPoolExecutor(max_workers=process_count) if process_count > 0 else None
+        self.batches_submitted = 0
+        self.pages_parsed = 0
+        self._pending = []
+        self._flush_handle = None
+
+    async def parse(self, html_content, novel_id_str):
+        """Returns (page_status, novel_data) for one page, see NovelpiaParser.parse_novel_page."""
+        self.pages_parsed += 1
+        if self.executor is None:
+            return parse_novel_page(html_content, novel_id_str, self.backend)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((html_content, novel_id_str, future))
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_delay, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        futures = [future for _, _, future in batch]
+        pages = [(html_content, novel_id_str) for html_content, novel_id_str, _ in batch]
+        self.batches_submitted += 1
+        batch_future = asyncio.get_running_loop().run_in_executor(self.executor, parse_novel_batch, pages, self.backend)
+        batch_future.add_done_callback(lambda done: self._resolve(done, futures))
+
+    @staticmethod
+    def _resolve(batch_future, futures):
+        if batch_future.cancelled():
+            for future in futures:
+                future.cancel()
+            return
+        error = batch_future.exception()
+        results = [error] * len(futures) if error else batch_future.result()
+        for future, result in zip(futures, results):
+            if future.done(): # The awaiting worker was cancelled
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self):
+        return {
+            "backend": self.backend,
+            "processes": self.process_count,
+            "pages_parsed": self.pages_parsed,
+            "batches_submitted": self.batches_submitted,
+        }
+
+# --- Retry Queue ---
+class RetryQueue(object):
+    """
+    IDs whose fetch failed, each waiting out an exponential backoff with jitter before it is fed
+    back into the pipeline. After RETRY_MAX_ATTEMPTS retries `on_give_up(novel_id_str, attempts)`
+    is called instead (the scraper puts the ID on the persisted dead-letter list).
+    """
+    def __init__(self, max_attempts=RETRY_MAX_ATTEMPTS, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY, on_give_up=None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.on_give_up = on_give_up
+        self.changed = asyncio.Event() # Set when a retry is scheduled or a pipeline item finishes
+        self.counts = {"retries": 0, "recovered": 0, "dead_lettered": 0}
+        self._heap = [] # (due time, sequence, novel_id_str)
+        self._attempts = {} # novel_id_str -> retries so far, only while the ID is being retried
+        self._sequence = itertools.count()
+
+    def schedule(self, novel_id_str):
+        """Queues another attempt. Returns False (after calling on_give_up) once the attempts are used up."""
+        attempt = self._attempts.get(novel_id_str, 0) + 1
+        if attempt > self.max_attempts:
+            del self._attempts[novel_id_str]
+            self.counts["dead_lettered"] += 1
+            if self.on_give_up:
+                self.on_give_up(novel_id_str, self.max_attempts)
+            return False
+        self._attempts[novel_id_str] = attempt
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        heapq.heappush(self._heap, (time.monotonic() + random.uniform(delay / 2, delay), next(self._sequence), novel_id_str))
+        self.counts["retries"] += 1
+        self.changed.set()
+        return True
+
+    def completed(self, novel_id_str):
+        """Reports a fetch that got an answer; an ID that was being retried counts as recovered."""
+        if self._attempts.pop(novel_id_str, None) is not None:
+            self.counts["recovered"] += 1
+
+    def pop_due(self):
+        now = time.monotonic()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due.append(heapq.heappop(self._heap)[2])
+        return due
+
+    def seconds_until_next(self):
+        """Seconds until the next retry is due, or None if none is waiting."""
+        return max(0.0, self._heap[0][0] - time.monotonic()) if self._heap else None
+
+    def __len__(self):
+        return len(self._heap)
+
+# --- Run Context ---
+class ScrapeContext(object):
+    """
+    The run-wide dependencies of process_novel() and download_cover(): built once per run (or per
+    coordinator worker) and passed along instead of a long list of positional arguments.
+    Anything left as None is not used (no cache, no stats, no rate limiting, no cover store, ...).
+    Covers are downloaded through `cover_session`, or through `page_session` when there is none.
+    `size_ref` is the running cover storage total (a one-item list, updated in place) and
+    `max_storage_bytes` its cap.
+    """
+    def __init__(self, state_store, controller, page_session=None, cover_session=None, parse_pool=None,
+                 cover_executor=None, html_cache=None, stats=None, rate_limiter=None, cover_store=None,
+                 derivatives=None, size_ref=None, max_storage_bytes=0):
+        self.state_store = state_store
+        self.controller = controller
+        self.page_session = page_session
+        self.cover_session = cover_session or page_session
+        self.parse_pool = parse_pool
+        self.cover_executor = cover_executor
+        self.html_cache = html_cache
+        self.stats = stats
+        self.rate_limiter = rate_limiter
+        self.cover_store = cover_store
+        self.derivatives = derivatives
+        self.size_ref = size_ref if size_ref is not None else [0]
+        self.max_storage_bytes = max_storage_bytes
+
+# --- Bounded Producer/Consumer Pipeline ---
+async def run_id_pipeline(novel_ids, handle_novel, worker_count=PIPELINE_WORKER_COUNT, queue_size=PIPELINE_QUEUE_SIZE, stats=None, retry_queue=None):
+    """Feeds novel IDs from a (lazy) iterable through a bounded queue to a fixed pool of workers.
+    `handle_novel(novel_id_str)` is awaited for every ID; returning False stops the whole pipeline.
+    Time spent in the queue is recorded as the 'queue_wait' stage when `stats` is given.
+    With a `retry_queue`, IDs the handler schedules there are fed back in as they come due, and the
+    pipeline only finishes once no retry is waiting and nothing that could schedule one is in flight.
+    Returns True if every ID was handled, False if the pipeline was stopped early.
+    """
+    id_queue = asyncio.Queue(maxsize=queue_size)
+    stop_event = asyncio.Event()
+    outstanding = [0] # IDs queued or being handled
+
+    async def _put(novel_id_str):
+        outstanding[0] += 1
+        await id_queue.put((novel_id_str, time.monotonic())) # Blocks while the queue is full
+
+    async def _producer():
+        for novel_id_str in novel_ids:
+            if stop_event.is_set():
+                return
+            if retry_queue is not None:
+                for retry_id in retry_queue.pop_due():
+                    await _put(retry_id)
+            await _put(novel_id_str)
+        while retry_queue is not None and not stop_event.is_set():
+            retry_queue.changed.clear() # Cleared before looking, so no wake-up is missed
+            if not len(retry_queue) and not outstanding[0]:
+                break
+            for retry_id in retry_queue.pop_due():
+                await _put(retry_id)
+            try:
+                await asyncio.wait_for(retry_queue.changed.wait(), retry_queue.seconds_until_next())
+            except asyncio.TimeoutError:
+                pass
+        for _ in range(worker_count):
+            await id_queue.put(None) # One sentinel per worker
+
+    async def _worker():
+        while not stop_event.is_set():
+            queued = await id_queue.get()
+            if queued is None:
+                return
+            novel_id_str, queued_at = queued
+            if stats:
+                stats.observe("queue_wait", time.monotonic() - queued_at)
+            try:
+                keep_going = await handle_novel(novel_id_str)
+            finally:
+                outstanding[0] -= 1
+                if retry_queue is not None:
+                    retry_queue.changed.set()
+            if keep_going is False:
+                stop_event.set()
+                return
+
+    producer_task = asyncio.create_task(_producer())
+    worker_tasks = [asyncio.create_task(_worker()) for _ in range(worker_count)]
+    all_tasks = [producer_task, *worker_tasks]
+    pending = set(all_tasks)
+    try:
+        while pending and not stop_event.is_set():
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                t.result() # Re-raise any exception from the producer or a worker
+    finally:
+        for t in all_tasks:
+            t.cancel() # No-op for tasks that already finished
+        await asyncio.gather(*all_tasks, return_exceptions=True)
+    return not stop_event.is_set()
 
 # --- Asynchronous HTTP Fetcher ---
-async def fetch_page(session, novel_id_str, semaphore):
+async def fetch_page(session, novel_id_str, controller, validators=None, stats=None, rate_limiter=None):
     """Fetches the HTML content of a given novel URL.
+    Reports each outcome and its latency to the adaptive concurrency controller.
+    If a `validators` dict is given, its 'etag' / 'last_modified' are sent as a conditional request
+    and replaced by the response's values; NOT_MODIFIED is returned when the server answers 304.
+    Slot wait, fetch time, page size and the outcome are recorded in `stats` if given.
+    With a `rate_limiter`, a token for the page host is taken after the slot (counted as slot wait),
+    and a throttling answer's Retry-After pauses that host for every process sharing the limiter.
     Prints errors to stderr and returns None on failure.
     """
-    url = f"https://novelpia.com/novel/{novel_id_str}"
-    async with semaphore: # Acquire a semaphore slot before making a request
-        try:
-            async with session.get(url, timeout=10) as response:
-                response.raise_for_status() # Raise an exception for HTTP errors (4xx or 5xx)
-                return await response.text()
-        except aiohttp.ClientError as e:
-            print(f"Network Error fetching page {url}: {e}", file=sys.stderr)
-            return None
-        except asyncio.TimeoutError:
-            print(f"Timeout fetching page {url}", file=sys.stderr)
-            return None
-        except Exception as e:
-            print(f"Unexpected error fetching page {url}: {e}", file=sys.stderr)
-            return None
-
-async def download_cover(session, url, local_path, current_download_size_bytes_ref, max_storage_bytes):
-    """Downloads a cover image and saves it locally.
-    Updates the shared download size reference.
-    Returns local_path on success, or a status string on failure/skip.
+    url = f"{NOVELPIA_BASE_URL}/novel/{novel_id_str}"
+    request_headers = {}
+    if validators is not None:
+        if validators.get("etag"):
+            request_headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            request_headers["If-Modified-Since"] = validators["last_modified"]
+    wait_start = time.monotonic()
+    await controller.acquire() # Acquire a slot under the current adaptive window
+    if rate_limiter is not None:
+        await rate_limiter.acquire_async(bucket_for_url(url))
+    request_start = time.monotonic()
+    outcome = "error"
+    if stats:
+        stats.observe("slot_wait", request_start - wait_start)
+    try:
+        async with session.get(url, headers=request_headers) as response: # Timeouts: the session's PAGE_TIMEOUT
+            response.raise_for_status() # Raise an exception for HTTP errors (4xx or 5xx)
+            if validators is not None:
+                validators["etag"] = response.headers.get("ETag", validators.get("etag"))
+                validators["last_modified"] = response.headers.get("Last-Modified", validators.get("last_modified"))
+            if response.status == 304:
+                outcome = "ok"
+                return NOT_MODIFIED
+            page_bytes = len(await response.read()) # Cached by aiohttp, so text() doesn't read again
+            html_content = await response.text()
+            outcome = "ok"
+            if stats:
+                stats.observe("page_bytes", page_bytes)
+            return html_content
+    except aiohttp.ClientResponseError as e:
+        if e.status in THROTTLE_STATUS_CODES:
+            outcome = "throttled"
+            if rate_limiter is not None:
+                await rate_limiter.report_response_async(bucket_for_url(url), e.status, e.headers and e.headers.get("Retry-After"))
+        elif e.status < 500:
+            outcome = "ok" # The server answered promptly; not a congestion signal
+        print(f"HTTP Error fetching page {url}: {e.status} {e.message}", file=sys.stderr)
+        return None
+    except aiohttp.ClientError as e:
+        print(f"Network Error fetching page {url}: {e}", file=sys.stderr)
+        return None
+    except asyncio.TimeoutError:
+        outcome = "timeout"
+        print(f"Timeout fetching page {url}", file=sys.stderr)
+        return None
+    except Exception as e:
+        print(f"Unexpected error fetching page {url}: {e}", file=sys.stderr)
+        return None
+    finally:
+        latency = time.monotonic() - request_start
+        if stats:
+            stats.observe("fetch", latency)
+            stats.increment(f"fetch_{outcome}")
+        await controller.release(outcome, latency)
+
+def cover_local_path_for(novel_id_str, cover_url):
+    """Where a cover is first saved: the covers folder, named by ID, with the URL's extension."""
+    url_path = cover_url.split('?')[0] # Remove query parameters if any
+    # Extract the last part after the dot, default to .jpg if no clear extension
+    # This ensures we save it with the actual extension from the URL
+    file_extension = os.path.splitext(url_path)[1]
+    if not file_extension: # If no extension found, default to .jpg
+        file_extension = ".jpg"
+    # Ensure it's a valid image extension, otherwise default to .jpg
+    if file_extension.lower() not in ['.png', '.jpg', '.jpeg', '.gif', '.webp']:
+        file_extension = ".jpg" # Default to JPG if unknown/invalid
+    return os.path.join(DOWNLOAD_COVERS_FOLDER, f"{novel_id_str}{file_extension}")
+
+async def download_cover(ctx, url, local_path, priority=None):
+    """Downloads a cover image and saves it locally, with the run's dependencies from `ctx` (a ScrapeContext).
+    The body is streamed to a temporary file in chunks, verified by its magic bytes and atomically
+    renamed into place; it is only re-encoded to JPEG when COVER_STORAGE_MODE or the passthrough
+    policy asks for it. File I/O and image work run in the cover executor, never on the event loop.
+    Download and finalize times and the cover size are recorded in the stats if there are any.
+    With a rate limiter, a token for the image host is taken first (see fetch_page).
+    With a cover store, known placeholder URLs are skipped and the saved cover goes into the store,
+    where a duplicate adds no bytes to the storage count. At the storage cap, a cover with a `priority`
+    (see NovelpiaCovers.cover_priority) evicts stored covers that rank lower instead of being skipped.
+    With a derivatives manifest, the saved cover's thumbnail and detail images are generated too.
+    Updates ctx.size_ref.
+    Returns the saved path on success (its extension matches the stored format), or a status string on failure/skip.
     """
-    if current_download_size_bytes_ref[0] >= max_storage_bytes:
+    loop = asyncio.get_running_loop()
+    can_evict = ctx.cover_store is not None and priority is not None and ctx.cover_store.evicts
+
+    async def _make_room(incoming_bytes):
+        """True if `incoming_bytes` more fit under the cap, after evicting lower-ranked covers if need be."""
+        over = ctx.size_ref[0] + incoming_bytes - ctx.max_storage_bytes
+        if over <= 0:
+            return True
+        if not can_evict:
+            return False
+        freed = await loop.run_in_executor(ctx.cover_executor, ctx.cover_store.evict_for, over, priority)
+        ctx.size_ref[0] -= freed
+        return freed >= over
+
+    if ctx.size_ref[0] >= ctx.max_storage_bytes and not (
+            can_evict and await loop.run_in_executor(ctx.cover_executor, ctx.cover_store.can_evict, priority)):
         print(f"Storage limit reached. Skipping download for {url}", file=sys.stderr)
         return "SKIPPED_LIMIT"
-
+    if ctx.cover_store is not None and ctx.cover_store.is_placeholder_url(url):
+        return COVER_PLACEHOLDER_STATE
+
+    temp_path = os.path.splitext(local_path)[0] + ".part"
+    temp_file = None
+    if ctx.rate_limiter is not None:
+        await ctx.rate_limiter.acquire_async(bucket_for_url(url))
+    download_start = time.monotonic()
     try:
-        async with session.get(url, timeout=20) as response: # Longer timeout for image downloads
+        async with ctx.cover_session.get(url) as response: # Timeouts: the session's COVER_TIMEOUT
             response.raise_for_status() # This will raise for 404, etc.
-            content = await response.read()
-            
+
             # Check size before writing to ensure we don't exceed limit mid-download
-            if current_download_size_bytes_ref[0] + len(content) > max_storage_bytes:
+            if response.content_length and not await _make_room(response.content_length):
                 print(f"Download of {url} would exceed storage limit. Skipping.", file=sys.stderr)
                 return "SKIPPED_LIMIT"
 
-            # Use Pillow to open and save the image to ensure consistent format (JPEG)
-            # This also helps in handling potentially malformed images by re-encoding them.
-            try:
-                img = Image.open(BytesIO(content))
-                if img.mode == 'RGBA': # Convert to RGB if it has an alpha channel
-                    img = img.convert('RGB')
-                
-                # Save initially as JPEG, as this is the primary target format
-                img.save(local_path, "JPEG", quality=85) 
-                
-                # --- EXIF Data Check and File Type Correction ---
-                # Only attempt EXIF read if the file was saved as a JPEG
-                if local_path.lower().endswith((".jpg", ".jpeg")):
-                    with open(local_path, 'rb') as f:
-                        tags = exifread.process_file(f)
-                    
-                    if 'Image FileTypeExtension' in tags:
-                        exif_ext_tag = str(tags['Image FileTypeExtension']).lower()
-                        # Remove leading dot if present, then add our own
-                        exif_ext = "." + exif_ext_tag.lstrip('.') 
-                        
-                        current_ext = os.path.splitext(local_path)[1].lower()
-
-                        if exif_ext != current_ext:
-                            new_local_path = os.path.splitext(local_path)[0] + exif_ext
-                            try:
-                                os.rename(local_path, new_local_path)
-                                print(f"Renamed cover from {os.path.basename(local_path)} to {os.path.basename(new_local_path)} based on EXIF.", file=sys.stderr)
-                                local_path = new_local_path # Update local_path to the new path
-                            except OSError as e:
-                                print(f"Error renaming file {local_path} to {new_local_path}: {e}", file=sys.stderr)
-                
-            except Exception as e:
-                print(f"Error processing image with Pillow or EXIF for {url}: {e}", file=sys.stderr)
-                # Fallback to direct write if Pillow/EXIF fails (though less robust)
-                with open(local_path, 'wb') as f:
-                    f.write(content)
-
-            file_size = os.path.getsize(local_path)
-            current_download_size_bytes_ref[0] += file_size
-            return local_path
+            temp_file = await loop.run_in_executor(ctx.cover_executor, open, temp_path, 'wb')
+            downloaded_bytes = 0
+            async for chunk in response.content.iter_chunked(COVER_STREAM_CHUNK_SIZE):
+                downloaded_bytes += len(chunk)
+                if not await _make_room(downloaded_bytes):
+                    print(f"Download of {url} would exceed storage limit. Skipping.", file=sys.stderr)
+                    return "SKIPPED_LIMIT"
+                await loop.run_in_executor(ctx.cover_executor, temp_file.write, chunk)
+            await loop.run_in_executor(ctx.cover_executor, temp_file.close)
+
+        finalize_start = time.monotonic()
+        if ctx.stats:
+            ctx.stats.observe("cover_fetch", finalize_start - download_start)
+            ctx.stats.observe("cover_bytes", downloaded_bytes)
+        local_path, file_size = await loop.run_in_executor(
+            ctx.cover_executor, finalize_cover, temp_path, local_path, COVER_STORAGE_MODE == "transcode"
+        )
+        if local_path is not None and ctx.cover_store is not None:
+            local_path, file_size = await loop.run_in_executor(ctx.cover_executor, ctx.cover_store.add, local_path, url, priority or 0.0)
+            if local_path == COVER_PLACEHOLDER_STATE: # Default artwork; copies stored before it was recognized are gone too
+                ctx.size_ref[0] += file_size
+                return local_path
+        if ctx.stats:
+            ctx.stats.observe("cover_finalize", time.monotonic() - finalize_start)
+        if local_path is None:
+            print(f"Downloaded cover {url} is not a recognised image. Discarding.", file=sys.stderr)
+            return "DOWNLOAD_FAILED_INVALID_IMAGE"
+        ctx.size_ref[0] += file_size
+        if ctx.derivatives is not None:
+            derivatives_start = time.monotonic()
+            await loop.run_in_executor(ctx.cover_executor, ctx.derivatives.generate, local_path)
+            if ctx.stats:
+                ctx.stats.observe("cover_derivatives", time.monotonic() - derivatives_start)
+        return local_path
     except aiohttp.ClientResponseError as e: # Catch specific HTTP errors like 404
+        if ctx.rate_limiter is not None:
+            await ctx.rate_limiter.report_response_async(bucket_for_url(url), e.status, e.headers and e.headers.get("Retry-After"))
         print(f"HTTP Error downloading cover {url}: {e.status} {e.message}", file=sys.stderr)
         return "DOWNLOAD_FAILED_HTTP_ERROR"
     except aiohttp.ClientError as e: # Catch other network-related client errors
@@ -203,143 +645,84 @@ async def download_cover(session, url, local_path, current_download_size_bytes_r
     except Exception as e:
         print(f"Unexpected error downloading cover {url}: {e}", file=sys.stderr)
         return "DOWNLOAD_FAILED_UNKNOWN"
-
-# --- HTML Parser for Metadata ---
-def parse_novel_data(html_content, novel_id_str):
-    """Parses the HTML content to extract novel title, synopsis, author, tags, age rating, publication status, cover URL, like count, and chapter count.
-    Returns None if the page indicates a deleted novel or incorrect access.
+    finally:
+        # Never leave a partial download behind (on success it has already been renamed away)
+        if temp_file is not None and not temp_file.closed:
+            temp_file.close()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+# --- Frontier Discovery ---
+async def _probe_frontier(session, controller, first_id, rate_limiter=None, parse_pool=None):
+    """Fetches FRONTIER_PROBE_WIDTH consecutive IDs from `first_id` (none above FRONTIER_MAX_ID).
+    Returns the highest one that exists (found or deleted), or None if none of them do.
+    Pages are parsed in `parse_pool` if given, otherwise inline.
     """
-    if not html_content:
+    probe_ids = range(first_id, min(first_id + FRONTIER_PROBE_WIDTH, FRONTIER_MAX_ID + 1))
+    if not probe_ids:
         return None
-
-    soup = BeautifulSoup(html_content, 'html.parser')
-
-    # Check for "deleted novel" or "incorrect access" indicator immediately
-    # The specific div to look for is <div id="alert_modal" class="modal fade" ...>
-    alert_modal_div = soup.find('div', id='alert_modal', class_='modal')
-    if alert_modal_div:
-        modal_text = alert_modal_div.get_text(strip=True)
-        if "삭제된 소설 입니다." in modal_text:
-            # print(f"Skipping novel {novel_id_str}: Detected as deleted novel.", file=sys.stderr)
-            return None # Indicate this is a deleted novel and should be skipped
-        elif "잘못된 접근입니다." in modal_text:
-            # print(f"Skipping novel {novel_id_str}: Detected as incorrect access.", file=sys.stderr)
-            return None # Indicate this is an incorrect access page and should be skipped
-
-    # 1. Extract Title
-    title = None
-    meta_title_tag = soup.find('meta', attrs={'name': 'twitter:title'})
-    if meta_title_tag and 'content' in meta_title_tag.attrs:
-        full_title = meta_title_tag['content']
-        match = re.search(r'노벨피아 - 웹소설로 꿈꾸는 세상! - (.+)', full_title)
-        if match:
-            title = match.group(1).strip()
-
-    # 2. Extract Synopsis
-    synopsis = None
-    meta_desc_tag = soup.find('meta', attrs={'name': 'twitter:description'})
-    if meta_desc_tag and 'content' in meta_desc_tag.attrs:
-        synopsis = meta_desc_tag['content'].strip()
-
-    # 3. Extract Author
-    author = None
-    author_tag = soup.find('a', class_='writer-name')
-    if author_tag:
-        author = author_tag.get_text(strip=True)
-
-    # 4. Extract Tags
-    tags = []
-    tags_container = soup.find('p', class_='writer-tag')
-    if tags_container:
-        for tag_span in tags_container.find_all('span', class_='tag'):
-            tag_text = tag_span.get_text(strip=True)
-            # Exclude the "Add my own tag" button
-            if tag_text and tag_text != '+나만의태그 추가':
-                tags.append(tag_text)
-
-    # 5. Extract Age Verification (Adult/성인)
-    is_adult = False
-    # Look for <span class="b_19 s_inv">19</span>
-    age_tag = soup.find('span', class_='b_19 s_inv')
-    if age_tag and age_tag.get_text(strip=True) == '19':
-        is_adult = True
-
-    # 6. Extract Publication Status
-    publication_status = "연재중" # Default to "serializing"
-    # Look for <span class="b_comp s_inv">완결</span>
-    complete_tag = soup.find('span', class_='b_comp s_inv')
-    if complete_tag and complete_tag.get_text(strip=True) == '완결':
-        publication_status = "완결"
+    for _ in range(FRONTIER_PROBE_RETRIES):
+        pages = await asyncio.gather(*(fetch_page(session, f"{novel_id:06d}", controller, rate_limiter=rate_limiter) for novel_id in probe_ids))
+        if any(html_content is not None for html_content in pages):
+            break
     else:
-        # Look for <span class="s_inv" style="...">연재중단</span>
-        discontinued_tag = soup.find('span', class_='s_inv', string='연재중단')
-        if discontinued_tag:
-            publication_status = "연재중단"
-
-    # 7. Extract Cover Image URL
-    cover_url = None
-    cover_mime_type = None # Initialize mime type
-    og_image_tag = soup.find('meta', attrs={'property': 'og:image'})
-    if og_image_tag and 'content' in og_image_tag.attrs:
-        extracted_url = og_image_tag['content']
-        # Skip known placeholder images
-        if not ("novelpia.com/img/" in extracted_url and ".jpg" in extracted_url):
-            cover_url = extracted_url
-    
-    # Try to get mime type from og:image:type meta tag
-    og_image_type_tag = soup.find('meta', attrs={'property': 'og:image:type'})
-    if og_image_type_tag and 'content' in og_image_type_tag.attrs:
-        cover_mime_type = og_image_type_tag['content'].strip()
-
-
-    # --- MODIFIED: Extract Like Count and Chapter Count more robustly ---
-    like_count = None
-    chapter_count = None
-
-    info_count_div = soup.find('div', class_='info-count2')
-    if info_count_div:
-        # Find all <p> tags within the info-count2 div
-        p_tags = info_count_div.find_all('p')
-        for p_tag in p_tags:
-            text = p_tag.get_text(strip=True)
-            
-            # Regex to find numbers (with optional commas)
-            # This regex looks for one or more digits, optionally followed by commas and three digits
-            # It's flexible enough to capture "123" or "123,456"
-            number_match = re.search(r'(\d{1,3}(?:,\d{3})*)', text)
-            if number_match:
-                extracted_number_str = number_match.group(1).replace(',', '') # Remove commas
-                try:
-                    extracted_number = int(extracted_number_str)
-                    
-                    if '선호' in text: # "선호" means "likes"
-                        like_count = extracted_number
-                    elif '회차' in text: # "회차" means "chapters"
-                        chapter_count = extracted_number
-                except ValueError:
-                    # This should ideally not happen if regex is good, but catch for safety
-                    print(f"Warning: Could not convert '{extracted_number_str}' to int in '{text}'", file=sys.stderr)
-                    pass
-    # --- END MODIFIED SECTION ---
-
-    # Only return data if a title was found, indicating a valid novel page
-    if title:
-        return {
-            "id": novel_id_str,
-            "title": title,
-            "synopsis": synopsis,
-            "author": author,
-            "tags": tags,
-            "is_adult": is_adult,
-            "publication_status": publication_status,
-            "cover_url": cover_url, # Add cover URL to metadata
-            "cover_mime_type": cover_mime_type, # Add mime type
-            "cover_local_path": None, # Placeholder for local path, will be filled later
-            "like_count": like_count,
-            "chapter_count": chapter_count
-        }
+        raise RuntimeError(f"Frontier probe at {first_id:06d} failed: every request errored")
+    fetched = [(novel_id, html_content) for novel_id, html_content in zip(probe_ids, pages) if html_content is not None]
+    if parse_pool is not None:
+        results = await asyncio.gather(*(parse_pool.parse(html_content, f"{novel_id:06d}") for novel_id, html_content in fetched))
+    else:
+        results = [parse_novel_page(html_content, f"{novel_id:06d}") for novel_id, html_content in fetched]
+    return max((novel_id for (novel_id, _), (page_status, _) in zip(fetched, results) if page_status in FRONTIER_EXISTING_STATUSES), default=None)
+
+async def _probe_gap(session, controller, first_id, rate_limiter=None, parse_pool=None):
+    """Probes up to FRONTIER_GAP_WINDOWS windows, FRONTIER_GAP_SPACING IDs apart, from `first_id`.
+    Returns the highest existing ID of the first window that has one, or None if they are all dead.
+    """
+    for window in range(FRONTIER_GAP_WINDOWS):
+        found = await _probe_frontier(session, controller, first_id + window * FRONTIER_GAP_SPACING, rate_limiter, parse_pool)
+        if found is not None:
+            return found
     return None
 
+async def discover_frontier(controller, known_low=0, rate_limiter=None, parse_pool=None):
+    """Finds the current highest live novel ID with a few hundred requests: jumps up exponentially
+    from `known_low` until a probe finds a dead gap, then bisects the last gap.
+    A gap only counts as dead when several spaced windows of IDs hold no existing ID, so neither
+    isolated dead IDs nor a cluster of deleted ones end the search early. Nothing above
+    FRONTIER_MAX_ID is probed. Probed pages are parsed in `parse_pool` (the run's pool) if given.
+    """
+    low = min(known_low, FRONTIER_MAX_ID)
+    step = FRONTIER_INITIAL_STEP
+    probes = 0
+    async with create_session(PAGE_LIMIT_PER_HOST, PAGE_TIMEOUT) as session:
+        while True: # Exponential phase: `low` exists (or is the hint), find a `high` that doesn't
+            if low >= FRONTIER_MAX_ID:
+                high = low
+                break
+            high = min(low + step, FRONTIER_MAX_ID)
+            probes += 1
+            found = await _probe_gap(session, controller, high, rate_limiter, parse_pool)
+            if found is None:
+                break
+            low = found
+            step *= 2
+        while high - low > FRONTIER_PROBE_WIDTH: # Bisection phase
+            probes += 1
+            middle = (low + high) // 2
+            found = await _probe_gap(session, controller, middle, rate_limiter, parse_pool)
+            if found is None:
+                high = middle
+            else:
+                low = found
+                high = max(high, low + 1)
+        # The last gap is narrower than a probe window: look at it directly
+        probes += 1
+        found = await _probe_frontier(session, controller, low + 1, rate_limiter, parse_pool)
+        if found is not None:
+            low = found
+    print(f"Frontier discovery: highest live ID is {low:06d} ({probes} probes, {probes * FRONTIER_GAP_WINDOWS * FRONTIER_PROBE_WIDTH} requests at most)")
+    return low
+
 # --- Main Scraper Logic ---
 async def main():
     """Main function to orchestrate the scraping process."""
@@ -348,7 +731,8 @@ async def main():
     total_covers_downloaded = 0
     current_download_size_bytes = [0] # Use a list to pass by reference for mutable update
     start_time = time.time()
-    semaphore = asyncio.Semaphore(CONCURRENT_REQUESTS_LIMIT)
+    controller = AdaptiveConcurrencyController()
+    rate_limiter = SharedRateLimiter() if RATE_LIMIT_ENABLED else None # Shared with other shards and the library manager
     consecutive_network_errors = 0 # Counter for consecutive network errors fetching pages
     consecutive_cover_download_error_count = 0 # Counter for consecutive errors downloading covers
 
@@ -357,23 +741,40 @@ async def main():
     global START_ID, END_ID 
 
     print(f"Starting Novelpia scraping from ID {START_ID:06d} to {END_ID:06d}...")
-    print(f"Concurrent requests limit: {CONCURRENT_REQUESTS_LIMIT}")
+    print(f"Concurrent requests: adaptive, starting at {CONCURRENT_REQUESTS_LIMIT} (min {ADAPTIVE_MIN_CONCURRENCY}, max {ADAPTIVE_MAX_CONCURRENCY})")
     print(f"Maximum consecutive network errors before prompt: {MAX_CONSECUTIVE_NETWORK_ERRORS_FOR_PROMPT}")
-    print(f"Maximum consecutive cover download errors before stopping: {MAX_CONSECUTIVE_COVER_DOWNLOAD_ERRORS}\n")
+    if rate_limiter:
+        print(f"Rate limits shared through {rate_limiter.path}: {json.dumps(rate_limiter.limits)}")
+    print(f"Maximum consecutive cover download errors before stopping: {MAX_CONSECUTIVE_COVER_DOWNLOAD_ERRORS}")
+    parser_backend = select_backend(PARSER_BACKEND)
+    parse_pool = BatchedParsePool(PARSER_PROCESS_COUNT, parser_backend)
+    stats = ScrapeStats()
+    stats.add_gauge("concurrency_limit", lambda: int(controller.limit))
+    stats.add_gauge("requests_in_flight", lambda: controller.in_flight)
+    print(f"HTML parser backend: {parser_backend} ({PARSER_PROCESS_COUNT} parser processes, batches of {PARSER_BATCH_SIZE})\n")
 
     # --- User Choice for Scraping Mode ---
     scrape_metadata = False
     scrape_titles_only = False
     download_covers_along_with_data = False
     download_covers_only = False
+    tail_mode = False
+    retry_failures_only = False
     max_storage_bytes = 0
+    cover_executor = None
+    cover_store = None
+    derivatives = None
     
     while True:
         print("What do you want to do?")
         print("  1. Scrape novel metadata (title, synopsis, author, tags, age, status) to JSONL.")
         print("  2. Scrape only novel titles to TXT.")
-        print("  3. Download cover images only (no metadata/title files updated).")
-        choice = input("Enter choice (1/2/3): ").strip()
+        print("  3. Download cover images only (missing covers of the metadata JSONL; no page refetch).")
+        print("  4. Refresh already scraped metadata (only changed novels are rewritten).")
+        print("  5. Re-parse cached HTML into the metadata JSONL (no network).")
+        print("  6. Tail: fetch only novels published since the last run (just above the known highest ID).")
+        print("  7. Retry failures only: re-fetch IDs whose earlier fetches failed (the dead-letter list).")
+        choice = input("Enter choice (1/2/3/4/5/6/7): ").strip()
 
         if choice == '1':
             scrape_metadata = True
@@ -388,8 +789,26 @@ async def main():
             # No primary output file for this mode, just covers
             current_output_file = None 
             break
+        elif choice == '4':
+            parse_pool.shutdown()
+            await refresh_metadata(START_ID, END_ID)
+            return
+        elif choice == '5':
+            parse_pool.shutdown()
+            reparse_metadata_from_cache()
+            return
+        elif choice == '6':
+            scrape_metadata = True
+            tail_mode = True
+            current_output_file = OUTPUT_FILE_METADATA
+            break
+        elif choice == '7':
+            scrape_metadata = True
+            retry_failures_only = True
+            current_output_file = OUTPUT_FILE_METADATA
+            break
         else:
-            print("Invalid choice. Please enter 1, 2, or 3.")
+            print("Invalid choice. Please enter 1, 2, 3, 4, 5, 6, or 7.")
 
     # --- Handle Cover Download Options based on initial choice ---
     if scrape_metadata or scrape_titles_only: # If scraping data, ask about covers as an add-on
@@ -414,121 +833,196 @@ async def main():
                 print("Invalid input. Please enter a number for storage limit.")
         
         os.makedirs(DOWNLOAD_COVERS_FOLDER, exist_ok=True)
+        remove_stale_partial_downloads(DOWNLOAD_COVERS_FOLDER)
+        cover_executor = ThreadPoolExecutor(max_workers=COVER_PROCESSING_WORKERS, thread_name_prefix="cover")
+        derivatives = DerivativeManifest() if COVER_DERIVATIVES_ENABLED else None
+        cover_store = CoverStore(DOWNLOAD_COVERS_FOLDER, on_evict=derivatives.remove if derivatives else None) if COVER_STORE_ENABLED else None
+        if cover_store: # Hashes every cover saved before the store existed (first run only), off the event loop
+            imported = await asyncio.get_running_loop().run_in_executor(cover_executor, cover_store.import_legacy_covers)
+            if imported:
+                print(f"Brought {imported} existing covers into the cover store.")
         print(f"Covers will be saved to: {DOWNLOAD_COVERS_FOLDER}")
         print(f"Maximum cover storage limit: {storage_limit_gb:.2f} GB\n")
         
-        # Calculate initial size of existing covers in the folder
-        for root, _, files in os.walk(DOWNLOAD_COVERS_FOLDER):
-            for file in files:
-                try:
-                    current_download_size_bytes[0] += os.path.getsize(os.path.join(root, file))
-                except OSError:
-                    pass # Ignore files that might be inaccessible
+        # Initial size of existing covers: one query on the store's ledger, else a walk over the folder
+        current_download_size_bytes[0] += cover_store.total_bytes() if cover_store else covers_folder_size(DOWNLOAD_COVERS_FOLDER)
+        if cover_store:
+            print(f"Cover eviction policy at the limit: {cover_store.eviction_policy}")
         print(f"Initial cover folder size: {current_download_size_bytes[0] / (1024*1024):.2f} MB\n")
 
+    if download_covers_only:
+        if os.path.exists(OUTPUT_FILE_METADATA):
+            # The metadata file already holds every cover URL: download from it instead of refetching pages
+            parse_pool.shutdown()
+            try:
+                await backfill_covers(START_ID, END_ID, current_download_size_bytes, max_storage_bytes, cover_executor, cover_store, derivatives)
+            finally:
+                cover_executor.shutdown(wait=True)
+                if cover_store:
+                    cover_store.close()
+                if derivatives:
+                    derivatives.close()
+            return
+        print(f"{OUTPUT_FILE_METADATA} does not exist: cover URLs have to be found by fetching every page.\n")
+
     # --- Handle output file and re-indexing for data scraping modes ---
-    indexed_novel_ids = set()
     f_output = None
-    forbidden_novel_ids = set()
 
-    # Load forbidden IDs from file
-    if os.path.exists(FORBIDDEN_FILE):
-        try:
-            with open(FORBIDDEN_FILE, 'r', encoding='utf-8') as f_forbidden:
-                for line in f_forbidden:
-                    forbidden_novel_ids.add(line.strip())
-            print(f"Loaded {len(forbidden_novel_ids)} forbidden novel IDs from {FORBIDDEN_FILE}.")
-        except Exception as e:
-            print(f"Error loading forbidden file {FORBIDDEN_FILE}: {e}", file=sys.stderr)
+    # Crawl state (found / dead / failed IDs) lives in an indexed SQLite store.
+    # The old forbidden.txt is imported into it once, then no longer written.
+    state_store = CrawlStateStore(STATE_DB_FILE)
+    imported_forbidden = state_store.import_forbidden_file(FORBIDDEN_FILE)
+    if imported_forbidden:
+        print(f"Imported {imported_forbidden} forbidden novel IDs from {FORBIDDEN_FILE} into {STATE_DB_FILE}.")
 
     if current_output_file: # Only if a primary output file is used (Mode 1 or 2)
         print(f"Output will be saved to: {current_output_file}\n")
-        if os.path.exists(current_output_file):
+        if os.path.exists(current_output_file) and (tail_mode or retry_failures_only):
+            print("Tail mode: appending new novels." if tail_mode else "Retry mode: appending recovered novels.")
+            state_store.import_output_file(current_output_file, is_jsonl=True)
+            f_output = open(current_output_file, 'a', encoding='utf-8')
+            total_novel_pages_processed_with_data = state_store.count_in_output(current_output_file)
+        elif os.path.exists(current_output_file):
             while True:
                 user_choice = input(f"Output file '{current_output_file}' already exists. Do you want to re-index all novels (y/n)? ").lower().strip()
                 if user_choice == 'y':
                     print("Re-indexing all novels. Existing file will be overwritten.")
+                    state_store.clear_output(current_output_file)
                     f_output = open(current_output_file, 'w', encoding='utf-8')
                     break
                 elif user_choice == 'n':
                     print("Skipping already indexed novels.")
+                    # Files written before the state store existed are scanned once and imported
+                    state_store.import_output_file(current_output_file, is_jsonl=scrape_metadata)
                     f_output = open(current_output_file, 'a', encoding='utf-8')
-                    with open(current_output_file, 'r', encoding='utf-8') as f_read:
-                        for line in f_read:
-                            try:
-                                if scrape_metadata: # If JSONL, parse JSON
-                                    data = json.loads(line)
-                                    if 'id' in data:
-                                        indexed_novel_ids.add(data['id'])
-                                else: # If TXT, use regex
-                                    match = re.search(r', (\d{6})\n?$', line)
-                                    if match:
-                                        indexed_novel_ids.add(match.group(1))
-                            except json.JSONDecodeError:
-                                print(f"Warning: Could not parse line in {current_output_file}: {line.strip()}", file=sys.stderr)
-                            except Exception as e:
-                                print(f"Error reading existing file line: {e}", file=sys.stderr)
-
-                    print(f"Found {len(indexed_novel_ids)} already indexed novels. These will be skipped.")
-                    # Initialize counts with already indexed novels for accurate progress
-                    processed_count = len(indexed_novel_ids)
-                    total_novel_pages_processed_with_data = len(indexed_novel_ids)
+
+                    indexed_count = state_store.count_in_output(current_output_file)
+                    print(f"Found {indexed_count} already indexed novels. These will be skipped.")
+                    # Initialize data count with already indexed novels; skipped IDs in range
+                    # are counted towards processed_count before the pipeline starts.
+                    total_novel_pages_processed_with_data = indexed_count
                     break
                 else:
                     print("Invalid input. Please enter 'y' or 'n'.")
         else:
             print(f"Creating new output file: {current_output_file}")
+            state_store.clear_output(current_output_file) # The file is gone, so is whatever was in it
             f_output = open(current_output_file, 'w', encoding='utf-8')
     else: # Covers only mode, no primary output file
         print("Running in 'Download covers only' mode. No metadata/title files will be updated.")
 
 
-    total_novels_in_range = END_ID - START_ID + 1 # Total possible novels to iterate over
-
+    # Instead of walking to DEFAULT_END_ID (mostly IDs that were never handed out), find where the
+    # live IDs end. Tail mode only looks at the region above the last known frontier.
+    if tail_mode or (FRONTIER_DISCOVERY_ENABLED and END_ID == DEFAULT_END_ID and not retry_failures_only):
+        known_low = max(int(state_store.get_meta("frontier_max_id", 0)), state_store.max_id(STATUS_OK, STATUS_DELETED))
+        frontier = await discover_frontier(controller, known_low, rate_limiter, parse_pool)
+        state_store.set_meta("frontier_max_id", frontier)
+        frontier_end_id = min(FRONTIER_MAX_ID, frontier + FRONTIER_MARGIN)
+        if tail_mode:
+            START_ID = max(0, known_low + 1 - FRONTIER_TAIL_LOOKBACK)
+            END_ID = frontier_end_id
+        elif FRONTIER_LIMIT_END_ID is not None:
+            if FRONTIER_LIMIT_END_ID:
+                END_ID = frontier_end_id
+        else:
+            while True:
+                user_choice = input(f"Crawl only up to ID {frontier_end_id:06d} (frontier + {FRONTIER_MARGIN}) instead of {END_ID:06d}? (y/n): ").lower().strip()
+                if user_choice == 'y':
+                    END_ID = frontier_end_id
+                    break
+                elif user_choice == 'n':
+                    break
+                else:
+                    print("Invalid input. Please enter 'y' or 'n'.")
+        print(f"Crawling ID {START_ID:06d} to {END_ID:06d}.")
+
+    retry_ids = None
+    if retry_failures_only:
+        # Only the IDs that failed before, wherever they are; the ID range is ignored
+        retry_ids = state_store.failed_ids()
+        print(f"Retrying {len(retry_ids)} failed IDs ({state_store.dead_letter_count()} on the dead-letter list).")
+        total_novels_in_range = len(retry_ids)
+        END_ID = max(retry_ids, default=END_ID)
+    else:
+        total_novels_in_range = END_ID - START_ID + 1 # Total possible novels to iterate over
+
+    # 2 bits per ID (indexed in this output / dead / failed / unknown), memory-mapped, instead of
+    # sets of ID strings. The pipeline only ever sees IDs that still need fetching.
+    id_index = state_store.build_id_index(current_output_file, ID_INDEX_FILE, max(ID_INDEX_CAPACITY, END_ID + 1))
+    if retry_ids is not None:
+        retry_ids = [novel_id for novel_id in retry_ids if id_index.is_pending(novel_id)]
+        pending_in_range = len(retry_ids)
+    else:
+        pending_in_range = id_index.count_pending(START_ID, END_ID)
+    processed_count += total_novels_in_range - pending_in_range # Already indexed or forbidden: count as processed
+    print(f"{total_novels_in_range - pending_in_range} IDs in range are already indexed or forbidden; {pending_in_range} to fetch.")
+
+    # Deleted/wrong-access IDs come in clusters, so blocks are visited by how many live novels they
+    # have held so far (from the state store, refined as results arrive) rather than in ID order.
+    scheduler = None
+    if DENSITY_SCHEDULING_ENABLED and retry_ids is None:
+        scheduler = DensityScheduler(id_index, state_store.block_counts(DENSITY_BLOCK_SIZE, START_ID, END_ID), START_ID, END_ID)
+        sparse_blocks, deferred_ids = scheduler.deferred_at_start()
+        if deferred_ids:
+            print(f"Density scheduling: {sparse_blocks} nearly-dead blocks are only sampled, so at least {deferred_ids} IDs stay pending "
+                  "and the progress count will not reach the total. Set DENSITY_SWEEP_SPARSE_BLOCKS = True (NovelpiaScheduler.py) "
+                  "or DENSITY_SCHEDULING_ENABLED = False to fetch them.")
+
+    html_cache = None
+    if HTML_CACHE_ENABLED:
+        html_cache = HtmlResponseCache(HTML_CACHE_FILE, int(HTML_CACHE_MAX_GB * 1024 * 1024 * 1024))
+        print(f"Caching raw HTML in {HTML_CACHE_FILE} (up to {HTML_CACHE_MAX_GB:.2f} GB).")
+
+    stats_exporter = StatsExporter(stats, STATS_JSON_FILE, STATS_EXPORT_INTERVAL, STATS_PROMETHEUS_PORT)
+    await stats_exporter.start()
+    if STATS_PROMETHEUS_PORT:
+        print(f"Serving stats on http://127.0.0.1:{STATS_PROMETHEUS_PORT}/metrics and /stats.json")
+
+    # Pages and covers come from different hosts: each gets its own connection pool and timeouts
+    transport = HttpTransport()
+    # A failed fetch is retried after a backoff; IDs that keep failing are kept on a persisted dead-letter list (menu option 7)
+    retry_queue = RetryQueue(on_give_up=state_store.add_dead_letter)
+    stats.add_gauge("page_connection_reuse_ratio", lambda: transport.page_stats.reuse_ratio() or 0)
+    stats.add_gauge("cover_connection_reuse_ratio", lambda: transport.cover_stats.reuse_ratio() or 0)
     try:
-        # Initialize aiohttp ClientSession here, so it's available for task creation
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-            "Referer": "https://novelpia.com/" # Referer to mimic browser navigation
-        }
-        async with aiohttp.ClientSession(headers=headers) as session:
-            tasks = []
-            for i in range(START_ID, END_ID + 1):
-                novel_id_str = f"{i:06d}" # Format as 000000, 000001, etc.
-                
-                # Skip if already indexed in the primary data file (Mode 1 or 2)
-                # This check only applies if a primary output file is being used.
-                if current_output_file and novel_id_str in indexed_novel_ids:
-                    # If skipping, this ID is already counted in initial processed_count and total_novel_pages_processed_with_data
-                    processed_count += 1 # Still count as processed for progress bar
-                    continue 
-                
-                # Skip if forbidden
-                if novel_id_str in forbidden_novel_ids:
-                    # print(f"Skipping novel {novel_id_str}: Found in forbidden list.")
-                    processed_count += 1 # Still count as processed for progress bar
-                    continue
+        async with transport:
+            ctx = ScrapeContext(
+                state_store, controller, transport.pages, transport.covers, parse_pool, cover_executor,
+                html_cache, stats, rate_limiter, cover_store, derivatives, current_download_size_bytes, max_storage_bytes
+            )
+            def _pending_novel_ids():
+                """Lazily yields the IDs in range that still need fetching, jumping over known ones."""
+                if retry_ids is not None:
+                    novel_ids = retry_ids
+                elif scheduler:
+                    novel_ids = scheduler.iter_ids()
+                else:
+                    novel_ids = id_index.iter_pending(START_ID, END_ID)
+                for i in novel_ids:
+                    yield f"{i:06d}" # Format as 000000, 000001, etc.
 
-                tasks.append(
-                    asyncio.create_task(
-                        process_novel(
-                            session, novel_id_str, semaphore, f_output, 
-                            scrape_metadata, scrape_titles_only, 
-                            download_covers_along_with_data or download_covers_only, 
-                            current_download_size_bytes, max_storage_bytes,
-                            forbidden_novel_ids # Pass forbidden_novel_ids set to process_novel
-                        )
-                    )
-                )
+            async def _handle_novel(novel_id_str):
+                """Processes one novel and updates progress. Returns False to stop the pipeline."""
+                nonlocal processed_count, total_novel_pages_processed_with_data, total_covers_downloaded
+                nonlocal consecutive_network_errors, consecutive_cover_download_error_count
 
-            # Process tasks as they complete
-            for task in asyncio.as_completed(tasks):
                 # result will be a tuple: (status, cover_downloaded_flag, data_written_flag)
-                result_status, cover_downloaded_flag, data_written_flag = await task 
-                
+                result_status, cover_downloaded_flag, data_written_flag = await process_novel(
+                    ctx, novel_id_str, f_output,
+                    scrape_metadata, scrape_titles_only,
+                    download_covers_along_with_data or download_covers_only,
+                    current_output_file
+                )
+
+                if result_status != 'network_error':
+                    retry_queue.completed(novel_id_str)
+                    if scheduler and result_status != 'parse_error': # A page we could not read says nothing about density
+                        scheduler.observe(int(novel_id_str), result_status != 'skipped_forbidden')
+
                 if cover_downloaded_flag:
                     total_covers_downloaded += 1
-                
+
                 if data_written_flag:
                     total_novel_pages_processed_with_data += 1
 
@@ -543,34 +1037,29 @@ async def main():
                             print("Continuing scrape...")
                         else:
                             print("Stopping scrape as requested.")
-                            # Cancel remaining tasks for a cleaner exit
-                            for t in tasks:
-                                if not t.done():
-                                    t.cancel()
-                            return # Exit main function immediately
-                else: 
+                            return False # Stops the pipeline; in-flight workers are cancelled
+                    if retry_queue.schedule(novel_id_str):
+                        return True # Comes back through the pipeline after its backoff; counted as processed then
+                else:
                     consecutive_network_errors = 0 # Reset error count on success or non-network-error
 
                 # Handle cover download errors (if applicable)
-                if result_status in ["DOWNLOAD_FAILED_HTTP_ERROR", "DOWNLOAD_FAILED_NETWORK_ERROR", "DOWNLOAD_FAILED_TIMEOUT", "DOWNLOAD_FAILED_UNKNOWN"]:
+                if result_status in ["DOWNLOAD_FAILED_HTTP_ERROR", "DOWNLOAD_FAILED_NETWORK_ERROR", "DOWNLOAD_FAILED_TIMEOUT", "DOWNLOAD_FAILED_INVALID_IMAGE", "DOWNLOAD_FAILED_UNKNOWN"]:
                     consecutive_cover_download_error_count += 1
                     if consecutive_cover_download_error_count >= MAX_CONSECUTIVE_COVER_DOWNLOAD_ERRORS:
                         print(f"\n\nStopping due to {MAX_CONSECUTIVE_COVER_DOWNLOAD_ERRORS} consecutive cover download errors. Exiting.", file=sys.stderr)
-                        for t in tasks:
-                            if not t.done():
-                                t.cancel()
-                        return # Exit main function immediately
+                        return False
                 else:
                     consecutive_cover_download_error_count = 0 # Reset cover error count on success or non-cover-related issue
 
-                processed_count += 1 # Increment for each task that finishes
+                processed_count += 1 # Increment for each novel that finishes
 
                 elapsed_time = time.time() - start_time
-                
+
                 # Update progress every 100 novels or at the very end
                 if processed_count % 100 == 0 or processed_count == total_novels_in_range:
                     progress_percent = (processed_count / total_novels_in_range) * 100
-                    
+
                     eta_str = "N/A"
                     avg_time_per_novel_str = "N/A"
                     if processed_count > 0 and elapsed_time > 0:
@@ -584,33 +1073,97 @@ async def main():
                         f"\rProgress: {processed_count}/{total_novels_in_range} ({progress_percent:.2f}%) "
                         f"| Data Found: {total_novel_pages_processed_with_data} | Covers Downloaded: {total_covers_downloaded} ({current_download_size_bytes[0] / (1024*1024):.2f} MB) "
                         f"| Elapsed: {time.strftime('%Hh %Mm %Ss', time.gmtime(elapsed_time))} "
-                        f"| Avg Time/Novel: {avg_time_per_novel_str} | ETA: {eta_str}"
+                        f"| Avg Time/Novel: {avg_time_per_novel_str} | ETA: {eta_str} "
+                        f"| Concurrency: {int(controller.limit)}"
                     )
                     sys.stdout.flush()
+                return True
+
+            # IDs are generated lazily and pushed through a bounded queue, so only
+            # PIPELINE_WORKER_COUNT novels (plus a small buffer) are ever in memory at once.
+            await run_id_pipeline(_pending_novel_ids(), _handle_novel, stats=stats, retry_queue=retry_queue)
 
     finally:
+        await stats_exporter.stop() # Writes a final snapshot
+        parse_pool.shutdown()
+        scheduler_stats = scheduler.stats() if scheduler else None # Reads the ID index, which close() unmaps
+        if cover_executor:
+            cover_executor.shutdown(wait=True) # No cover thread evicts past this point
         if f_output: # Ensure the file handle was successfully opened
             f_output.close()
+        if cover_store:
+            # Covers evicted this run (also ones written by earlier runs) must not keep pointing at deleted files
+            removed_covers = cover_store.pop_removed_covers()
+            if removed_covers:
+                state_store.set_cover_states(removed_covers)
+                if current_output_file == OUTPUT_FILE_METADATA:
+                    updated = _write_cover_paths(current_output_file, removed_covers)
+                    print(f"\nRewrote {current_output_file}: {updated} evicted cover paths updated.")
+            print(f"\nCover store: {json.dumps(cover_store.stats())}")
+            cover_store.close()
+        state_store.close() # Commits whatever is still buffered
+        if derivatives:
+            derivatives.close()
         print("\n\nScraping complete!")
         print(f"Total novel pages processed: {processed_count}")
         print(f"Total data entries written to file: {total_novel_pages_processed_with_data}")
         print(f"Total covers downloaded: {total_covers_downloaded}")
         print(f"Total cover storage used: {current_download_size_bytes[0] / (1024*1024):.2f} MB")
         print(f"Total time taken: {time.time() - start_time:.2f} seconds")
-
-async def process_novel(session, novel_id_str, semaphore, file_handle, 
+        print(f"Concurrency controller: {json.dumps(controller.stats(), ensure_ascii=False)}")
+        print(f"Parser pool: {json.dumps(parse_pool.stats(), ensure_ascii=False)}")
+        print(f"Connections: {json.dumps(transport.stats())}")
+        print(f"Retries: {json.dumps(retry_queue.counts)}")
+        if rate_limiter:
+            print(f"Rate limiter: {json.dumps(rate_limiter.stats())}")
+            rate_limiter.close()
+        if retry_queue.counts["dead_lettered"]:
+            print(f"{retry_queue.counts['dead_lettered']} IDs still failed after {RETRY_MAX_ATTEMPTS} retries; run menu option 7 to retry just those.")
+        if scheduler_stats:
+            print(f"Density scheduler: {json.dumps(scheduler_stats)}")
+            if scheduler_stats["ids_left_in_sparse_blocks"]:
+                print(f"{scheduler_stats['ids_left_in_sparse_blocks']} IDs in nearly-dead blocks were only sampled; they stay pending for a later run "
+                      "(or set DENSITY_SWEEP_SPARSE_BLOCKS = True to fetch them).")
+        print(f"Outcomes: {json.dumps(stats.counters)} | Looks {stats.diagnosis() or 'idle'}"
+              + (f" (full stats in {STATS_JSON_FILE})" if STATS_JSON_FILE else ""))
+        if html_cache:
+            print(f"HTML cache: {json.dumps(html_cache.stats())}")
+            html_cache.close()
+
+async def process_novel(ctx, novel_id_str, file_handle, 
                         scrape_metadata_flag, scrape_titles_only_flag, 
-                        download_covers_flag, 
-                        current_download_size_bytes_ref, max_storage_bytes,
-                        forbidden_novel_ids_set): # New argument for forbidden IDs
+                        download_covers_flag, output_file_name):
     """Fetches, parses, and writes a single novel's data, and optionally downloads its cover.
+    The run's sessions, state store, parse pool, cache, stats, limiter and cover store come from `ctx` (a ScrapeContext).
     Returns a tuple: (status, cover_downloaded_flag, data_written_flag)
     """
-    html_content = await fetch_page(session, novel_id_str, semaphore)
+    validators = {} # Filled with the response's ETag / Last-Modified for later refreshes
+    html_content = await fetch_page(ctx.page_session, novel_id_str, ctx.controller, validators, ctx.stats, ctx.rate_limiter)
     if html_content is None:
+        ctx.state_store.record(novel_id_str, STATUS_NETWORK_ERROR)
+        if ctx.stats:
+            ctx.stats.increment("network_error")
         return 'network_error', False, False # Indicate a network-related error, no cover, no data
+    if ctx.html_cache:
+        await ctx.html_cache.put(novel_id_str, html_content)
 
-    novel_data = parse_novel_data(html_content, novel_id_str)
+    # Parsing is CPU-bound, so it runs in the parser process pool rather than on the event loop
+    parse_start = time.monotonic()
+    try:
+        if ctx.parse_pool:
+            page_status, novel_data = await ctx.parse_pool.parse(html_content, novel_id_str)
+        else:
+            page_status, novel_data = parse_novel_page(html_content, novel_id_str)
+    except Exception as e:
+        # Only this page fails: recorded as failed (not dead), so menu option 7 re-fetches it after a parser fix
+        print(f"Error parsing page {novel_id_str}: {e}", file=sys.stderr)
+        ctx.state_store.record(novel_id_str, STATUS_PARSE_ERROR)
+        if ctx.stats:
+            ctx.stats.increment("parse_error")
+        return 'parse_error', False, False
+    if ctx.stats:
+        ctx.stats.observe("parse", time.monotonic() - parse_start)
+        ctx.stats.increment(page_status)
     cover_downloaded_this_novel = False
     data_written_this_novel = False
     
@@ -621,12 +1174,8 @@ async def process_novel(session, novel_id_str, semaphore, file_handle,
         status = 'found' # Data was successfully parsed from the page
     else:
         # If novel_data is None, it means it was skipped by parse_novel_data (deleted/inaccessible)
-        # Add to forbidden list if not already there
-        if novel_id_str not in forbidden_novel_ids_set:
-            forbidden_novel_ids_set.add(novel_id_str)
-            with open(FORBIDDEN_FILE, 'a', encoding='utf-8') as f_forbidden:
-                f_forbidden.write(novel_id_str + '\n')
-            # print(f"Added novel {novel_id_str} to forbidden list.", file=sys.stderr)
+        # Record it as dead in the state store (batched, no file open per ID)
+        ctx.state_store.record(novel_id_str, PAGE_STATUS_TO_STATE[page_status])
         return 'skipped_forbidden', False, False # Indicate it was skipped due to being forbidden
 
     # Handle cover download logic
@@ -634,39 +1183,34 @@ async def process_novel(session, novel_id_str, semaphore, file_handle,
         if novel_data['is_adult']:
             novel_data['cover_local_path'] = "SKIPPED_ADULT"
         else:
-            # Determine the correct file extension from the URL
-            url_path = novel_data['cover_url'].split('?')[0] # Remove query parameters if any
-            # Extract the last part after the dot, default to .jpg if no clear extension
-            # This ensures we save it with the actual extension from the URL
-            file_extension = os.path.splitext(url_path)[1]
-            if not file_extension: # If no extension found, default to .jpg
-                file_extension = ".jpg"
-            # Ensure it's a valid image extension, otherwise default to .jpg
-            if file_extension.lower() not in ['.png', '.jpg', '.jpeg', '.gif', '.webp']:
-                file_extension = ".jpg" # Default to JPG if unknown/invalid
-
-            cover_filename = f"{novel_id_str}{file_extension}"
-            local_cover_path = os.path.join(DOWNLOAD_COVERS_FOLDER, cover_filename)
-
-            if os.path.exists(local_cover_path):
-                novel_data['cover_local_path'] = local_cover_path
+            local_cover_path = cover_local_path_for(novel_id_str, novel_data['cover_url'])
+            priority = ctx.cover_store.priority_for(novel_data) if ctx.cover_store else None
+
+            # The stored extension follows the actual image format, so look for any of them
+            existing_cover_path = find_existing_cover(DOWNLOAD_COVERS_FOLDER, novel_id_str)
+            if existing_cover_path:
+                novel_data['cover_local_path'] = existing_cover_path
                 cover_downloaded_this_novel = True # Count as "available" cover
-            elif current_download_size_bytes_ref[0] >= max_storage_bytes:
+                if ctx.cover_store and ctx.cover_store.evicts: # Keeps the ledger's priority/access time current
+                    await asyncio.get_running_loop().run_in_executor(ctx.cover_executor, ctx.cover_store.touch, novel_id_str, priority)
+            elif ctx.size_ref[0] >= ctx.max_storage_bytes and not (ctx.cover_store and ctx.cover_store.evicts):
                 novel_data['cover_local_path'] = "SKIPPED_LIMIT"
             else:
-                download_status = await download_cover(
-                    session, novel_data['cover_url'], local_cover_path, 
-                    current_download_size_bytes_ref, max_storage_bytes
-                )
+                download_status = await download_cover(ctx, novel_data['cover_url'], local_cover_path, priority)
                 novel_data['cover_local_path'] = download_status
-                if download_status == local_cover_path:
+                if not download_status.startswith(("SKIPPED", "DOWNLOAD_FAILED")):
                     cover_downloaded_this_novel = True
                 elif "DOWNLOAD_FAILED" in download_status:
                     # If cover download failed, update the status to reflect this
                     status = download_status 
     
+    if ctx.stats and download_covers_flag and novel_data['cover_url']:
+        cover_state = novel_data['cover_local_path']
+        ctx.stats.increment(f"cover_{cover_state}" if cover_state.startswith(("SKIPPED", "DOWNLOAD_FAILED")) else "cover_ok")
+
     # Handle data writing logic
     # Only write if a file handle is provided (i.e., not in covers-only mode where file_handle is None)
+    write_start = time.monotonic()
     if file_handle: 
         if scrape_metadata_flag:
             # Write as JSON Line
@@ -676,9 +1220,310 @@ async def process_novel(session, novel_id_str, semaphore, file_handle,
             # Write as plain text title, ID
             file_handle.write(f"{novel_data['title']}, {novel_data['id']}\n")
             data_written_this_novel = True
+
+    ctx.state_store.record(
+        novel_id_str, STATUS_OK, novel_data, novel_data['cover_local_path'],
+        output_file_name if data_written_this_novel else None, validators
+    )
+    if ctx.stats:
+        ctx.stats.observe("write", time.monotonic() - write_start)
     
     return status, cover_downloaded_this_novel, data_written_this_novel
 
+# --- Incremental Refresh ---
+def _rewrite_metadata_file(output_file, changed_records, removed_ids):
+    """Streams the JSONL file into a temp file, swapping in changed records and dropping removed ones,
+    then atomically replaces the original. Unchanged lines are copied verbatim.
+    Returns the number of records replaced.
+    """
+    temp_file = output_file + ".tmp"
+    replaced = 0
+    with open(output_file, 'r', encoding='utf-8') as f_in, open(temp_file, 'w', encoding='utf-8') as f_out:
+        for line in f_in:
+            try:
+                novel_id_str = json.loads(line).get('id')
+            except json.JSONDecodeError:
+                f_out.write(line) # Keep lines we can't parse untouched
+                continue
+            if novel_id_str in removed_ids:
+                continue
+            new_data = changed_records.pop(novel_id_str, None)
+            if new_data is None:
+                f_out.write(line)
+                continue
+            old_data = json.loads(line)
+            # The cover on disk is still valid as long as the cover URL didn't change
+            if new_data.get('cover_url') == old_data.get('cover_url'):
+                new_data['cover_local_path'] = old_data.get('cover_local_path')
+            f_out.write(json.dumps(new_data, ensure_ascii=False) + '\n')
+            replaced += 1
+    os.replace(temp_file, output_file)
+    return replaced
+
+async def refresh_metadata(start_id, end_id):
+    """Re-visits novels already in the metadata JSONL and rewrites only the records that changed.
+    Each page is requested conditionally (If-None-Match / If-Modified-Since) when the server gave us
+    validators before; otherwise the freshly extracted fields are compared by content hash.
+    Only novels whose refresh is due are visited, most overdue first, up to REFRESH_REQUEST_BUDGET;
+    each check pushes the novel's next due time out (unchanged) or in (changed).
+    """
+    if not os.path.exists(OUTPUT_FILE_METADATA):
+        print(f"Nothing to refresh: {OUTPUT_FILE_METADATA} does not exist. Scrape metadata first.")
+        return
+
+    start_time = time.time()
+    controller = AdaptiveConcurrencyController()
+    parse_pool = BatchedParsePool(PARSER_PROCESS_COUNT, select_backend(PARSER_BACKEND))
+    state_store = CrawlStateStore(STATE_DB_FILE)
+    state_store.import_output_file(OUTPUT_FILE_METADATA, is_jsonl=True)
+    rate_limiter = SharedRateLimiter() if RATE_LIMIT_ENABLED else None
+    html_cache = HtmlResponseCache(HTML_CACHE_FILE, int(HTML_CACHE_MAX_GB * 1024 * 1024 * 1024)) if HTML_CACHE_ENABLED else None
+    counts = {"checked": 0, "not_modified": 0, "unchanged": 0, "changed": 0, "removed": 0, "network_error": 0, "parse_error": 0}
+    now = time.time()
+    changed_records = {} # id -> new data; only the (small) changed subset is held in memory
+    removed_ids = set()
+
+    due_count, total_count = state_store.refresh_backlog(OUTPUT_FILE_METADATA, now)
+    print(f"Refreshing indexed novels from ID {start_id:06d} to {end_id:06d} in {OUTPUT_FILE_METADATA}...")
+    print(f"{due_count or 0} of {total_count} indexed novels are due; request budget: {REFRESH_REQUEST_BUDGET or 'unlimited'}.")
+
+    def _reschedule(novel_id, interval, changed, publication_status):
+        new_interval = next_refresh_interval(interval, changed, publication_status)
+        state_store.schedule_refresh(novel_id, next_refresh_due(time.time(), new_interval), new_interval, publication_status, changed)
+
+    async def _refresh_novel(candidate):
+        novel_id, etag, last_modified, old_hash, interval, publication_status = candidate
+        novel_id_str = f"{novel_id:06d}"
+        validators = {"etag": etag, "last_modified": last_modified}
+        html_content = await fetch_page(session, novel_id_str, controller, validators, rate_limiter=rate_limiter)
+        counts["checked"] += 1
+
+        if html_content is None:
+            counts["network_error"] += 1
+            state_store.record(novel_id_str, STATUS_NETWORK_ERROR)
+        elif html_content == NOT_MODIFIED:
+            counts["not_modified"] += 1
+            state_store.record(novel_id_str, STATUS_OK, validators=validators)
+            _reschedule(novel_id, interval, False, publication_status)
+        else:
+            if html_cache:
+                await html_cache.put(novel_id_str, html_content)
+            try:
+                page_status, novel_data = await parse_pool.parse(html_content, novel_id_str)
+            except Exception as e:
+                print(f"Error parsing page {novel_id_str}: {e}", file=sys.stderr)
+                counts["parse_error"] += 1
+                return True # The record stays as it is; the novel is due again next run
+            if novel_data is None: # Deleted or made inaccessible since the last crawl
+                counts["removed"] += 1
+                removed_ids.add(novel_id_str)
+                state_store.record(novel_id_str, PAGE_STATUS_TO_STATE[page_status], validators=validators)
+            elif content_hash(novel_data) == old_hash:
+                counts["unchanged"] += 1
+                state_store.record(novel_id_str, STATUS_OK, validators=validators)
+                _reschedule(novel_id, interval, False, novel_data["publication_status"])
+            else:
+                counts["changed"] += 1
+                changed_records[novel_id_str] = novel_data
+                state_store.record(novel_id_str, STATUS_OK, novel_data, validators=validators)
+                _reschedule(novel_id, interval, True, novel_data["publication_status"])
+
+        if counts["checked"] % 100 == 0:
+            sys.stdout.write(
+                f"\rChecked: {counts['checked']} | Not Modified (304): {counts['not_modified']} | Unchanged: {counts['unchanged']} "
+                f"| Changed: {counts['changed']} | Removed: {counts['removed']} | Errors: {counts['network_error']} "
+                f"| Concurrency: {int(controller.limit)}"
+            )
+            sys.stdout.flush()
+        return True
+
+    try:
+        async with create_session(PAGE_LIMIT_PER_HOST, PAGE_TIMEOUT) as session:
+            due_novels = state_store.iter_due_refreshes(OUTPUT_FILE_METADATA, start_id, end_id, now, REFRESH_REQUEST_BUDGET)
+            await run_id_pipeline(due_novels, _refresh_novel)
+        if changed_records or removed_ids:
+            replaced = _rewrite_metadata_file(OUTPUT_FILE_METADATA, changed_records, removed_ids)
+            state_store.remove_from_output([int(novel_id_str) for novel_id_str in removed_ids], OUTPUT_FILE_METADATA)
+            print(f"\nRewrote {OUTPUT_FILE_METADATA}: {replaced} records updated, {len(removed_ids)} removed.")
+    finally:
+        parse_pool.shutdown()
+        state_store.close()
+        if html_cache:
+            html_cache.close()
+        if rate_limiter:
+            rate_limiter.close()
+        print("\n\nRefresh complete!")
+        print(f"Refresh results: {json.dumps(counts)}")
+        if due_count and due_count > counts["checked"]:
+            print(f"{due_count - counts['checked']} due novels were left for the next run (request budget).")
+        print(f"Total time taken: {time.time() - start_time:.2f} seconds")
+
+# --- Offline Re-parse ---
+def reparse_metadata_from_cache():
+    """Regenerates the metadata JSONL from the raw-HTML cache, parsing on every core without any network.
+    Useful after a parser fix or schema change. Known cover paths are kept, and records whose page is
+    not in the cache are carried over as they were.
+    """
+    if not os.path.exists(HTML_CACHE_FILE):
+        print(f"Nothing to re-parse: {HTML_CACHE_FILE} does not exist. Set HTML_CACHE_ENABLED and scrape first.")
+        return
+
+    start_time = time.time()
+    html_cache = HtmlResponseCache(HTML_CACHE_FILE, int(HTML_CACHE_MAX_GB * 1024 * 1024 * 1024))
+    state_store = CrawlStateStore(STATE_DB_FILE)
+    state_store.import_output_file(OUTPUT_FILE_METADATA, is_jsonl=True)
+    removed_ids = []
+    print(f"Re-parsing cached pages from {HTML_CACHE_FILE} into {OUTPUT_FILE_METADATA}...")
+
+    def _on_record(novel_id_str, page_status, novel_data):
+        if novel_data:
+            state_store.record(novel_id_str, STATUS_OK, novel_data, output_file=OUTPUT_FILE_METADATA)
+        elif page_status in PAGE_STATUS_TO_STATE:
+            state_store.record(novel_id_str, PAGE_STATUS_TO_STATE[page_status])
+            removed_ids.append(novel_id_str)
+
+    try:
+        written, carried_over = reparse_cache_to_jsonl(
+            html_cache, OUTPUT_FILE_METADATA, state_store.cover_states(),
+            select_backend(PARSER_BACKEND), PARSER_PROCESS_COUNT or 1, _on_record
+        )
+        state_store.remove_from_output(removed_ids, OUTPUT_FILE_METADATA)
+        print(f"Re-parse complete! {written} records regenerated from the cache, {carried_over} carried over unchanged.")
+    finally:
+        state_store.close()
+        html_cache.close()
+        print(f"Total time taken: {time.time() - start_time:.2f} seconds")
+
+# --- Cover Backfill ---
+def _iter_cover_backfill_candidates(metadata_file, start_id, end_id):
+    """Streams the metadata JSONL and yields (id, cover_url, record) for records in range whose
+    cover was never downloaded, skipped for the storage limit, failed, or is gone from disk (evicted).
+    """
+    with open(metadata_file, 'r', encoding='utf-8') as f_in:
+        for line in f_in:
+            try:
+                record = json.loads(line)
+                novel_id = int(record['id'])
+            except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+                continue
+            if not start_id <= novel_id <= end_id or not record.get('cover_url'):
+                continue
+            cover_state = record.get('cover_local_path')
+            if cover_state is None or cover_state.startswith(COVER_BACKFILL_STATES) or (
+                    not cover_state.startswith("SKIPPED") and not os.path.exists(cover_state)):
+                yield record['id'], record['cover_url'], record
+
+def _write_cover_paths(output_file, cover_paths):
+    """Streams the JSONL file into a temp file, setting cover_local_path for the IDs in `cover_paths`,
+    then atomically replaces the original. Other lines are copied verbatim. Returns the number updated.
+    """
+    temp_file = output_file + ".tmp"
+    updated = 0
+    with open(output_file, 'r', encoding='utf-8') as f_in, open(temp_file, 'w', encoding='utf-8') as f_out:
+        for line in f_in:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                f_out.write(line) # Keep lines we can't parse untouched
+                continue
+            cover_state = cover_paths.get(record.get('id'))
+            if cover_state is None or cover_state == record.get('cover_local_path'):
+                f_out.write(line)
+                continue
+            record['cover_local_path'] = cover_state
+            f_out.write(json.dumps(record, ensure_ascii=False) + '\n')
+            updated += 1
+    os.replace(temp_file, output_file)
+    return updated
+
+async def backfill_covers(start_id, end_id, current_download_size_bytes_ref, max_storage_bytes, cover_executor, cover_store=None, derivatives=None):
+    """Downloads the covers the metadata JSONL is still missing, without fetching or parsing a single
+    novel page: records whose cover_local_path is null, SKIPPED_LIMIT, DOWNLOAD_FAILED_* or a file that
+    is gone are picked up (adult novels are marked SKIPPED_ADULT, as a scrape would). The new paths
+    are written back at the end, also when interrupted, so finished downloads are never lost.
+    """
+    start_time = time.time()
+    state_store = CrawlStateStore(STATE_DB_FILE)
+    rate_limiter = SharedRateLimiter() if RATE_LIMIT_ENABLED else None
+    # No page fetches here, so no controller or page session; the cover session is set once it is open
+    ctx = ScrapeContext(
+        state_store, None, cover_executor=cover_executor, rate_limiter=rate_limiter, cover_store=cover_store,
+        derivatives=derivatives, size_ref=current_download_size_bytes_ref, max_storage_bytes=max_storage_bytes
+    )
+    counts = {"checked": 0, "downloaded": 0, "already_on_disk": 0, "skipped_adult": 0, "skipped_limit": 0, "skipped_placeholder": 0, "failed": 0}
+    cover_paths = {} # id -> new cover_local_path; only the backfilled subset is held in memory
+    consecutive_failures = 0
+
+    print(f"Backfilling missing covers of {OUTPUT_FILE_METADATA} from ID {start_id:06d} to {end_id:06d}...")
+
+    async def _backfill_cover(candidate):
+        nonlocal consecutive_failures
+        novel_id_str, cover_url, record = candidate
+        counts["checked"] += 1
+        existing_cover_path = find_existing_cover(DOWNLOAD_COVERS_FOLDER, novel_id_str)
+        if record.get('is_adult'):
+            cover_state = "SKIPPED_ADULT"
+            counts["skipped_adult"] += 1
+        elif existing_cover_path:
+            cover_state = existing_cover_path
+            counts["already_on_disk"] += 1
+        elif current_download_size_bytes_ref[0] >= max_storage_bytes and not (cover_store and cover_store.evicts):
+            counts["skipped_limit"] += 1
+            print("\nStorage limit reached. Stopping the backfill.", file=sys.stderr)
+            return False # The rest keeps its current state for a later run with more room
+        else:
+            cover_state = await download_cover(
+                ctx, cover_url, cover_local_path_for(novel_id_str, cover_url),
+                cover_store.priority_for(record) if cover_store else None
+            )
+            if cover_state.startswith("DOWNLOAD_FAILED"):
+                counts["failed"] += 1
+                consecutive_failures += 1
+            elif cover_state in ("SKIPPED_LIMIT", "SKIPPED_PLACEHOLDER"):
+                counts[cover_state.lower()] += 1
+            else:
+                counts["downloaded"] += 1
+                consecutive_failures = 0
+        cover_paths[novel_id_str] = cover_state
+        state_store.record(novel_id_str, STATUS_OK, cover_state=cover_state)
+
+        if counts["checked"] % 100 == 0:
+            sys.stdout.write(
+                f"\rChecked: {counts['checked']} | Downloaded: {counts['downloaded']} ({current_download_size_bytes_ref[0] / (1024*1024):.2f} MB) "
+                f"| Already on disk: {counts['already_on_disk']} | Failed: {counts['failed']} "
+                f"| Elapsed: {time.strftime('%Hh %Mm %Ss', time.gmtime(time.time() - start_time))}"
+            )
+            sys.stdout.flush()
+        if consecutive_failures >= MAX_CONSECUTIVE_COVER_DOWNLOAD_ERRORS:
+            print(f"\n\nStopping due to {MAX_CONSECUTIVE_COVER_DOWNLOAD_ERRORS} consecutive cover download errors.", file=sys.stderr)
+            return False
+        return True
+
+    candidates = _iter_cover_backfill_candidates(OUTPUT_FILE_METADATA, start_id, end_id)
+    try:
+        async with create_session(COVER_LIMIT_PER_HOST, COVER_TIMEOUT) as cover_session:
+            ctx.cover_session = cover_session
+            await run_id_pipeline(candidates, _backfill_cover)
+    finally:
+        candidates.close() # Releases the metadata file before it is replaced
+        if cover_store:
+            # Covers evicted to make room for the ones backfilled here; a later backfill fetches them again
+            removed_covers = cover_store.pop_removed_covers()
+            cover_paths.update(removed_covers)
+            state_store.set_cover_states(removed_covers)
+        if cover_paths:
+            updated = _write_cover_paths(OUTPUT_FILE_METADATA, cover_paths)
+            print(f"\nRewrote {OUTPUT_FILE_METADATA}: {updated} cover paths updated.")
+        state_store.close()
+        if rate_limiter:
+            rate_limiter.close()
+        print("\n\nCover backfill complete!")
+        print(f"Backfill results: {json.dumps(counts)}")
+        if cover_store:
+            print(f"Cover store: {json.dumps(cover_store.stats())}")
+        print(f"Total cover storage used: {current_download_size_bytes_ref[0] / (1024*1024):.2f} MB")
+        print(f"Total time taken: {time.time() - start_time:.2f} seconds")
+
 def _get_id_range_from_user():
     """
     Prompts the user for a novel ID range (e.g., "1-100").
@@ -719,7 +1564,7 @@ if __name__ == "__main__":
     script_dir = os.path.dirname(os.path.abspath(sys.argv[0]))
     log_file_path = os.path.join(script_dir, "log.txt")
 
-    with Logger(log_file_path):
+    with LoggingSession(log_file_path):
         # Get ID range from user and update global variables
         START_ID, END_ID = _get_id_range_from_user()
 
@@ -0,0 +1,430 @@
+import os
+import re
+import sys
+import json
+import mmap # For the memory-mapped ID state index
+import time
+import hashlib
+import sqlite3
+
+# --- Crawl State Store ---
+STATE_DB_FILE = "novelpia_state.sqlite3"
+STATE_COMMIT_EVERY = 500 # Buffered records per commit
+STATE_COMMIT_INTERVAL = 2.0 # ...or seconds since the last commit, whichever comes first
+STATE_LOCK_TIMEOUT = 60.0 # Seconds a commit waits for another process (e.g. a coordinator worker) sharing the store
+
+STATUS_OK = "ok"
+STATUS_DELETED = "deleted"
+STATUS_WRONG_ACCESS = "wrong-access"
+STATUS_NO_DATA = "no-data" # Page loaded but had no title (treated like a dead ID)
+STATUS_NETWORK_ERROR = "network-error"
+STATUS_PARSE_ERROR = "parse-error" # Fetched, but the parser raised on the page
+DEAD_STATUSES = (STATUS_DELETED, STATUS_WRONG_ACCESS, STATUS_NO_DATA)
+FAILED_STATUSES = (STATUS_NETWORK_ERROR, STATUS_PARSE_ERROR) # Worth another fetch (menu option 7)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS novels (
+    id INTEGER PRIMARY KEY,
+    status TEXT NOT NULL,
+    last_fetched REAL,
+    content_hash TEXT,
+    cover_state TEXT,
+    etag TEXT,
+    last_modified TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_novels_status ON novels(status);
+CREATE TABLE IF NOT EXISTS novel_outputs (
+    id INTEGER NOT NULL,
+    output_file TEXT NOT NULL,
+    PRIMARY KEY (id, output_file)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS refresh_schedule (
+    id INTEGER PRIMARY KEY,
+    next_due REAL NOT NULL,
+    interval REAL NOT NULL,
+    publication_status TEXT,
+    checks INTEGER NOT NULL DEFAULT 0,
+    changes INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_refresh_due ON refresh_schedule(next_due);
+CREATE TABLE IF NOT EXISTS dead_letters (
+    id INTEGER PRIMARY KEY,
+    attempts INTEGER NOT NULL,
+    failed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# A network or parse error never overwrites what we already know about a page; it only marks unknown IDs.
+_UPSERT_NOVEL = """
+INSERT INTO novels (id, status, last_fetched, content_hash, cover_state, etag, last_modified) VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(id) DO UPDATE SET
+    status = CASE WHEN excluded.status IN ('network-error', 'parse-error') THEN novels.status ELSE excluded.status END,
+    last_fetched = excluded.last_fetched,
+    content_hash = COALESCE(excluded.content_hash, novels.content_hash),
+    cover_state = COALESCE(excluded.cover_state, novels.cover_state),
+    etag = COALESCE(excluded.etag, novels.etag),
+    last_modified = COALESCE(excluded.last_modified, novels.last_modified)
+"""
+_UPSERT_SCHEDULE = """
+INSERT INTO refresh_schedule (id, next_due, interval, publication_status, checks, changes) VALUES (?, ?, ?, ?, 1, ?)
+ON CONFLICT(id) DO UPDATE SET
+    next_due = excluded.next_due,
+    interval = excluded.interval,
+    publication_status = COALESCE(excluded.publication_status, refresh_schedule.publication_status),
+    checks = refresh_schedule.checks + 1,
+    changes = refresh_schedule.changes + excluded.changes
+"""
+# Columns added after the first release of the store, migrated in place on open
+_ADDED_COLUMNS = {"etag": "TEXT", "last_modified": "TEXT"}
+REFRESH_PAGE_SIZE = 1000 # Rows fetched per query when walking refresh candidates
+
+# --- Compact ID State Index ---
+ID_INDEX_FILE = "novelpia_id_index.bin"
+ID_INDEX_CAPACITY = 1000000 # Covers the 000000-999999 ID space; grows if a larger ID is requested
+ID_INDEX_SCAN_CHUNK = 64 * 1024 # Bytes (256K IDs) examined per step when looking for pending IDs
+
+ID_UNKNOWN = 0 # Never fetched (or not yet written to the current output)
+ID_INDEXED = 1 # Already written to the current output file
+ID_DEAD = 2 # Deleted / wrong-access / no-data
+ID_FAILED = 3 # Last fetch failed with a network error; worth retrying
+
+# Per byte value (4 IDs of 2 bits each): slots that still need fetching (unknown or failed)
+_PENDING_SLOTS = tuple(
+    tuple(slot for slot in range(4) if ((byte >> (slot * 2)) & 3) in (ID_UNKNOWN, ID_FAILED))
+    for byte in range(256)
+)
+# bytes.translate() table mapping a byte to 1 if any of its 4 IDs is pending, so find() can skip known runs in C
+_HAS_PENDING = bytes(1 if slots else 0 for slots in _PENDING_SLOTS)
+
+class IdStateIndex(object):
+    """
+    Two bits of state per novel ID in a memory-mapped file (250 KB for a million IDs), replacing
+    sets of six-character ID strings. Lookups are a shift and a mask, and iter_pending() jumps
+    straight to IDs that still need fetching instead of stepping through every candidate.
+    Pass path=None for an anonymous (memory-only) mapping.
+    """
+    def __init__(self, path=ID_INDEX_FILE, capacity=ID_INDEX_CAPACITY):
+        self.path = path
+        self.capacity = capacity
+        size = (capacity + 3) // 4
+        if path is None:
+            self._file = None
+            self._map = mmap.mmap(-1, size)
+        else:
+            self._file = open(path, 'w+b') # Rebuilt from the state store on every run
+            self._file.truncate(size)
+            self._map = mmap.mmap(self._file.fileno(), size)
+
+    def get(self, novel_id):
+        if not 0 <= novel_id < self.capacity:
+            return ID_UNKNOWN
+        return (self._map[novel_id >> 2] >> ((novel_id & 3) * 2)) & 3
+
+    def is_pending(self, novel_id):
+        """True if the ID still needs fetching (unknown or failed)."""
+        return self.get(novel_id) in (ID_UNKNOWN, ID_FAILED)
+
+    def set(self, novel_id, state):
+        if not 0 <= novel_id < self.capacity:
+            return
+        byte_index = novel_id >> 2
+        shift = (novel_id & 3) * 2
+        self._map[byte_index] = (self._map[byte_index] & ~(3 << shift) & 0xFF) | (state << shift)
+
+    def iter_pending(self, start_id, end_id):
+        """Yields, in order, the IDs in [start_id, end_id] that are unknown or failed."""
+        position = max(start_id, 0) >> 2
+        last_byte = min(end_id, self.capacity - 1) >> 2
+        while position <= last_byte:
+            chunk = self._map[position:min(position + ID_INDEX_SCAN_CHUNK, last_byte + 1)]
+            flags = chunk.translate(_HAS_PENDING)
+            offset = flags.find(1)
+            while offset != -1:
+                for slot in _PENDING_SLOTS[chunk[offset]]:
+                    novel_id = (position + offset) * 4 + slot
+                    if start_id <= novel_id <= end_id and novel_id < self.capacity:
+                        yield novel_id
+                offset = flags.find(1, offset + 1)
+            position += len(chunk)
+        # IDs past the index capacity are always unknown
+        for novel_id in range(max(start_id, self.capacity), end_id + 1):
+            yield novel_id
+
+    def count_pending(self, start_id, end_id):
+        return sum(1 for _ in self.iter_pending(start_id, end_id))
+
+    def close(self):
+        self._map.close()
+        if self._file:
+            self._file.close()
+
+def content_hash(novel_data):
+    """Stable hash of the extracted fields (the local cover path is bookkeeping, not content)."""
+    fields = {key: value for key, value in novel_data.items() if key != "cover_local_path"}
+    return hashlib.sha1(json.dumps(fields, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+class CrawlStateStore(object):
+    """
+    Embedded SQLite (WAL mode) store of per-ID crawl state, keyed by integer novel ID.
+    Writes are buffered and committed in batches, so recording an ID costs no file open;
+    resuming is an indexed query instead of re-parsing the whole output file.
+    """
+    def __init__(self, path=STATE_DB_FILE, commit_every=STATE_COMMIT_EVERY, commit_interval=STATE_COMMIT_INTERVAL):
+        self.path = path
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        self.connection = sqlite3.connect(path, timeout=STATE_LOCK_TIMEOUT)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL") # Safe with WAL; skips an fsync per commit
+        self.connection.executescript(_SCHEMA)
+        existing_columns = {row[1] for row in self.connection.execute("PRAGMA table_info(novels)")}
+        for column, column_type in _ADDED_COLUMNS.items():
+            if column not in existing_columns:
+                self.connection.execute(f"ALTER TABLE novels ADD COLUMN {column} {column_type}")
+        self.connection.commit()
+        self._pending_novels = []
+        self._pending_outputs = []
+        self._pending_schedules = []
+        self._pending_dead_letters = []
+        self._pending_cover_states = []
+        self._last_commit_time = time.monotonic()
+        self.id_index = None # Optional IdStateIndex kept in sync with record()
+
+    # --- Writes ---
+    def record(self, novel_id, status, novel_data=None, cover_state=None, output_file=None, validators=None):
+        """Buffers the outcome of fetching one novel. `output_file` marks it as written to that file;
+        `validators` holds the response's 'etag' / 'last_modified' for later conditional requests.
+        """
+        novel_id = int(novel_id)
+        hash_value = content_hash(novel_data) if novel_data else None
+        validators = validators or {}
+        self._pending_novels.append((novel_id, status, time.time(), hash_value, cover_state, validators.get("etag"), validators.get("last_modified")))
+        if output_file:
+            self._pending_outputs.append((novel_id, output_file))
+        if self.id_index is not None:
+            if output_file:
+                self.id_index.set(novel_id, ID_INDEXED)
+            elif status in DEAD_STATUSES:
+                self.id_index.set(novel_id, ID_DEAD)
+            elif status in FAILED_STATUSES and self.id_index.get(novel_id) == ID_UNKNOWN:
+                self.id_index.set(novel_id, ID_FAILED)
+        if len(self._pending_novels) >= self.commit_every or time.monotonic() - self._last_commit_time >= self.commit_interval:
+            self.flush()
+
+    def schedule_refresh(self, novel_id, next_due, interval, publication_status=None, changed=False):
+        """Buffers a novel's next refresh time, the interval it was derived from and whether this check found a change."""
+        self._pending_schedules.append((int(novel_id), next_due, interval, publication_status, int(changed)))
+
+    def add_dead_letter(self, novel_id, attempts):
+        """Buffers an ID whose fetch kept failing after `attempts` tries; it stays listed until a fetch succeeds."""
+        self._pending_dead_letters.append((int(novel_id), attempts, time.time()))
+
+    def set_cover_states(self, cover_states):
+        """Buffers new cover states ({ID: state}) of novels recorded earlier, e.g. covers evicted since.
+        They are applied after the buffered records, so they win over an older path recorded meanwhile.
+        """
+        self._pending_cover_states.extend((cover_state, int(novel_id)) for novel_id, cover_state in cover_states.items())
+
+    def flush(self):
+        """Commits all buffered records in one transaction."""
+        if self._pending_novels or self._pending_outputs or self._pending_schedules or self._pending_dead_letters or self._pending_cover_states:
+            with self.connection:
+                self.connection.executemany(_UPSERT_NOVEL, self._pending_novels)
+                self.connection.executemany("INSERT OR IGNORE INTO novel_outputs (id, output_file) VALUES (?, ?)", self._pending_outputs)
+                self.connection.executemany(_UPSERT_SCHEDULE, self._pending_schedules)
+                self.connection.executemany("INSERT OR REPLACE INTO dead_letters (id, attempts, failed_at) VALUES (?, ?, ?)", self._pending_dead_letters)
+                # Any real answer for an ID (found or dead) takes it off the dead-letter list
+                self.connection.executemany("DELETE FROM dead_letters WHERE id = ?",
+                                            [(row[0],) for row in self._pending_novels if row[1] not in FAILED_STATUSES])
+                self.connection.executemany("UPDATE novels SET cover_state = ? WHERE id = ?", self._pending_cover_states)
+            self._pending_novels = []
+            self._pending_outputs = []
+            self._pending_schedules = []
+            self._pending_dead_letters = []
+            self._pending_cover_states = []
+        self._last_commit_time = time.monotonic()
+
+    def clear_output(self, output_file):
+        """Forgets which IDs were written to `output_file` (used when it is re-indexed from scratch)."""
+        self.flush()
+        with self.connection:
+            self.connection.execute("DELETE FROM novel_outputs WHERE output_file = ?", (output_file,))
+
+    def remove_from_output(self, novel_ids, output_file):
+        """Marks the given IDs as no longer present in `output_file`."""
+        self.flush()
+        with self.connection:
+            self.connection.executemany("DELETE FROM novel_outputs WHERE id = ? AND output_file = ?", [(int(novel_id), output_file) for novel_id in novel_ids])
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+        if self.id_index is not None:
+            self.id_index.close()
+
+    # --- Reads ---
+    def max_id(self, *statuses):
+        """Highest recorded ID, optionally only among the given statuses (0 if none)."""
+        self.flush()
+        if not statuses:
+            return self.connection.execute("SELECT MAX(id) FROM novels").fetchone()[0] or 0
+        placeholders = ",".join("?" * len(statuses))
+        return self.connection.execute(f"SELECT MAX(id) FROM novels WHERE status IN ({placeholders})", statuses).fetchone()[0] or 0
+
+    def block_counts(self, block_size, start_id=0, end_id=None):
+        """Returns {block number: (live, dead)} for IDs in the range, block number being id // block_size."""
+        self.flush()
+        end_id = self.max_id() if end_id is None else end_id
+        dead_placeholders = ",".join("?" * len(DEAD_STATUSES))
+        rows = self.connection.execute(
+            f"SELECT id / ?, SUM(status = ?), SUM(status IN ({dead_placeholders})) FROM novels "
+            "WHERE id BETWEEN ? AND ? GROUP BY id / ?",
+            (block_size, STATUS_OK, *DEAD_STATUSES, start_id, end_id, block_size)
+        )
+        return {block: (live, dead) for block, live, dead in rows}
+
+    def dead_letter_count(self):
+        self.flush()
+        return self.connection.execute("SELECT COUNT(*) FROM dead_letters").fetchone()[0]
+
+    def failed_ids(self):
+        """Sorted IDs worth a retry: the dead-letter list plus any ID whose only fetches failed."""
+        self.flush()
+        return [row[0] for row in self.connection.execute(
+            "SELECT id FROM dead_letters UNION SELECT id FROM novels WHERE status IN (?, ?) ORDER BY id", FAILED_STATUSES
+        )]
+
+    def dead_ids(self, start_id, end_id):
+        """Sorted (id, status) of the IDs in the range known to be deleted, forbidden or empty."""
+        self.flush()
+        placeholders = ",".join("?" * len(DEAD_STATUSES))
+        return self.connection.execute(
+            f"SELECT id, status FROM novels WHERE id BETWEEN ? AND ? AND status IN ({placeholders}) ORDER BY id",
+            (start_id, end_id, *DEAD_STATUSES)
+        ).fetchall()
+
+    def output_only_ids(self, output_file, other_output_file):
+        """IDs written to `output_file` but not to `other_output_file`."""
+        self.flush()
+        return [row[0] for row in self.connection.execute(
+            "SELECT id FROM novel_outputs WHERE output_file = ? EXCEPT SELECT id FROM novel_outputs WHERE output_file = ?",
+            (output_file, other_output_file)
+        )]
+
+    def build_id_index(self, output_file, path=ID_INDEX_FILE, min_capacity=ID_INDEX_CAPACITY):
+        """Streams the store into a fresh IdStateIndex (no Python sets) and keeps it in sync from now on.
+        IDs written to `output_file` are marked indexed, dead IDs dead and failed IDs failed.
+        """
+        self.flush()
+        index = IdStateIndex(path, max(min_capacity, self.max_id() + 1))
+        state_for_status = {status: ID_DEAD for status in DEAD_STATUSES}
+        state_for_status.update((status, ID_FAILED) for status in FAILED_STATUSES)
+        for novel_id, status in self.connection.execute("SELECT id, status FROM novels WHERE status != ?", (STATUS_OK,)):
+            index.set(novel_id, state_for_status.get(status, ID_UNKNOWN))
+        if output_file:
+            for (novel_id,) in self.connection.execute("SELECT id FROM novel_outputs WHERE output_file = ?", (output_file,)):
+                index.set(novel_id, ID_INDEXED)
+        self.id_index = index
+        return index
+
+    def count_in_output(self, output_file):
+        self.flush()
+        return self.connection.execute("SELECT COUNT(*) FROM novel_outputs WHERE output_file = ?", (output_file,)).fetchone()[0]
+
+    def cover_states(self):
+        """Returns {integer ID: cover_state} for every found novel with a recorded cover state."""
+        self.flush()
+        return dict(self.connection.execute("SELECT id, cover_state FROM novels WHERE status = ? AND cover_state IS NOT NULL", (STATUS_OK,)))
+
+    def iter_due_refreshes(self, output_file, start_id, end_id, now, limit=None):
+        """Yields (id, etag, last_modified, content_hash, interval, publication_status) for novels in
+        `output_file` whose refresh is due at `now`, most overdue first, at most `limit` of them.
+        Novels never refreshed before have no schedule yet and count as due since forever (interval None).
+        Keyset-paginated on (next_due, id); rows rescheduled meanwhile move past `now` and drop out.
+        """
+        self.flush()
+        last_key = (-1.0, start_id - 1)
+        remaining = limit
+        while remaining is None or remaining > 0:
+            page_size = REFRESH_PAGE_SIZE if remaining is None else min(REFRESH_PAGE_SIZE, remaining)
+            rows = self.connection.execute(
+                "SELECT n.id, n.etag, n.last_modified, n.content_hash, s.interval, s.publication_status, COALESCE(s.next_due, 0) AS due"
+                " FROM novels n JOIN novel_outputs o ON o.id = n.id AND o.output_file = ?"
+                " LEFT JOIN refresh_schedule s ON s.id = n.id"
+                " WHERE n.id BETWEEN ? AND ? AND COALESCE(s.next_due, 0) <= ? AND (COALESCE(s.next_due, 0), n.id) > (?, ?)"
+                " ORDER BY due, n.id LIMIT ?",
+                (output_file, start_id, end_id, now, *last_key, page_size)
+            ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield row[:6]
+            last_key = (rows[-1][6], rows[-1][0])
+            if remaining is not None:
+                remaining -= len(rows)
+
+    def refresh_backlog(self, output_file, now):
+        """Returns (due, total) novel counts in `output_file`."""
+        self.flush()
+        return self.connection.execute(
+            "SELECT SUM(COALESCE(s.next_due, 0) <= ?), COUNT(*) FROM novel_outputs o"
+            " LEFT JOIN refresh_schedule s ON s.id = o.id WHERE o.output_file = ?",
+            (now, output_file)
+        ).fetchone()
+
+    def get_meta(self, key, default=None):
+        row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    # --- One-time migration from the old flat files ---
+    def import_forbidden_file(self, forbidden_file):
+        """Imports a legacy forbidden.txt once. The old file didn't say why an ID was dead, so they are recorded as deleted."""
+        if self.get_meta(f"imported:{forbidden_file}") or not os.path.exists(forbidden_file):
+            return 0
+        count = 0
+        with open(forbidden_file, 'r', encoding='utf-8') as f_forbidden:
+            for line in f_forbidden:
+                line = line.strip()
+                if line.isdigit():
+                    self._pending_novels.append((int(line), STATUS_DELETED, None, None, None, None, None))
+                    count += 1
+        self.flush()
+        self.set_meta(f"imported:{forbidden_file}", count)
+        return count
+
+    def import_output_file(self, output_file, is_jsonl):
+        """Imports the IDs of an existing output file once, so later resumes no longer need to re-read it."""
+        if self.get_meta(f"imported:{output_file}") or not os.path.exists(output_file):
+            return 0
+        count = 0
+        with open(output_file, 'r', encoding='utf-8') as f_read:
+            for line in f_read:
+                try:
+                    if is_jsonl: # If JSONL, parse JSON
+                        data = json.loads(line)
+                        novel_id = data.get('id')
+                        novel_data = data
+                    else: # If TXT, use regex
+                        match = re.search(r', (\d{6})\n?$', line)
+                        novel_id = match.group(1) if match else None
+                        novel_data = None
+                    if novel_id is None:
+                        continue
+                    self._pending_novels.append((int(novel_id), STATUS_OK, None, content_hash(novel_data) if novel_data else None, novel_data.get('cover_local_path') if novel_data else None, None, None))
+                    self._pending_outputs.append((int(novel_id), output_file))
+                    count += 1
+                except json.JSONDecodeError:
+                    print(f"Warning: Could not parse line in {output_file}: {line.strip()}", file=sys.stderr)
+                except Exception as e:
+                    print(f"Error reading existing file line: {e}", file=sys.stderr)
+        self.flush()
+        self.set_meta(f"imported:{output_file}", count)
+        return count
@@ -0,0 +1,183 @@
+import os
+import json
+import time
+import bisect
+import asyncio
+
+from aiohttp import web
+
+# --- Stats Configuration ---
+LATENCY_BUCKETS = tuple(0.001 * 2 ** k for k in range(17)) # 1 ms .. ~65 s
+SIZE_BUCKETS = tuple(1024 * 2 ** k for k in range(16)) # 1 KB .. 32 MB
+RATE_LIMITED_SHARE = 0.01 # Throttled fetches above this share of all fetches => "rate-limited"
+
+# Stage name -> (bucket bounds, unit). Every stage of a novel's trip through the scraper.
+STAGES = {
+    "queue_wait": (LATENCY_BUCKETS, "seconds"), # ID sat in the pipeline queue
+    "slot_wait": (LATENCY_BUCKETS, "seconds"), # Waiting for a slot under the adaptive concurrency window
+    "fetch": (LATENCY_BUCKETS, "seconds"), # Page request until the body is read
+    "page_bytes": (SIZE_BUCKETS, "bytes"),
+    "parse": (LATENCY_BUCKETS, "seconds"), # Handing the page to the parser pool until its result is back
+    "cover_fetch": (LATENCY_BUCKETS, "seconds"), # Streaming the cover to a temporary file
+    "cover_bytes": (SIZE_BUCKETS, "bytes"),
+    "cover_finalize": (LATENCY_BUCKETS, "seconds"), # Sniff / optional re-encode / atomic rename
+    "cover_derivatives": (LATENCY_BUCKETS, "seconds"), # Thumbnail + detail images in WebP and JPEG
+    "write": (LATENCY_BUCKETS, "seconds"), # Writing the record and its state
+}
+
+class StageHistogram(object):
+    """Fixed-bucket histogram (Prometheus-style) with count, sum and bucket-interpolated quantiles."""
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1) # The last bucket is +Inf
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.buckets):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.bounds[index - 1] if index > 0 else 0.0
+                upper = self.bounds[index] if index < len(self.bounds) else self.max
+                return min(self.max, lower + (upper - lower) * (rank - seen) / bucket_count)
+            seen += bucket_count
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum": round(self.total, 6),
+            "mean": round(self.total / self.count, 6) if self.count else None,
+            "p50": self.quantile(0.50),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "max": self.max if self.count else None,
+        }
+
+class ScrapeStats(object):
+    """
+    Per-stage histograms plus outcome counters for one run. Counters are free-form names
+    ('found', 'deleted', 'network_error', 'cover_DOWNLOAD_FAILED_TIMEOUT', 'fetch_throttled', ...);
+    gauges are read from callables at snapshot time (e.g. the current concurrency limit).
+    """
+    def __init__(self):
+        self.started = time.time()
+        self.histograms = {stage: StageHistogram(bounds) for stage, (bounds, _) in STAGES.items()}
+        self.counters = {}
+        self.gauges = {}
+
+    def observe(self, stage, value):
+        self.histograms[stage].observe(value)
+
+    def increment(self, counter, amount=1):
+        self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def add_gauge(self, name, read_value):
+        self.gauges[name] = read_value
+
+    def diagnosis(self):
+        """A rough read of what bounds the run: 'rate-limited', 'cpu-bound' or 'network-bound'."""
+        fetches = sum(count for name, count in self.counters.items() if name.startswith("fetch_"))
+        if fetches and self.counters.get("fetch_throttled", 0) / fetches > RATE_LIMITED_SHARE:
+            return "rate-limited"
+        parse_p50 = self.histograms["parse"].quantile(0.5)
+        fetch_p50 = self.histograms["fetch"].quantile(0.5)
+        if parse_p50 is not None and fetch_p50 is not None and parse_p50 > fetch_p50:
+            return "cpu-bound"
+        return "network-bound" if fetches else None
+
+    def snapshot(self):
+        """Returns a JSON-serializable view of every histogram, counter and gauge."""
+        elapsed = time.time() - self.started
+        return {
+            "time": time.time(),
+            "elapsed_seconds": round(elapsed, 3),
+            "pages_per_sec": round(self.histograms["fetch"].count / elapsed, 2) if elapsed > 0 else None,
+            "diagnosis": self.diagnosis(),
+            "stages": {stage: dict(histogram.summary(), unit=STAGES[stage][1]) for stage, histogram in self.histograms.items()},
+            "counters": dict(self.counters),
+            "gauges": {name: read_value() for name, read_value in self.gauges.items()},
+        }
+
+    def to_prometheus(self):
+        """Renders the stats in the Prometheus text exposition format."""
+        lines = []
+        for stage, histogram in self.histograms.items():
+            unit = STAGES[stage][1]
+            metric = f"novelpia_{stage}" if stage.endswith(f"_{unit}") else f"novelpia_{stage}_{unit}"
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.bounds, histogram.buckets):
+                cumulative += bucket_count
+                lines.append(f'{metric}_bucket{{le="{bound:g}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{le="+Inf"}} {histogram.count}')
+            lines.append(f"{metric}_sum {histogram.total}")
+            lines.append(f"{metric}_count {histogram.count}")
+        lines.append("# TYPE novelpia_outcomes_total counter")
+        for name, count in sorted(self.counters.items()):
+            lines.append(f'novelpia_outcomes_total{{outcome="{name}"}} {count}')
+        for name, read_value in self.gauges.items():
+            lines.append(f"# TYPE novelpia_{name} gauge")
+            lines.append(f"novelpia_{name} {read_value()}")
+        return "\n".join(lines) + "\n"
+
+# --- Exporter ---
+class StatsExporter(object):
+    """Writes the stats snapshot to a JSON file every `interval` seconds (atomically), and optionally
+    serves /metrics (Prometheus text) and /stats.json on 127.0.0.1:`prometheus_port`.
+    """
+    def __init__(self, stats, json_path=None, interval=10.0, prometheus_port=None):
+        self.stats = stats
+        self.json_path = json_path
+        self.interval = interval
+        self.prometheus_port = prometheus_port
+        self._task = None
+        self._runner = None
+
+    async def start(self):
+        if self.json_path:
+            self._task = asyncio.create_task(self._export_loop())
+        if self.prometheus_port:
+            app = web.Application()
+            app.router.add_get("/metrics", self._handle_metrics)
+            app.router.add_get("/stats.json", self._handle_json)
+            self._runner = web.AppRunner(app, access_log=None)
+            await self._runner.setup()
+            await web.TCPSite(self._runner, "127.0.0.1", self.prometheus_port).start()
+
+    async def _handle_metrics(self, request):
+        return web.Response(text=self.stats.to_prometheus(), content_type="text/plain")
+
+    async def _handle_json(self, request):
+        return web.json_response(self.stats.snapshot())
+
+    async def _export_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.write_json()
+
+    def write_json(self):
+        temp_path = self.json_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.stats.snapshot(), f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.json_path)
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self.json_path:
+            self.write_json() # Final snapshot
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,127 @@
+import importlib.util
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None # Only the synchronous (requests) half is usable, e.g. from the library manager
+
+# Optional: with brotli (or brotlicffi) installed, both aiohttp and requests decode "br" responses
+BROTLI_AVAILABLE = any(importlib.util.find_spec(name) is not None for name in ("brotli", "brotlicffi"))
+
+# --- Transport Configuration ---
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+ACCEPT_ENCODING = "gzip, deflate, br" if BROTLI_AVAILABLE else "gzip, deflate" # Only advertise what we can decode
+DEFAULT_HEADERS = {
+    "User-Agent": USER_AGENT,
+    "Referer": "https://novelpia.com/", # Referer to mimic browser navigation
+    "Accept-Encoding": ACCEPT_ENCODING,
+}
+PAGE_LIMIT_PER_HOST = 32 # Connections to the page host (the adaptive controller keeps requests below this)
+COVER_LIMIT_PER_HOST = 16 # Connections to the image host, in a pool of their own so covers never starve pages
+DNS_CACHE_TTL = 300 # Seconds a resolved address is reused
+KEEPALIVE_TIMEOUT = 30.0 # Seconds an idle connection is kept open for reuse
+PAGE_TIMEOUT = aiohttp and aiohttp.ClientTimeout(total=30, sock_connect=5, sock_read=10)
+COVER_TIMEOUT = aiohttp and aiohttp.ClientTimeout(total=None, sock_connect=5, sock_read=20) # No total: large covers may queue for a connection and stream for a while
+REQUESTS_TIMEOUT = (5, 20) # (connect, read) seconds for the synchronous requests session
+REQUESTS_POOL_SIZE = 8
+
+class ConnectionReuseStats(object):
+    """Counts requests, new vs. reused connections and DNS cache hits through aiohttp's tracing hooks."""
+    def __init__(self):
+        self.counts = {"requests": 0, "new_connections": 0, "reused_connections": 0, "dns_cache_hits": 0, "dns_cache_misses": 0}
+
+    def trace_config(self):
+        trace_config = aiohttp.TraceConfig()
+        for signal, counter in (
+            (trace_config.on_request_start, "requests"),
+            (trace_config.on_connection_create_end, "new_connections"),
+            (trace_config.on_connection_reuseconn, "reused_connections"),
+            (trace_config.on_dns_cache_hit, "dns_cache_hits"),
+            (trace_config.on_dns_cache_miss, "dns_cache_misses"),
+        ):
+            signal.append(self._counter(counter))
+        return trace_config
+
+    def _counter(self, counter):
+        async def _increment(session, context, params):
+            self.counts[counter] += 1
+        return _increment
+
+    def reuse_ratio(self):
+        connections = self.counts["new_connections"] + self.counts["reused_connections"]
+        return round(self.counts["reused_connections"] / connections, 4) if connections else None
+
+    def summary(self):
+        return dict(self.counts, reuse_ratio=self.reuse_ratio())
+
+def create_session(limit_per_host, timeout, reuse_stats=None, headers=None):
+    """An aiohttp session on its own tuned connector (per-host limit, DNS cache, keep-alive)."""
+    connector = aiohttp.TCPConnector(
+        limit=limit_per_host * 2, limit_per_host=limit_per_host,
+        ttl_dns_cache=DNS_CACHE_TTL, keepalive_timeout=KEEPALIVE_TIMEOUT,
+    )
+    return aiohttp.ClientSession(
+        connector=connector, timeout=timeout, headers=headers or DEFAULT_HEADERS, auto_decompress=True,
+        trace_configs=[reuse_stats.trace_config()] if reuse_stats else None,
+    )
+
+class HttpTransport(object):
+    """
+    The scraper's HTTP layer: one session for novel pages and one for cover images, each with its
+    own connection pool and timeout policy, plus connection-reuse counters for both.
+
+        async with HttpTransport() as transport:
+            await fetch_page(transport.pages, ...)
+            ctx = ScrapeContext(state_store, controller, transport.pages, transport.covers, ...)
+    """
+    def __init__(self, page_limit=PAGE_LIMIT_PER_HOST, cover_limit=COVER_LIMIT_PER_HOST, headers=None):
+        self.page_limit = page_limit
+        self.cover_limit = cover_limit
+        self.headers = headers
+        self.page_stats = ConnectionReuseStats()
+        self.cover_stats = ConnectionReuseStats()
+        self.pages = None
+        self.covers = None
+
+    async def __aenter__(self):
+        self.pages = create_session(self.page_limit, PAGE_TIMEOUT, self.page_stats, self.headers)
+        self.covers = create_session(self.cover_limit, COVER_TIMEOUT, self.cover_stats, self.headers)
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.pages.close()
+        await self.covers.close()
+
+    def stats(self):
+        return {"pages": self.page_stats.summary(), "covers": self.cover_stats.summary()}
+
+# --- Synchronous (requests) transport ---
+def create_requests_session(pool_size=REQUESTS_POOL_SIZE, headers=None):
+    """A requests.Session with the same headers and pooled keep-alive connections.
+    Pass REQUESTS_TIMEOUT as `timeout=` on every call (requests has no session-wide timeout).
+    """
+    session = requests.Session()
+    session.headers.update(headers or DEFAULT_HEADERS)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def requests_session_stats(session):
+    """Connection-reuse counters for a session from create_requests_session(), read off urllib3's pools."""
+    requests_made = new_connections = 0
+    for adapter in {id(adapter): adapter for adapter in session.adapters.values()}.values():
+        for key in adapter.poolmanager.pools.keys():
+            pool = adapter.poolmanager.pools[key]
+            requests_made += pool.num_requests
+            new_connections += pool.num_connections
+    reused = max(0, requests_made - new_connections)
+    return {
+        "requests": requests_made,
+        "new_connections": new_connections,
+        "reused_connections": reused,
+        "reuse_ratio": round(reused / requests_made, 4) if requests_made else None,
+    }
@@ -0,0 +1,150 @@
+"""
+Correctness check and micro-benchmark for the HTML parser backends, against the golden corpus
+in benchmarks/golden/<version>/ (saved pages + the expected parse_novel_page() output for each).
+
+    python benchmarks/bench_parser.py                 # check every backend, then benchmark them
+    python benchmarks/bench_parser.py --check-only
+    python benchmarks/bench_parser.py --regenerate    # rewrite expected/*.json with the reference backend
+
+Exits 1 if any backend disagrees with the expected output. Allocation figures come from
+tracemalloc, so they cover Python-level allocations only (not lxml's/lexbor's own C heaps).
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR)) # The scraper modules live one level up
+
+from NovelpiaParser import parse_novel_page, available_backends
+
+GOLDEN_DIR = os.path.join(BENCHMARK_DIR, "golden")
+DEFAULT_REPEAT = 50 # Parses per page per backend when timing
+
+def _latest_version():
+    versions = [name for name in os.listdir(GOLDEN_DIR) if name.startswith("v") and name[1:].isdigit()]
+    return max(versions, key=lambda name: int(name[1:]))
+
+def load_corpus(version):
+    """Returns (manifest, [(entry, html_content, expected)]) for a corpus version."""
+    corpus_dir = os.path.join(GOLDEN_DIR, version)
+    with open(os.path.join(corpus_dir, "manifest.json"), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    pages = []
+    for entry in manifest["pages"]:
+        with open(os.path.join(corpus_dir, "pages", f"{entry['name']}.html"), 'r', encoding='utf-8') as f:
+            html_content = f.read()
+        expected_path = os.path.join(corpus_dir, "expected", f"{entry['name']}.json")
+        expected = None
+        if os.path.exists(expected_path):
+            with open(expected_path, 'r', encoding='utf-8') as f:
+                expected = json.load(f)
+        pages.append((entry, html_content, expected))
+    return manifest, pages
+
+def check_backend(backend, pages):
+    """Returns a list of mismatch descriptions (empty if the backend matches every expected output)."""
+    mismatches = []
+    for entry, html_content, expected in pages:
+        page_status, novel_data = parse_novel_page(html_content, entry["novel_id"], backend)
+        if page_status != expected["page_status"]:
+            mismatches.append(f"{entry['name']}: page_status {page_status!r}, expected {expected['page_status']!r}")
+            continue
+        expected_data = expected["novel_data"] or {}
+        for field in sorted(set(expected_data) | set(novel_data or {})):
+            actual_value = (novel_data or {}).get(field)
+            if actual_value != expected_data.get(field):
+                mismatches.append(f"{entry['name']}: {field} = {actual_value!r}, expected {expected_data.get(field)!r}")
+    return mismatches
+
+def bench_backend(backend, pages, repeat):
+    """Times `repeat` parses of every page and measures one parse's Python allocations.
+    Returns a dict with per-page averages and the slowest page.
+    """
+    per_page = []
+    for entry, html_content, _ in pages:
+        parse_novel_page(html_content, entry["novel_id"], backend) # Warm-up
+        best = float("inf")
+        for _ in range(3): # Best of three rounds to damp scheduler noise
+            start = time.perf_counter()
+            for _ in range(repeat):
+                parse_novel_page(html_content, entry["novel_id"], backend)
+            best = min(best, (time.perf_counter() - start) / repeat)
+
+        tracemalloc.start()
+        before_blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics("filename"))
+        tracemalloc.reset_peak()
+        parse_novel_page(html_content, entry["novel_id"], backend)
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        after_blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics("filename"))
+        tracemalloc.stop()
+        per_page.append({"name": entry["name"], "bytes": len(html_content.encode("utf-8")), "us": best * 1e6,
+                         "peak_kb": peak_bytes / 1024, "retained_blocks": after_blocks - before_blocks})
+
+    total_bytes = sum(row["bytes"] for row in per_page)
+    total_seconds = sum(row["us"] for row in per_page) / 1e6
+    slowest = max(per_page, key=lambda row: row["us"])
+    return {
+        "backend": backend,
+        "mean_us_per_page": round(sum(row["us"] for row in per_page) / len(per_page), 1),
+        "mb_per_sec": round(total_bytes / total_seconds / (1024 * 1024), 1),
+        "mean_peak_kb": round(sum(row["peak_kb"] for row in per_page) / len(per_page), 1),
+        "max_peak_kb": round(max(row["peak_kb"] for row in per_page), 1),
+        "slowest_page": f"{slowest['name']} ({slowest['us']:.0f}us)",
+        "pages": per_page,
+    }
+
+def regenerate_expected(version, pages, reference_backend):
+    corpus_dir = os.path.join(GOLDEN_DIR, version)
+    for entry, html_content, _ in pages:
+        page_status, novel_data = parse_novel_page(html_content, entry["novel_id"], reference_backend)
+        with open(os.path.join(corpus_dir, "expected", f"{entry['name']}.json"), 'w', encoding='utf-8') as f:
+            json.dump({"page_status": page_status, "novel_data": novel_data}, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+    print(f"Rewrote {len(pages)} expected outputs in {corpus_dir} with the {reference_backend} backend.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify and benchmark the parser backends on the golden corpus.")
+    parser.add_argument("--version", default=None, help="Corpus version directory (default: the newest)")
+    parser.add_argument("--backends", nargs="+", default=None, help="Backends to run (default: every installed one)")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--check-only", action="store_true")
+    parser.add_argument("--regenerate", action="store_true", help="Rewrite the expected outputs from the reference backend")
+    parser.add_argument("--json", help="Also write the benchmark results to this file")
+    args = parser.parse_args()
+
+    version = args.version or _latest_version()
+    manifest, pages = load_corpus(version)
+    backends = args.backends or available_backends()
+
+    if args.regenerate:
+        regenerate_expected(version, pages, manifest["reference_backend"])
+        return
+
+    print(f"Golden corpus {version}: {len(pages)} pages")
+    failed = False
+    for backend in backends:
+        mismatches = check_backend(backend, pages)
+        print(f"  {backend:<11} {'OK' if not mismatches else f'{len(mismatches)} MISMATCHES'}")
+        for mismatch in mismatches:
+            print(f"      {mismatch}")
+        failed = failed or bool(mismatches)
+    if args.check_only:
+        sys.exit(1 if failed else 0)
+
+    print(f"\n{'backend':<11} {'us/page':>9} {'MB/s':>7} {'peak KB':>8} {'max KB':>8}  slowest page")
+    results = []
+    for backend in backends:
+        row = bench_backend(backend, pages, args.repeat)
+        results.append(row)
+        print(f"{backend:<11} {row['mean_us_per_page']:>9} {row['mb_per_sec']:>7} {row['mean_peak_kb']:>8} {row['max_peak_kb']:>8}  {row['slowest_page']}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"version": version, "results": results}, f, indent=2)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
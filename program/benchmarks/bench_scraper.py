@@ -0,0 +1,218 @@
+"""
+End-to-end throughput benchmark for the scraper against the local fixture server.
+For every concurrency level it reports pages/sec, covers/sec, CPU per page (event loop + parser
+processes), peak RSS and fetch/novel tail latencies. Each level runs in a fresh process so RSS and
+CPU figures don't bleed into each other.
+
+    python benchmarks/bench_scraper.py --ids 2000 --levels 4 16 32 adaptive --covers
+    python benchmarks/bench_scraper.py --save baseline.json
+    python benchmarks/bench_scraper.py --baseline baseline.json   # exits 1 on a regression
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+try:
+    import resource # Unix only; CPU/RSS of the parser processes are reported as None elsewhere
+except ImportError:
+    resource = None
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR)) # The scraper modules live one level up
+
+DEFAULT_LEVELS = ("4", "16", "32", "adaptive")
+DEFAULT_ID_COUNT = 2000
+DEFAULT_TOLERANCE = 0.15 # Allowed relative slowdown before --baseline reports a regression
+SERVER_STARTUP_TIMEOUT = 15.0
+
+def _percentile(values, percent):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(percent / 100.0 * (len(ordered) - 1))))]
+
+def _max_rss_mb(who):
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(who).ru_maxrss
+    return max_rss / 1024 / (1024 if sys.platform == "darwin" else 1) # bytes on macOS, KB on Linux
+
+# --- One Level (runs in its own process) ---
+async def _run_level(base_url, id_count, level, download_covers):
+    import NovelpiaScraper as scraper
+    from NovelpiaParser import select_backend
+    from NovelpiaState import CrawlStateStore, STATE_DB_FILE
+    from concurrent.futures import ThreadPoolExecutor
+
+    scraper.NOVELPIA_BASE_URL = base_url
+    if level == "adaptive":
+        controller = scraper.AdaptiveConcurrencyController()
+    else:
+        controller = scraper.AdaptiveConcurrencyController(int(level), int(level), int(level)) # Pinned window
+    parse_pool = scraper.BatchedParsePool(scraper.PARSER_PROCESS_COUNT, select_backend(scraper.PARSER_BACKEND))
+    state_store = CrawlStateStore(STATE_DB_FILE)
+    cover_executor = ThreadPoolExecutor(max_workers=scraper.COVER_PROCESSING_WORKERS) if download_covers else None
+    if download_covers:
+        os.makedirs(scraper.DOWNLOAD_COVERS_FOLDER, exist_ok=True)
+
+    fetch_latencies = []
+    novel_latencies = []
+    counts = {"pages": 0, "found": 0, "covers": 0, "network_errors": 0}
+    original_release = controller.release
+
+    async def _recording_release(outcome, latency):
+        # The controller sees the request latency alone, without the wait for a free slot
+        fetch_latencies.append(latency)
+        await original_release(outcome, latency)
+    controller.release = _recording_release
+
+    with open(scraper.OUTPUT_FILE_METADATA, 'w', encoding='utf-8') as f_output:
+        async def _handle_novel(novel_id_str):
+            novel_start = time.perf_counter()
+            status, cover_downloaded, data_written = await scraper.process_novel(
+                ctx, novel_id_str, f_output, True, False, download_covers, scraper.OUTPUT_FILE_METADATA
+            )
+            novel_latencies.append(time.perf_counter() - novel_start)
+            counts["pages"] += 1
+            counts["found"] += int(data_written)
+            counts["covers"] += int(cover_downloaded)
+            counts["network_errors"] += int(status == "network_error")
+            return True
+
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        async with scraper.HttpTransport() as transport:
+            ctx = scraper.ScrapeContext(
+                state_store, controller, transport.pages, transport.covers, parse_pool, cover_executor,
+                max_storage_bytes=float("inf")
+            )
+            await scraper.run_id_pipeline((f"{i:06d}" for i in range(1, id_count + 1)), _handle_novel)
+        wall = time.perf_counter() - wall_start
+        cpu_self = time.process_time() - cpu_start
+
+    parse_pool.shutdown() # Parser processes must exit before their CPU time shows up in RUSAGE_CHILDREN
+    if cover_executor:
+        cover_executor.shutdown(wait=True)
+    state_store.close()
+    cpu_children = 0.0
+    if resource:
+        children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu_children = children_usage.ru_utime + children_usage.ru_stime
+
+    def _ms(value):
+        return round(value * 1000, 2) if value is not None else None
+
+    return {
+        "level": level,
+        "pages": counts["pages"],
+        "found": counts["found"],
+        "network_errors": counts["network_errors"],
+        "wall_seconds": round(wall, 3),
+        "pages_per_sec": round(counts["pages"] / wall, 1),
+        "covers_per_sec": round(counts["covers"] / wall, 1),
+        "cpu_ms_per_page": _ms((cpu_self + cpu_children) / max(1, counts["pages"])),
+        "loop_cpu_ms_per_page": _ms(cpu_self / max(1, counts["pages"])),
+        "peak_rss_mb": _max_rss_mb(resource.RUSAGE_SELF) if resource else None,
+        "parser_peak_rss_mb": _max_rss_mb(resource.RUSAGE_CHILDREN) if resource else None,
+        "fetch_p50_ms": _ms(_percentile(fetch_latencies, 50)),
+        "fetch_p95_ms": _ms(_percentile(fetch_latencies, 95)),
+        "fetch_p99_ms": _ms(_percentile(fetch_latencies, 99)),
+        "novel_p99_ms": _ms(_percentile(novel_latencies, 99)),
+        "final_concurrency": int(controller.limit),
+        "page_connection_reuse": transport.page_stats.reuse_ratio(),
+    }
+
+# --- Driver ---
+def _start_fixture_server(port, server_args):
+    command = [sys.executable, os.path.join(BENCHMARK_DIR, "fixture_server.py"), "--port", str(port), *server_args]
+    server = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    deadline = time.time() + SERVER_STARTUP_TIMEOUT
+    while time.time() < deadline:
+        line = server.stdout.readline()
+        if "listening on" in line:
+            return server, line.rsplit(" ", 1)[1].strip()
+    server.kill()
+    raise RuntimeError("Fixture server did not start")
+
+def _run_level_in_subprocess(base_url, id_count, level, download_covers):
+    with tempfile.TemporaryDirectory(prefix="novelpia_bench_") as work_dir:
+        command = [sys.executable, os.path.abspath(__file__), "--single-level", level, "--base-url", base_url, "--ids", str(id_count)]
+        if download_covers:
+            command.append("--covers")
+        output = subprocess.run(command, cwd=work_dir, capture_output=True, text=True)
+        if output.returncode != 0:
+            print(output.stderr, file=sys.stderr)
+            raise RuntimeError(f"Benchmark level {level} failed")
+        return json.loads(output.stdout.strip().splitlines()[-1])
+
+def _find_regressions(results, baseline, tolerance):
+    """Compares against a saved run. Returns a list of human-readable regressions."""
+    baseline_by_level = {row["level"]: row for row in baseline}
+    regressions = []
+    for row in results:
+        old = baseline_by_level.get(row["level"])
+        if not old:
+            continue
+        if row["pages_per_sec"] < old["pages_per_sec"] * (1 - tolerance):
+            regressions.append(f"level {row['level']}: pages/sec {old['pages_per_sec']} -> {row['pages_per_sec']}")
+        if old["cpu_ms_per_page"] and row["cpu_ms_per_page"] > old["cpu_ms_per_page"] * (1 + tolerance):
+            regressions.append(f"level {row['level']}: CPU/page {old['cpu_ms_per_page']}ms -> {row['cpu_ms_per_page']}ms")
+        if old["fetch_p99_ms"] and row["fetch_p99_ms"] > old["fetch_p99_ms"] * (1 + tolerance):
+            regressions.append(f"level {row['level']}: fetch p99 {old['fetch_p99_ms']}ms -> {row['fetch_p99_ms']}ms")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the scraper end to end against the local fixture server.")
+    parser.add_argument("--ids", type=int, default=DEFAULT_ID_COUNT, help="Novel IDs crawled per level")
+    parser.add_argument("--levels", nargs="+", default=list(DEFAULT_LEVELS), help="Concurrency levels (numbers or 'adaptive')")
+    parser.add_argument("--covers", action="store_true", help="Also download covers")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--server-args", default="", help="Extra fixture_server.py arguments, e.g. \"--latency 0.05 --burst-every 500 --burst-length 20\"")
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against a JSON file written by --save; exit 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--single-level", help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single_level: # Child process: run one level, print one JSON line
+        print(json.dumps(asyncio.run(_run_level(args.base_url, args.ids, args.single_level, args.covers))))
+        return
+
+    server, base_url = _start_fixture_server(args.port, args.server_args.split())
+    results = []
+    try:
+        print(f"Benchmarking {args.ids} IDs per level against {base_url} (covers: {'on' if args.covers else 'off'})")
+        header = f"{'level':>9} {'pages/s':>9} {'covers/s':>9} {'cpu ms/pg':>10} {'rss MB':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}"
+        print(header)
+        for level in args.levels:
+            row = _run_level_in_subprocess(base_url, args.ids, level, args.covers)
+            results.append(row)
+            print(f"{row['level']:>9} {row['pages_per_sec']:>9} {row['covers_per_sec']:>9} {row['cpu_ms_per_page']!s:>10} "
+                  f"{row['peak_rss_mb'] and round(row['peak_rss_mb'], 1)!s:>8} {row['fetch_p50_ms']!s:>8} "
+                  f"{row['fetch_p95_ms']!s:>8} {row['fetch_p99_ms']!s:>8} {row['network_errors']:>7}")
+    finally:
+        server.terminate()
+        server.wait()
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to {args.save}")
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = _find_regressions(results, json.load(f), args.tolerance)
+        if regressions:
+            print("Regressions against baseline:", file=sys.stderr)
+            for regression in regressions:
+                print(f"  {regression}", file=sys.stderr)
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%}).")
+
+if __name__ == "__main__":
+    main()
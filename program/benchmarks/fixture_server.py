@@ -0,0 +1,243 @@
+"""
+Local stand-in for novelpia.com, for measuring the scraper without touching the real site.
+Serves synthetic /novel/{id} pages in the site's markup (including the deleted and wrong-access
+modal variants) and covers in several image formats, with configurable latency, error rate,
+429 bursts and a per-response bandwidth cap. Live pages carry an ETag and answer conditional requests.
+
+    python benchmarks/fixture_server.py --port 8765 --latency 0.05 --error-rate 0.01
+
+Then set NOVELPIA_BASE_URL = "http://127.0.0.1:8765" in NovelpiaScraper.py (bench_scraper.py does this for you).
+"""
+import io
+import sys
+import json
+import random
+import asyncio
+import argparse
+
+from aiohttp import web
+from PIL import Image
+
+# --- Fixture Defaults ---
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DELETED_EVERY = 3 # Every Nth ID is a deleted novel
+WRONG_ACCESS_EVERY = 7 # Every Nth ID (that isn't deleted) answers with the wrong-access modal
+NO_TITLE_EVERY = 53 # Every Nth ID loads but has no title (PAGE_NO_DATA)
+ADULT_EVERY = 5
+COMPLETE_EVERY = 4
+PAGE_PADDING_BYTES = 60 * 1024 # Real pages carry ~60 KB of scripts/navigation around the metadata
+COVER_SIZE = (360, 500)
+COVER_FORMATS = ("jpeg", "png", "png-rgba", "webp", "gif") # Cycled by novel ID
+BANDWIDTH_CHUNK_SIZE = 16 * 1024
+DEFAULT_MAX_ID = 1800 # Highest existing ID: a default 2000-ID benchmark crawls past the end, like a crawl up to frontier + margin
+
+_PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="ko">
+<head>
+<meta charset="utf-8">
+<meta name="twitter:title" content="노벨피아 - 웹소설로 꿈꾸는 세상! - {title}">
+<meta name="twitter:description" content="{synopsis}">
+<meta property="og:image" content="{cover_url}">
+<meta property="og:image:type" content="{cover_mime}">
+<script>{padding}</script>
+</head>
+<body>
+<!-- <div id="alert_modal" class="modal fade"><p>주석 처리된 모달</p></div> -->
+<div class="ep-info-line">
+  <p class="in-badge">{badges}</p>
+  <a class="writer-name" href="/user/{novel_id}">{author}</a>
+  <p class="writer-tag">{tags}<span class="tag add-tag">+나만의태그 추가</span></p>
+  <div class="info-count2"><p><i class="icon-like"></i> 선호 {likes:,}</p><p>회차 {chapters:,}</p><p>조회 {views:,}</p></div>
+</div>
+</body>
+</html>
+"""
+
+_MODAL_TEMPLATE = """<!DOCTYPE html>
+<html lang="ko"><head><meta charset="utf-8"><script>{padding}</script></head>
+<body>
+<div id="alert_modal" class="modal fade" tabindex="-1"><div class="modal-dialog"><div class="modal-body">
+<p>{message}</p></div></div></div>
+</body></html>
+"""
+
+def _padding(size):
+    line = "var nav_item = {id: 0, href: '/plus', label: '플러스'};\n"
+    return line * max(1, size // len(line))
+
+def _render_cover(cover_format):
+    img = Image.new('RGBA' if cover_format in ("png-rgba", "webp") else 'RGB', COVER_SIZE, (40, 90, 160, 200))
+    for y in range(0, COVER_SIZE[1], 20): # Some structure so encoders do real work
+        img.paste((200, 60 + y % 150, 30, 255), (0, y, COVER_SIZE[0], y + 6))
+    buffer = io.BytesIO()
+    if cover_format == "gif":
+        img.convert('P').save(buffer, "GIF")
+    else:
+        img.save(buffer, cover_format.split("-")[0].upper())
+    return buffer.getvalue()
+
+class FixtureServer(object):
+    """aiohttp application serving the synthetic site. `stats` counts what was served."""
+    def __init__(self, latency=0.0, latency_jitter=0.0, error_rate=0.0, burst_every=0, burst_length=0,
+                 bandwidth=0, page_padding=PAGE_PADDING_BYTES, seed=0, max_id=DEFAULT_MAX_ID):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.burst_every = burst_every # Every N requests, a burst of...
+        self.burst_length = burst_length # ...this many 429 responses
+        self.bandwidth = bandwidth # Bytes/sec per response; 0 = unlimited
+        self.page_padding = _padding(page_padding)
+        self.max_id = max_id # IDs above this were never handed out (answered like the site does, with the wrong-access modal); None = unlimited
+        self.random = random.Random(seed)
+        self.revisions = {} # novel_id -> times edited; an edited novel has a new like count and ETag
+        self.base_url = None
+        self.covers = {cover_format: _render_cover(cover_format) for cover_format in COVER_FORMATS}
+        self.stats = {"pages": 0, "deleted": 0, "wrong_access": 0, "covers": 0, "errors": 0, "throttled": 0, "bytes": 0, "not_modified": 0}
+        self._request_count = 0
+        self._runner = None
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get("/novel/{novel_id}", self.handle_novel)
+        app.router.add_get("/imagebox/cover/{name}", self.handle_cover)
+        app.router.add_get("/_stats", self.handle_stats)
+        return app
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        self.base_url = f"http://{host}:{port}"
+        return self.base_url
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    # --- Fault injection ---
+    async def _misbehave(self):
+        """Applies latency and returns an error response if this request should fail, else None."""
+        self._request_count += 1
+        if self.latency or self.latency_jitter:
+            await asyncio.sleep(self.latency + self.random.random() * self.latency_jitter)
+        if self.burst_every and self._request_count % self.burst_every < self.burst_length:
+            self.stats["throttled"] += 1
+            return web.Response(status=429, headers={"Retry-After": "1"}, text="Too Many Requests")
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.stats["errors"] += 1
+            return web.Response(status=self.random.choice((500, 502, 503)), text="Server Error")
+        return None
+
+    async def _send(self, request, body, content_type, headers=None):
+        self.stats["bytes"] += len(body)
+        if not self.bandwidth:
+            return web.Response(body=body, content_type=content_type, headers=headers)
+        response = web.StreamResponse(headers={"Content-Type": content_type, **(headers or {})})
+        response.content_length = len(body)
+        await response.prepare(request)
+        for offset in range(0, len(body), BANDWIDTH_CHUNK_SIZE):
+            chunk = body[offset:offset + BANDWIDTH_CHUNK_SIZE]
+            await response.write(chunk)
+            await asyncio.sleep(len(chunk) / self.bandwidth)
+        await response.write_eof()
+        return response
+
+    # --- Handlers ---
+    def render_page(self, novel_id):
+        """Returns the HTML for a novel ID; also used to build fixtures outside the server."""
+        novel_id_str = f"{novel_id:06d}"
+        if self.max_id is not None and novel_id > self.max_id:
+            return "wrong_access", _MODAL_TEMPLATE.format(padding=self.page_padding, message="잘못된 접근입니다.")
+        if novel_id % DELETED_EVERY == 0:
+            return "deleted", _MODAL_TEMPLATE.format(padding=self.page_padding, message="삭제된 소설 입니다.")
+        if novel_id % WRONG_ACCESS_EVERY == 0:
+            return "wrong_access", _MODAL_TEMPLATE.format(padding=self.page_padding, message="잘못된 접근입니다.")
+        cover_format = COVER_FORMATS[novel_id % len(COVER_FORMATS)]
+        extension = {"jpeg": "jpg", "png-rgba": "png"}.get(cover_format, cover_format)
+        badges = []
+        if novel_id % ADULT_EVERY == 0:
+            badges.append('<span class="b_19 s_inv">19</span>')
+        if novel_id % COMPLETE_EVERY == 0:
+            badges.append('<span class="b_comp s_inv">완결</span>')
+        page = _PAGE_TEMPLATE.format(
+            title="" if novel_id % NO_TITLE_EVERY == 0 else f"합성 소설 {novel_id_str} &amp; 모험",
+            synopsis=f"테스트용 줄거리 {novel_id_str}. " * 8,
+            cover_url=f"{self.base_url or ''}/imagebox/cover/{novel_id_str}.{extension}",
+            cover_mime=f"image/{cover_format.split('-')[0]}",
+            padding=self.page_padding,
+            badges="".join(badges),
+            novel_id=novel_id_str,
+            author=f"작가{novel_id % 97}",
+            tags="".join(f'<span class="tag">#태그{(novel_id + n) % 40}</span>' for n in range(novel_id % 6)),
+            likes=(novel_id * 37 + self.revisions.get(novel_id, 0)) % 100000,
+            chapters=novel_id % 400,
+            views=novel_id * 131 % 10000000,
+        )
+        return "page", page
+
+    async def handle_novel(self, request):
+        error_response = await self._misbehave()
+        if error_response:
+            return error_response
+        try:
+            novel_id = int(request.match_info["novel_id"])
+        except ValueError:
+            return web.Response(status=404)
+        kind, page = self.render_page(novel_id)
+        headers = None
+        if kind == "page": # Live pages carry an ETag and answer a matching If-None-Match with 304
+            etag = f'"{novel_id}-{self.revisions.get(novel_id, 0)}"'
+            if request.headers.get("If-None-Match") == etag:
+                self.stats["not_modified"] += 1
+                return web.Response(status=304, headers={"ETag": etag})
+            headers = {"ETag": etag}
+        self.stats["pages" if kind == "page" else kind] += 1
+        return await self._send(request, page.encode("utf-8"), "text/html", headers)
+
+    async def handle_cover(self, request):
+        error_response = await self._misbehave()
+        if error_response:
+            return error_response
+        try:
+            novel_id = int(request.match_info["name"].split(".")[0])
+        except ValueError:
+            return web.Response(status=404)
+        cover_format = COVER_FORMATS[novel_id % len(COVER_FORMATS)]
+        self.stats["covers"] += 1
+        return await self._send(request, self.covers[cover_format], f"image/{cover_format.split('-')[0]}")
+
+    async def handle_stats(self, request):
+        return web.json_response(self.stats)
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a synthetic novelpia.com for benchmarks.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--latency-jitter", type=float, default=0.0, help="Up to this many extra seconds, uniformly random")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with a 5xx")
+    parser.add_argument("--burst-every", type=int, default=0, help="Start a burst of 429s every N requests")
+    parser.add_argument("--burst-length", type=int, default=0, help="Requests per 429 burst")
+    parser.add_argument("--bandwidth", type=float, default=0, help="Bytes/sec per response (0 = unlimited)")
+    parser.add_argument("--page-padding", type=int, default=PAGE_PADDING_BYTES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-id", type=int, default=DEFAULT_MAX_ID, help="Highest existing novel ID; 0 for unlimited (default: %(default)s)")
+    return parser.parse_args(argv)
+
+async def _serve(args):
+    server = FixtureServer(args.latency, args.latency_jitter, args.error_rate, args.burst_every,
+                           args.burst_length, args.bandwidth, args.page_padding, args.seed, args.max_id or None)
+    base_url = await server.start(args.host, args.port)
+    print(f"Fixture server listening on {base_url}", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        print(f"Served: {json.dumps(server.stats)}", file=sys.stderr)
+        await server.stop()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(_serve(_parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,16 @@
+import os
+import sys
+import socket
+
+import pytest
+
+PROGRAM_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROGRAM_DIR) # The scraper modules import each other by name, like when run from program/
+sys.path.insert(0, os.path.join(PROGRAM_DIR, "benchmarks")) # FixtureServer
+
+@pytest.fixture
+def free_port():
+    """A local TCP port nothing listens on (for a FixtureServer)."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
@@ -0,0 +1,59 @@
+import os
+import json
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import NovelpiaScraper
+from fixture_server import FixtureServer
+from NovelpiaParser import parse_novel_page
+from NovelpiaScraper import backfill_covers, OUTPUT_FILE_METADATA, DOWNLOAD_COVERS_FOLDER
+from NovelpiaCovers import COVER_EVICTED_STATE
+
+def test_backfill_fetches_only_missing_covers(tmp_path, monkeypatch, free_port):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(NovelpiaScraper, "RATE_LIMIT_ENABLED", False)
+    os.makedirs(DOWNLOAD_COVERS_FOLDER)
+    server = FixtureServer(page_padding=0)
+    server.base_url = f"http://127.0.0.1:{free_port}" # What start() will set; the cover URLs point there
+    with open("kept.png", 'wb') as f_cover:
+        f_cover.write(b"\x89PNG kept")
+    cover_states = {
+        1: None, 2: "SKIPPED_LIMIT", 4: "DOWNLOAD_FAILED_TIMEOUT", # Never downloaded
+        5: "kept.png", # On disk
+        8: os.path.join(DOWNLOAD_COVERS_FOLDER, "000008.png"), # Gone
+        13: COVER_EVICTED_STATE,
+        10: None, # Adult
+        11: "SKIPPED_ADULT",
+        500: None, # Out of range
+    }
+    lines = []
+    for novel_id, cover_state in cover_states.items():
+        record = parse_novel_page(server.render_page(novel_id)[1], f"{novel_id:06d}")[1]
+        record["cover_local_path"] = cover_state
+        record["is_adult"] = novel_id == 10
+        lines.append(json.dumps(record, ensure_ascii=False) + '\n')
+    lines.insert(3, "not json\n")
+    with open(OUTPUT_FILE_METADATA, 'w', encoding='utf-8') as f_output:
+        f_output.writelines(lines)
+
+    async def _run():
+        await server.start(port=free_port)
+        try:
+            with ThreadPoolExecutor(max_workers=2) as cover_executor:
+                await backfill_covers(0, 100, [0], 1024 * 1024 * 1024, cover_executor)
+        finally:
+            await server.stop()
+    asyncio.run(_run())
+
+    assert server.stats["pages"] == 0 # Covers only
+    assert server.stats["covers"] == 5
+    with open(OUTPUT_FILE_METADATA, encoding='utf-8') as f_read:
+        rewritten = f_read.readlines()
+    assert rewritten[3] == "not json\n"
+    records = {record["id"]: record for record in map(json.loads, rewritten[:3] + rewritten[4:])}
+    for novel_id in ("000001", "000002", "000004", "000008", "000013"):
+        assert os.path.exists(records[novel_id]["cover_local_path"])
+        assert os.path.dirname(records[novel_id]["cover_local_path"]) == DOWNLOAD_COVERS_FOLDER
+    assert records["000010"]["cover_local_path"] == "SKIPPED_ADULT"
+    untouched = [0 + index for index, novel_id in enumerate(cover_states) if novel_id in (5, 11, 500)]
+    assert [rewritten[index + (index >= 3)] for index in untouched] == [lines[index + (index >= 3)] for index in untouched]
@@ -0,0 +1,47 @@
+import json
+import time
+import zlib
+
+from fixture_server import FixtureServer
+from NovelpiaCache import HtmlResponseCache, reparse_cache_to_jsonl
+from NovelpiaParser import PAGE_FOUND, PAGE_DELETED
+
+def _cache_pages(cache, pages):
+    for novel_id, html_content in pages.items():
+        cache.connection.execute(
+            "INSERT INTO html_cache (id, fetched_at, size, body) VALUES (?, ?, ?, ?)",
+            (novel_id, time.time(), len(html_content), html_content)
+        )
+    cache.connection.commit()
+
+def test_reparse_replaces_cached_records_and_keeps_the_rest(tmp_path):
+    server = FixtureServer(page_padding=0)
+    cache = HtmlResponseCache(str(tmp_path / "cache.sqlite3"))
+    _cache_pages(cache, {
+        1: zlib.compress(server.render_page(1)[1].encode('utf-8')),
+        2: zlib.compress(server.render_page(2)[1].encode('utf-8')),
+        3: zlib.compress(server.render_page(3)[1].encode('utf-8')), # Deleted since it was scraped
+        5: b"not a zlib stream", # Cannot be parsed: the old record must survive
+    })
+    output_file = str(tmp_path / "metadata.jsonl")
+    old_records = {novel_id_str: {"id": novel_id_str, "title": f"old {novel_id_str}"} for novel_id_str in ("000002", "000003", "000004", "000005")}
+    with open(output_file, 'w', encoding='utf-8') as f_out:
+        for record in old_records.values():
+            f_out.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    seen = {}
+    written, carried_over = reparse_cache_to_jsonl(
+        cache, output_file, cover_paths={1: "novelpia_covers/000001.png"}, process_count=2,
+        on_record=lambda novel_id_str, page_status, novel_data: seen.__setitem__(novel_id_str, page_status)
+    )
+    cache.close()
+
+    with open(output_file, 'r', encoding='utf-8') as f_in:
+        records = {record["id"]: record for record in map(json.loads, f_in)}
+    assert (written, carried_over) == (2, 2)
+    assert seen == {"000001": PAGE_FOUND, "000002": PAGE_FOUND, "000003": PAGE_DELETED}
+    assert set(records) == {"000001", "000002", "000004", "000005"}
+    assert records["000001"]["cover_local_path"] == "novelpia_covers/000001.png"
+    assert records["000002"]["title"] != "old 000002"
+    assert records["000004"] == old_records["000004"]
+    assert records["000005"] == old_records["000005"]
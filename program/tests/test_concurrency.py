@@ -0,0 +1,60 @@
+import asyncio
+
+from NovelpiaScraper import AdaptiveConcurrencyController, ADAPTIVE_BACKOFF_FACTOR, ADAPTIVE_LATENCY_BACKOFF_FACTOR
+
+async def _round(controller, outcome="ok", latency=0.01, requests=None):
+    """Fills the window (or `requests` slots), then releases them all with the same outcome."""
+    requests = requests or int(controller.limit)
+    for _ in range(requests):
+        await controller.acquire()
+    for _ in range(requests):
+        await controller.release(outcome, latency)
+
+def test_saturated_healthy_windows_grow_by_one_up_to_the_max():
+    async def _run():
+        controller = AdaptiveConcurrencyController(initial_limit=2, min_limit=1, max_limit=4, window_size=2)
+        limits = []
+        for _ in range(3):
+            await _round(controller)
+            limits.append(int(controller.limit))
+        return limits
+    assert asyncio.run(_run()) == [3, 4, 4]
+
+def test_unsaturated_window_holds():
+    async def _run():
+        controller = AdaptiveConcurrencyController(initial_limit=4, window_size=2)
+        await _round(controller, requests=1)
+        await _round(controller, requests=1)
+        return controller
+    controller = asyncio.run(_run())
+    assert controller.limit == 4
+    assert controller.decisions["hold"] == 1
+
+def test_throttling_backs_off_once_per_cooldown():
+    async def _run():
+        controller = AdaptiveConcurrencyController(initial_limit=8, window_size=100)
+        await _round(controller, "throttled", requests=1)
+        first = controller.limit
+        await _round(controller, "throttled", requests=1) # Same burst: inside the cooldown
+        return first, controller.limit
+    assert asyncio.run(_run()) == (8 * ADAPTIVE_BACKOFF_FACTOR, 8 * ADAPTIVE_BACKOFF_FACTOR)
+
+def test_low_success_rate_decreases_but_not_below_the_min():
+    async def _run():
+        controller = AdaptiveConcurrencyController(initial_limit=2, min_limit=2, max_limit=8, window_size=4)
+        await _round(controller, "error", requests=2)
+        await _round(controller, "ok", requests=2)
+        return controller
+    controller = asyncio.run(_run())
+    assert controller.decisions["decrease"] == 1
+    assert controller.limit == 2
+
+def test_latency_rise_backs_off_gently():
+    async def _run():
+        controller = AdaptiveConcurrencyController(initial_limit=4, max_limit=4, window_size=4)
+        await _round(controller, latency=0.01) # Healthy: sets the baseline
+        await _round(controller, latency=0.5)
+        return controller
+    controller = asyncio.run(_run())
+    assert controller.limit == 4 * ADAPTIVE_LATENCY_BACKOFF_FACTOR
+    assert controller.last_decision["decision"] == "decrease"
@@ -0,0 +1,135 @@
+import os
+import asyncio
+import json
+
+import NovelpiaScraper
+from fixture_server import FixtureServer
+from NovelpiaCoordinator import LeaseStore, crawl_shard, merge_shard_outputs, shard_output_path, shard_dead_path, REMOVED_COVERS_NAME
+from NovelpiaCovers import COVER_EVICTED_STATE
+from NovelpiaScraper import AdaptiveConcurrencyController, ScrapeContext, OUTPUT_FILE_METADATA
+from NovelpiaState import CrawlStateStore, STATE_DB_FILE, STATUS_DELETED
+from NovelpiaTransport import HttpTransport
+
+def test_leases_are_exclusive_until_they_expire(tmp_path):
+    leases = LeaseStore(str(tmp_path))
+    try:
+        assert leases.plan(0, 249, shard_size=100) == 3
+        assert leases.plan(0, 249, shard_size=100) == 0 # Planning again adds nothing
+        assert leases.claim("a") == (0, 99)
+        assert leases.claim("b", lease_seconds=-1) == (100, 199) # Expired as soon as it is taken
+        assert leases.renew(0, "a")
+        assert not leases.renew(0, "b") # Not b's lease
+
+        assert leases.claim("c") == (100, 199) # b's expired lease is handed on
+        assert not leases.renew(100, "b")
+        assert not leases.complete(100, "b", 100, 10)
+        assert leases.complete(100, "c", 100, 10)
+        assert leases.claim("d") == (200, 249)
+        assert leases.claim("e") is None
+        assert leases.status_counts() == {"pending": 0, "leased": 2, "expired": 0, "done": 1, "merged": 0}
+    finally:
+        leases.close()
+
+def _write_jsonl(path, records):
+    with open(path, 'w', encoding='utf-8') as f_output:
+        f_output.writelines(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+
+def _read_jsonl(path):
+    with open(path, encoding='utf-8') as f_read:
+        return [json.loads(line) for line in f_read]
+
+def test_merge_is_in_id_order_and_brings_dead_ids_across(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    coordinator_dir = str(tmp_path / "coordinator")
+    leases = LeaseStore(coordinator_dir)
+    leases.plan(0, 199, shard_size=100)
+    for start_id in (0, 100):
+        assert leases.claim("w") == (start_id, start_id + 99)
+        assert leases.complete(start_id, "w", 100, 2)
+    leases.close()
+
+    # An existing output, out of order; 150 has been deleted since and 5 edited
+    _write_jsonl(OUTPUT_FILE_METADATA, [{"id": "000150", "v": "old"}, {"id": "000005", "v": "old"}, {"id": "000020", "v": "old"}])
+    first_shard = shard_output_path(coordinator_dir, 0, 99)
+    _write_jsonl(first_shard, [{"id": "000042", "v": "new"}, {"id": "000005", "v": "new"}]) # Finished out of order
+    _write_jsonl(shard_dead_path(first_shard), [{"id": "000003", "status": "deleted"}])
+    second_shard = shard_output_path(coordinator_dir, 100, 199)
+    _write_jsonl(second_shard, [{"id": "000101", "v": "new"}])
+    _write_jsonl(shard_dead_path(second_shard), [{"id": "000150", "status": "deleted"}])
+
+    assert merge_shard_outputs(coordinator_dir) == (3, 1)
+    assert _read_jsonl(OUTPUT_FILE_METADATA) == [
+        {"id": "000005", "v": "new"}, {"id": "000020", "v": "old"}, {"id": "000042", "v": "new"}, {"id": "000101", "v": "new"}
+    ]
+    state_store = CrawlStateStore(STATE_DB_FILE)
+    try:
+        assert state_store.dead_ids(0, 199) == [(3, STATUS_DELETED), (150, STATUS_DELETED)]
+        assert state_store.count_in_output(OUTPUT_FILE_METADATA) == 4
+    finally:
+        state_store.close()
+
+    assert merge_shard_outputs(coordinator_dir) == (0, 4) # Merged shards are not applied again
+
+def _page_requests(server):
+    return server.stats["pages"] + server.stats["deleted"] + server.stats["wrong_access"]
+
+def test_shard_skips_done_ids_and_lists_dead_ones(tmp_path, monkeypatch, free_port):
+    monkeypatch.chdir(tmp_path)
+    server = FixtureServer(page_padding=0)
+    _write_jsonl(OUTPUT_FILE_METADATA, [{"id": "000002", "v": "main"}])
+    output_file = shard_output_path(str(tmp_path), 1, 10)
+    (tmp_path / "shards").mkdir()
+    state_store = CrawlStateStore(STATE_DB_FILE)
+    state_store.import_output_file(OUTPUT_FILE_METADATA, is_jsonl=True)
+    state_store.build_id_index(OUTPUT_FILE_METADATA, None, 100) # As run_worker does, once for every shard
+
+    async def _run():
+        monkeypatch.setattr(NovelpiaScraper, "NOVELPIA_BASE_URL", await server.start(port=free_port))
+        try:
+            async with HttpTransport() as transport:
+                ctx = ScrapeContext(state_store, AdaptiveConcurrencyController(), transport.pages)
+                first = await crawl_shard(ctx, 1, 10, output_file)
+                requests = _page_requests(server)
+                second = await crawl_shard(ctx, 1, 10, output_file) # Reclaimed by the same worker
+                return first, second, _page_requests(server) - requests
+        finally:
+            await server.stop()
+    try:
+        first, second, second_requests = asyncio.run(_run())
+    finally:
+        state_store.close()
+    # 2 is in the main output; 3, 6 and 9 are deleted and 7 forbidden
+    assert first == (9, 5)
+    assert second == (5, 5) and second_requests == 5 # Only the found IDs, since the rewrite drops them
+    assert sorted(record["id"] for record in _read_jsonl(output_file)) == ["000001", "000004", "000005", "000008", "000010"]
+    assert _read_jsonl(shard_dead_path(output_file)) == [
+        {"id": "000003", "status": "deleted"}, {"id": "000006", "status": "deleted"},
+        {"id": "000007", "status": "wrong-access"}, {"id": "000009", "status": "deleted"},
+    ]
+
+def test_merge_rewrites_the_paths_of_evicted_covers(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    coordinator_dir = str(tmp_path / "coordinator")
+    leases = LeaseStore(coordinator_dir)
+    leases.plan(0, 99, shard_size=100)
+    assert leases.claim("w") == (0, 99)
+    assert leases.complete(0, "w", 100, 1)
+    leases.close()
+
+    _write_jsonl(OUTPUT_FILE_METADATA, [{"id": "000001", "cover_local_path": "novelpia_covers/000001.png"}])
+    _write_jsonl(shard_output_path(coordinator_dir, 0, 99), [{"id": "000002", "cover_local_path": "novelpia_covers/000002.png"}])
+    # As workers leave them: one cover evicted from the main output, one from a shard not merged yet
+    _write_jsonl(os.path.join(coordinator_dir, REMOVED_COVERS_NAME), [
+        {"id": "000001", "cover_state": COVER_EVICTED_STATE}, {"id": "000002", "cover_state": COVER_EVICTED_STATE},
+    ])
+
+    assert merge_shard_outputs(coordinator_dir) == (1, 1)
+    assert _read_jsonl(OUTPUT_FILE_METADATA) == [
+        {"id": "000001", "cover_local_path": COVER_EVICTED_STATE}, {"id": "000002", "cover_local_path": COVER_EVICTED_STATE}
+    ]
+    state_store = CrawlStateStore(STATE_DB_FILE)
+    try:
+        assert state_store.cover_states() == {1: COVER_EVICTED_STATE, 2: COVER_EVICTED_STATE}
+    finally:
+        state_store.close()
+    assert not any(name.startswith(REMOVED_COVERS_NAME) for name in os.listdir(coordinator_dir)) # Applied once
@@ -0,0 +1,49 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+import NovelpiaScraper
+from fixture_server import FixtureServer
+from NovelpiaCovers import sniff_image_type
+from NovelpiaScraper import ScrapeContext, download_cover, cover_local_path_for
+
+def test_covers_are_finalized_in_the_executor_not_on_the_loop(tmp_path, free_port, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / NovelpiaScraper.DOWNLOAD_COVERS_FOLDER).mkdir()
+    finalize_threads = set()
+    real_finalize = NovelpiaScraper.finalize_cover
+    def _finalize(*args):
+        finalize_threads.add(threading.current_thread().name)
+        return real_finalize(*args)
+    monkeypatch.setattr(NovelpiaScraper, "finalize_cover", _finalize)
+    server = FixtureServer(page_padding=0)
+
+    async def _run():
+        base_url = await server.start(port=free_port)
+        cover_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cover")
+        try:
+            async with NovelpiaScraper.HttpTransport() as transport:
+                ctx = ScrapeContext(None, None, transport.pages, transport.covers, cover_executor=cover_executor,
+                                    max_storage_bytes=10 * 1024 * 1024)
+                urls = {f"{i:06d}": f"{base_url}/imagebox/cover/{i:06d}.{ext}" for i, ext in
+                        ((1, "png"), (2, "png"), (3, "webp"), (4, "gif"), (5, "jpg"))}
+                paths = await asyncio.gather(*(download_cover(ctx, url, cover_local_path_for(novel_id_str, url))
+                                               for novel_id_str, url in urls.items()))
+                return paths, ctx.size_ref[0]
+        finally:
+            cover_executor.shutdown()
+            await server.stop()
+    paths, stored_bytes = asyncio.run(_run())
+
+    assert finalize_threads and all(name.startswith("cover") for name in finalize_threads)
+    total = 0
+    for path in paths:
+        with open(path, 'rb') as f:
+            assert sniff_image_type(f.read(16))[1] == path[path.rindex('.'):] # Extension follows the bytes
+        with Image.open(path) as img:
+            img.verify()
+        total += (tmp_path / path).stat().st_size
+    assert stored_bytes == total
+    assert not list((tmp_path / NovelpiaScraper.DOWNLOAD_COVERS_FOLDER).glob("*.part*"))
@@ -0,0 +1,49 @@
+import io
+import os
+import time
+
+from PIL import Image
+
+from NovelpiaCovers import finalize_cover, covers_folder_size, remove_stale_partial_downloads
+
+def _image_bytes(image_format, size=(40, 60), mode="RGB"):
+    buffer = io.BytesIO()
+    Image.new(mode, size, (200, 30, 30, 128)[:len(mode)]).save(buffer, image_format)
+    return buffer.getvalue()
+
+def _download(tmp_path, payload):
+    temp_path = tmp_path / "000001.part"
+    temp_path.write_bytes(payload)
+    return str(temp_path)
+
+def test_jpeg_passes_through_byte_for_byte(tmp_path):
+    payload = _image_bytes("JPEG")
+    final_path, size = finalize_cover(_download(tmp_path, payload), str(tmp_path / "000001.png")) # URL said .png
+    assert final_path == str(tmp_path / "000001.jpg")
+    assert size == len(payload)
+    assert (tmp_path / "000001.jpg").read_bytes() == payload
+    assert not (tmp_path / "000001.part").exists()
+
+def test_alpha_and_bmp_are_reencoded_to_jpeg(tmp_path):
+    for image_format, mode in (("PNG", "RGBA"), ("BMP", "RGB")):
+        final_path, _ = finalize_cover(_download(tmp_path, _image_bytes(image_format, mode=mode)), str(tmp_path / "000001.x"))
+        assert final_path == str(tmp_path / "000001.jpg")
+        with Image.open(final_path) as img:
+            assert img.format == "JPEG"
+        os.remove(final_path)
+
+def test_non_images_and_undecodable_payloads_are_rejected(tmp_path):
+    for payload in (b"<html>Not found</html>", b"BM" + b"\x00" * 64, _image_bytes("BMP")[:40]):
+        assert finalize_cover(_download(tmp_path, payload), str(tmp_path / "000001.bmp")) == (None, 0)
+        assert os.listdir(tmp_path) == []
+
+def test_partial_downloads_are_not_counted_and_only_stale_ones_removed(tmp_path):
+    (tmp_path / "000001.jpg").write_bytes(b"x" * 100)
+    os.link(tmp_path / "000001.jpg", tmp_path / "000002.jpg") # A hard link is counted once
+    (tmp_path / "000003.part").write_bytes(b"x" * 1000)
+    (tmp_path / "000004.part.jpg").write_bytes(b"x" * 1000)
+    old = time.time() - 3600
+    os.utime(tmp_path / "000004.part.jpg", (old, old))
+    assert covers_folder_size(str(tmp_path)) == 100
+    assert remove_stale_partial_downloads(str(tmp_path), max_age=600) == 1
+    assert sorted(os.listdir(tmp_path)) == ["000001.jpg", "000002.jpg", "000003.part"]
@@ -0,0 +1,92 @@
+import os
+
+import NovelpiaCovers
+from NovelpiaCovers import CoverStore, COVER_PLACEHOLDER_STATE, COVER_EVICTED_STATE
+
+ART = b"\x89PNG\r\n\x1a\n" + b"artwork" * 100
+DEFAULT_ART = b"\x89PNG\r\n\x1a\n" + b"default" * 100
+
+def _save(folder, novel_id, data):
+    path = os.path.join(folder, f"{novel_id:06d}.png")
+    with open(path, 'wb') as f_cover:
+        f_cover.write(data)
+    return path
+
+def test_identical_covers_are_stored_once(tmp_path):
+    folder = str(tmp_path)
+    cover_store = CoverStore(folder, eviction_policy="none")
+    try:
+        first_path, first_bytes = cover_store.add(_save(folder, 1, ART), "https://images/1.png")
+        second_path, second_bytes = cover_store.add(_save(folder, 2, ART), "https://images/2.png")
+        third_path, third_bytes = cover_store.add(_save(folder, 3, DEFAULT_ART), "https://images/3.png")
+        assert (first_bytes, second_bytes, third_bytes) == (len(ART), 0, len(DEFAULT_ART))
+        assert os.path.samefile(first_path, second_path) # One blob, hard-linked under both IDs
+        assert cover_store.total_bytes() == len(ART) + len(DEFAULT_ART)
+        assert cover_store.stats()["deduplicated"] == 1
+    finally:
+        cover_store.close()
+
+def test_default_artwork_is_dropped_once_recognized(tmp_path, monkeypatch):
+    monkeypatch.setattr(NovelpiaCovers, "COVER_PLACEHOLDER_MIN_NOVELS", 3)
+    folder = str(tmp_path)
+    evicted = []
+    cover_store = CoverStore(folder, eviction_policy="none", on_evict=evicted.extend)
+    try:
+        kept_path, _ = cover_store.add(_save(folder, 1, ART), "https://images/1.png")
+        first_copies = [cover_store.add(_save(folder, novel_id, DEFAULT_ART), f"https://images/{novel_id}.png")[0] for novel_id in (2, 3)]
+        # The third copy reveals it: the earlier ones go as well
+        assert cover_store.add(_save(folder, 4, DEFAULT_ART), "https://images/4.png") == (COVER_PLACEHOLDER_STATE, -len(DEFAULT_ART))
+        assert evicted == ["000002", "000003"]
+        assert cover_store.pop_removed_covers() == {"000002": COVER_PLACEHOLDER_STATE, "000003": COVER_PLACEHOLDER_STATE}
+        assert not any(os.path.exists(path) for path in first_copies)
+        assert os.path.exists(kept_path)
+        assert cover_store.total_bytes() == len(ART)
+        assert cover_store.is_placeholder_url("https://images/2.png")
+
+        # Under a URL nobody used before, the same artwork is dropped on arrival
+        assert cover_store.add(_save(folder, 5, DEFAULT_ART), "https://images/5.png") == (COVER_PLACEHOLDER_STATE, 0)
+        assert not os.path.exists(os.path.join(folder, "000005.png"))
+        assert cover_store.total_bytes() == len(ART)
+    finally:
+        cover_store.close()
+
+    reopened = CoverStore(folder, eviction_policy="none")
+    try:
+        assert reopened.is_placeholder_url("https://images/5.png")
+    finally:
+        reopened.close()
+
+def test_legacy_covers_are_imported_on_request(tmp_path):
+    folder = str(tmp_path)
+    _save(folder, 10, ART)
+    _save(folder, 11, ART)
+    cover_store = CoverStore(folder, eviction_policy="none")
+    try:
+        assert cover_store.total_bytes() == 0 # Opening the store hashes nothing
+        assert cover_store.import_legacy_covers() == 2
+        assert cover_store.total_bytes() == len(ART)
+        assert os.path.samefile(os.path.join(folder, "000010.png"), os.path.join(folder, "000011.png"))
+        assert cover_store.import_legacy_covers() == 0 # Once only
+    finally:
+        cover_store.close()
+
+def test_evicted_covers_are_reported_until_stored_again(tmp_path):
+    folder = str(tmp_path)
+    evicted = []
+    cover_store = CoverStore(folder, eviction_policy="likes", on_evict=evicted.extend)
+    try:
+        low_path, _ = cover_store.add(_save(folder, 1, ART), "https://images/1.png", priority=1.0)
+        cover_store.add(_save(folder, 2, DEFAULT_ART), "https://images/2.png", priority=5.0)
+        assert not cover_store.can_evict(1.0)
+        assert cover_store.evict_for(1, priority=3.0) == len(ART)
+        assert evicted == ["000001"]
+        assert not os.path.exists(low_path)
+        assert cover_store.total_bytes() == len(DEFAULT_ART)
+        assert cover_store.pop_removed_covers() == {"000001": COVER_EVICTED_STATE}
+        assert cover_store.pop_removed_covers() == {} # Handed out once
+
+        cover_store.evict_for(1, priority=10.0)
+        cover_store.add(_save(folder, 2, DEFAULT_ART), "https://images/2.png", priority=5.0) # Backfilled again
+        assert cover_store.pop_removed_covers() == {}
+    finally:
+        cover_store.close()
@@ -0,0 +1,86 @@
+import os
+import json
+
+from PIL import Image
+
+from NovelpiaDerivatives import DerivativeManifest, generate_folder, DERIVATIVE_SIZES, DERIVATIVE_FORMATS, DERIVATIVE_MANIFEST_FILE
+
+def _save_cover(folder, novel_id, size=(600, 900)):
+    path = os.path.join(folder, f"{novel_id:06d}.jpg")
+    Image.new("RGB", size, (200, 30, 30)).save(path, "JPEG")
+    return path
+
+def _derivative_paths(entry):
+    return [output["path"] for outputs in entry["derivatives"].values() for output in outputs.values()]
+
+def test_derivatives_fit_their_boxes_and_are_made_once(tmp_path):
+    covers_folder = str(tmp_path / "covers")
+    os.makedirs(covers_folder)
+    source_path = _save_cover(covers_folder, 1)
+    manifest = DerivativeManifest(str(tmp_path / "derived"))
+    try:
+        entry = manifest.generate(source_path)
+        assert (entry["width"], entry["height"]) == (600, 900)
+        assert set(entry["derivatives"]) == set(DERIVATIVE_SIZES)
+        for size_name, (box_width, box_height) in DERIVATIVE_SIZES.items():
+            outputs = entry["derivatives"][size_name]
+            assert set(outputs) == set(DERIVATIVE_FORMATS)
+            for output in outputs.values():
+                assert (output["width"], output["height"]) == (box_width, box_height) # 2:3, like the source
+                assert os.path.getsize(output["path"]) == output["bytes"]
+        assert manifest.generate(source_path) is None # Current
+
+        os.utime(source_path, (1, 1)) # Replaced since
+        assert manifest.generate(source_path) is not None
+
+        broken_path = os.path.join(covers_folder, "000002.jpg")
+        with open(broken_path, 'wb') as f_cover:
+            f_cover.write(b"not an image")
+        assert manifest.generate(broken_path) is None # Reported, not raised
+        assert "000002" not in manifest.entries
+    finally:
+        manifest.close()
+
+def test_removals_are_kept_across_reloads(tmp_path):
+    covers_folder = str(tmp_path / "covers")
+    os.makedirs(covers_folder)
+    output_folder = str(tmp_path / "derived")
+    manifest = DerivativeManifest(output_folder)
+    try:
+        entries = [manifest.generate(_save_cover(covers_folder, novel_id)) for novel_id in (1, 2, 3)]
+        assert manifest.remove(["000001", "000009"]) == 1 # 9 never had derivatives
+        assert not any(os.path.exists(path) for path in _derivative_paths(entries[0]))
+    finally:
+        manifest.close()
+
+    manifest = DerivativeManifest(output_folder) # The removal line hides the entry written before it
+    try:
+        assert sorted(manifest.entries) == ["000002", "000003"]
+        assert manifest.prune({"000003"}) == 1
+        assert not any(os.path.exists(path) for path in _derivative_paths(entries[1]))
+        assert all(os.path.exists(path) for path in _derivative_paths(entries[2]))
+        manifest.compact()
+    finally:
+        manifest.close()
+
+    with open(os.path.join(output_folder, DERIVATIVE_MANIFEST_FILE), encoding='utf-8') as f_manifest:
+        assert [json.loads(line)["id"] for line in f_manifest] == ["000003"]
+    manifest = DerivativeManifest(output_folder)
+    try:
+        assert list(manifest.entries) == ["000003"]
+    finally:
+        manifest.close()
+
+def test_folder_run_skips_current_covers_and_prunes_gone_ones(tmp_path):
+    covers_folder = str(tmp_path / "covers")
+    os.makedirs(covers_folder)
+    output_folder = str(tmp_path / "derived")
+    for novel_id in (1, 2):
+        _save_cover(covers_folder, novel_id, size=(60, 90))
+    with open(os.path.join(covers_folder, "notes.txt"), 'w', encoding='utf-8') as f_notes:
+        f_notes.write("not a cover")
+
+    assert generate_folder(covers_folder, output_folder, workers=1) == {"covers": 2, "generated": 2, "up_to_date": 0, "failed": 0, "pruned": 0}
+    os.remove(os.path.join(covers_folder, "000002.jpg"))
+    assert generate_folder(covers_folder, output_folder, workers=1) == {"covers": 1, "generated": 0, "up_to_date": 1, "failed": 0, "pruned": 1}
+    assert not os.path.exists(os.path.join(output_folder, "thumb", "000002.jpg"))
@@ -0,0 +1,43 @@
+import asyncio
+
+import aiohttp
+
+from fixture_server import FixtureServer
+
+def _get_all(server, port, paths, headers=None):
+    async def _run():
+        base_url = await server.start(port=port)
+        try:
+            async with aiohttp.ClientSession() as session:
+                responses = []
+                for path in paths:
+                    async with session.get(base_url + path, headers=headers) as response:
+                        responses.append((response.status, response.headers.get("ETag"), await response.read()))
+                return responses
+        finally:
+            await server.stop()
+    return asyncio.run(_run())
+
+def test_pages_covers_and_conditional_requests(free_port):
+    server = FixtureServer(page_padding=0)
+    (status, etag, body), (cover_status, _, cover) = _get_all(server, free_port, ["/novel/000001", "/imagebox/cover/000001.png"])
+    assert (status, cover_status) == (200, 200)
+    assert "합성 소설 000001".encode("utf-8") in body
+    assert cover.startswith(b"\x89PNG")
+
+    server = FixtureServer(page_padding=0)
+    [(status, same_etag, body)] = _get_all(server, free_port, ["/novel/000001"], {"If-None-Match": etag})
+    assert (status, same_etag, body) == (304, etag, b"")
+    server.revisions[1] = 1 # Edited since: the old ETag no longer matches
+    [(status, new_etag, _)] = _get_all(server, free_port, ["/novel/000001"], {"If-None-Match": etag})
+    assert status == 200 and new_etag != etag
+
+def test_errors_and_throttling_are_injected(free_port):
+    server = FixtureServer(page_padding=0, burst_every=10, burst_length=3, seed=1)
+    statuses = [status for status, _, _ in _get_all(server, free_port, [f"/novel/{i:06d}" for i in range(1, 21)])]
+    assert statuses.count(429) == 6
+    assert server.stats["throttled"] == 6
+
+    server = FixtureServer(page_padding=0, error_rate=0.5, seed=1)
+    statuses = [status for status, _, _ in _get_all(server, free_port, [f"/novel/{i:06d}" for i in range(1, 101)])]
+    assert 25 < sum(status >= 500 for status in statuses) < 75
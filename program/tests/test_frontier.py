@@ -0,0 +1,49 @@
+import asyncio
+
+import NovelpiaScraper
+from fixture_server import FixtureServer, _MODAL_TEMPLATE
+from NovelpiaParser import select_backend
+from NovelpiaScraper import AdaptiveConcurrencyController, BatchedParsePool, discover_frontier
+
+class _ClusteredServer(FixtureServer):
+    """A catalog with a run of never-handed-out IDs well below its end."""
+    def __init__(self, dead_ids, **kwargs):
+        super().__init__(**kwargs)
+        self.dead_ids = dead_ids
+
+    def render_page(self, novel_id):
+        if novel_id in self.dead_ids:
+            return "wrong_access", _MODAL_TEMPLATE.format(padding=self.page_padding, message="잘못된 접근입니다.")
+        return super().render_page(novel_id)
+
+def _discover(monkeypatch, port, server, known_low=0, parse_pool=None):
+    async def _run():
+        monkeypatch.setattr(NovelpiaScraper, "NOVELPIA_BASE_URL", await server.start(port=port))
+        try:
+            return await discover_frontier(AdaptiveConcurrencyController(initial_limit=16), known_low, parse_pool=parse_pool)
+        finally:
+            await server.stop()
+    return asyncio.run(_run())
+
+def test_finds_the_end_of_the_catalog(monkeypatch, free_port):
+    server = FixtureServer(page_padding=0, max_id=4321)
+    assert _discover(monkeypatch, free_port, server) == 4321
+    assert server.stats["pages"] + server.stats["deleted"] + server.stats["wrong_access"] < 1000
+
+def test_a_cluster_of_dead_ids_is_not_the_end(monkeypatch, free_port):
+    server = _ClusteredServer(range(1000, 1200), page_padding=0, max_id=4321) # Covers the first probe window
+    assert _discover(monkeypatch, free_port, server) == 4321
+
+def test_starts_from_a_known_frontier(monkeypatch, free_port):
+    server = FixtureServer(page_padding=0, max_id=4321)
+    assert _discover(monkeypatch, free_port, server, known_low=4000) == 4321
+
+def test_probes_are_parsed_in_the_parse_pool(monkeypatch, free_port):
+    server = FixtureServer(page_padding=0, max_id=4321)
+    parse_pool = BatchedParsePool(2, select_backend())
+    try:
+        assert _discover(monkeypatch, free_port, server, parse_pool=parse_pool) == 4321
+    finally:
+        parse_pool.shutdown()
+    assert parse_pool.batches_submitted > 0
+    assert parse_pool.pages_parsed == server.stats["pages"] + server.stats["deleted"] + server.stats["wrong_access"]
@@ -0,0 +1,43 @@
+import random
+
+from NovelpiaState import (
+    IdStateIndex, CrawlStateStore, ID_UNKNOWN, ID_INDEXED, ID_DEAD, ID_FAILED,
+    STATUS_OK, STATUS_DELETED, STATUS_NETWORK_ERROR,
+)
+
+def test_iter_pending_matches_a_plain_scan():
+    rng = random.Random(7)
+    index = IdStateIndex(None, 5000)
+    states = {}
+    for novel_id in range(5000):
+        state = rng.choice((ID_UNKNOWN, ID_INDEXED, ID_DEAD, ID_DEAD, ID_FAILED))
+        index.set(novel_id, state)
+        states[novel_id] = state
+    for start_id, end_id in ((0, 4999), (3, 17), (1234, 4321), (4990, 5010)):
+        expected = [novel_id for novel_id in range(start_id, end_id + 1) if states.get(novel_id, ID_UNKNOWN) in (ID_UNKNOWN, ID_FAILED)]
+        assert list(index.iter_pending(start_id, end_id)) == expected
+        assert index.count_pending(start_id, end_id) == len(expected)
+    index.close()
+
+def test_setting_one_id_leaves_its_neighbours_alone():
+    index = IdStateIndex(None, 16)
+    index.set(5, ID_FAILED)
+    index.set(6, ID_DEAD)
+    index.set(5, ID_INDEXED)
+    assert [index.get(novel_id) for novel_id in range(4, 8)] == [ID_UNKNOWN, ID_INDEXED, ID_DEAD, ID_UNKNOWN]
+    assert index.get(10 ** 7) == ID_UNKNOWN # Past the capacity: unknown, and set() ignores it
+    index.set(10 ** 7, ID_DEAD)
+    index.close()
+
+def test_built_from_the_store_and_kept_in_sync(tmp_path):
+    state_store = CrawlStateStore(str(tmp_path / "state.sqlite3"))
+    state_store.record(1, STATUS_OK, {"id": "000001"}, output_file="out.jsonl")
+    state_store.record(2, STATUS_OK, {"id": "000002"}, output_file="other.jsonl")
+    state_store.record(3, STATUS_DELETED)
+    state_store.record(4, STATUS_NETWORK_ERROR)
+    index = state_store.build_id_index("out.jsonl", str(tmp_path / "index.bin"), 100)
+    assert [index.get(novel_id) for novel_id in range(1, 6)] == [ID_INDEXED, ID_UNKNOWN, ID_DEAD, ID_FAILED, ID_UNKNOWN]
+    state_store.record(4, STATUS_OK, {"id": "000004"}, output_file="out.jsonl")
+    state_store.record(5, STATUS_DELETED)
+    assert list(index.iter_pending(0, 6)) == [0, 2, 6]
+    state_store.close()
@@ -0,0 +1,19 @@
+import NovelpiaLibraryManager
+from NovelpiaRateLimit import SharedRateLimiter, SEARCH_BUCKET
+
+def test_results_are_written_without_chromedriver(tmp_path, monkeypatch):
+    input_file = tmp_path / "BookNames.txt"
+    input_file.write_text("\ufeff첫 소설\n검색 불가\n셋째 소설\n", encoding="utf-8")
+    output_file = tmp_path / "BookIDs.txt"
+    static_answers = {"첫 소설": (True, "000101"), "검색 불가": (False, None), "셋째 소설": (True, "000303")}
+    lookups = []
+    monkeypatch.setattr(NovelpiaLibraryManager, "get_novel_id_static", lambda session, title, rate_limiter: static_answers[title])
+    monkeypatch.setattr(NovelpiaLibraryManager, "find_chromedriver_path", lambda: lookups.append(1))
+    monkeypatch.setattr(NovelpiaLibraryManager, "get_novel_id", lambda title, chromedriver_path: 1 / 0)
+    monkeypatch.setattr(NovelpiaLibraryManager, "SharedRateLimiter",
+                        lambda: SharedRateLimiter(str(tmp_path / "rate_limits.sqlite3"), {SEARCH_BUCKET: (1000.0, 10)}))
+
+    NovelpiaLibraryManager.process_novel_list(str(input_file), str(output_file))
+    # The browser search is unavailable, but what the plain search found is kept
+    assert output_file.read_text(encoding="utf-8").splitlines() == ["첫 소설,000101", "검색 불가,ID_NOT_FOUND", "셋째 소설,000303"]
+    assert len(lookups) == 1
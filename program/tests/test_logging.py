@@ -0,0 +1,32 @@
+import sys
+
+from NovelpiaLogging import LoggingSession, get_logger
+
+def test_warnings_and_errors_reach_stderr(tmp_path, capsys):
+    log_file = str(tmp_path / "log.txt")
+    with LoggingSession(log_file):
+        print("Scraped 10 novels")
+        print("Timeout fetching page 000123", file=sys.stderr)
+        print("Warning: could not parse line", file=sys.stderr)
+        print("\rChecked: 100", end="")
+        sys.stdout.flush()
+        print()
+        get_logger("test").error("ERROR: state store is locked")
+    out, err = capsys.readouterr()
+    assert "Scraped 10 novels\n" in out and "\rChecked: 100" in out
+    assert "Timeout" not in out and "Warning" not in out and "ERROR" not in out
+    assert err.splitlines() == ["Timeout fetching page 000123", "Warning: could not parse line", "ERROR: state store is locked"]
+
+    with open(log_file, encoding="utf-8") as f_read:
+        logged = f_read.read()
+    assert "INFO    Scraped 10 novels" in logged
+    assert "WARNING Timeout fetching page 000123" in logged
+    assert "ERROR   ERROR: state store is locked" in logged
+
+def test_repeated_warnings_are_summarized(tmp_path, capsys):
+    with LoggingSession(str(tmp_path / "log.txt")):
+        for novel_id in range(20):
+            print(f"Timeout fetching page {novel_id:06d}", file=sys.stderr)
+    err = capsys.readouterr().err.splitlines()
+    assert err[:5] == [f"Timeout fetching page {novel_id:06d}" for novel_id in range(5)]
+    assert err[5:] == ["(suppressed 15 more like: Timeout fetching page #)"]
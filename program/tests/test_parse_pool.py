@@ -0,0 +1,83 @@
+import asyncio
+
+import NovelpiaScraper
+from fixture_server import FixtureServer
+from NovelpiaParser import parse_novel_page, select_backend
+from NovelpiaScraper import AdaptiveConcurrencyController, BatchedParsePool, ScrapeContext, process_novel
+from NovelpiaState import CrawlStateStore, STATUS_OK, STATUS_DELETED, STATUS_PARSE_ERROR
+from NovelpiaTransport import HttpTransport
+
+def test_pool_results_match_inline_parsing_in_fewer_round_trips():
+    server = FixtureServer(page_padding=0)
+    pages = [(server.render_page(novel_id)[1], f"{novel_id:06d}") for novel_id in range(1, 65)]
+
+    async def _run():
+        pool = BatchedParsePool(2, select_backend(), batch_size=16)
+        try:
+            return await asyncio.gather(*(pool.parse(html_content, novel_id_str) for html_content, novel_id_str in pages)), pool.batches_submitted
+        finally:
+            pool.shutdown()
+    results, batches = asyncio.run(_run())
+    assert results == [parse_novel_page(html_content, novel_id_str) for html_content, novel_id_str in pages]
+    assert batches == 4
+
+def _crawl(tmp_path, free_port, novel_ids, parse_pool):
+    """process_novel() for each ID against a fixture server. Returns ({id: status}, state store, output lines)."""
+    server = FixtureServer(page_padding=0)
+    state_store = CrawlStateStore(str(tmp_path / "state.sqlite3"))
+    output_file = str(tmp_path / "metadata.jsonl")
+
+    async def _run():
+        NovelpiaScraper.NOVELPIA_BASE_URL = await server.start(port=free_port)
+        try:
+            async with HttpTransport() as transport:
+                ctx = ScrapeContext(state_store, AdaptiveConcurrencyController(), transport.pages, parse_pool=parse_pool)
+                with open(output_file, 'w', encoding='utf-8') as f_output:
+                    return {novel_id_str: (await process_novel(ctx, novel_id_str, f_output, True, False, False, output_file))[0]
+                            for novel_id_str in novel_ids}
+        finally:
+            await server.stop()
+    results = asyncio.run(_run())
+    state_store.flush()
+    with open(output_file, 'r', encoding='utf-8') as f_in:
+        return results, state_store, f_in.readlines()
+
+def _status(state_store, novel_id):
+    return state_store.connection.execute("SELECT status FROM novels WHERE id = ?", (novel_id,)).fetchone()[0]
+
+def test_pages_are_parsed_in_the_pool_and_recorded(tmp_path, free_port, monkeypatch):
+    monkeypatch.setattr(NovelpiaScraper, "NOVELPIA_BASE_URL", NovelpiaScraper.NOVELPIA_BASE_URL) # Restored afterwards; _crawl points it at the fixture
+    parse_pool = BatchedParsePool(1, select_backend(), max_delay=0.001)
+    try:
+        results, state_store, lines = _crawl(tmp_path, free_port, ["000001", "000002", "000003"], parse_pool)
+    finally:
+        parse_pool.shutdown()
+    assert results == {"000001": "found", "000002": "found", "000003": "skipped_forbidden"}
+    assert parse_pool.pages_parsed == 3
+    assert len(lines) == 2
+    assert (_status(state_store, 1), _status(state_store, 3)) == (STATUS_OK, STATUS_DELETED)
+    state_store.close()
+
+def test_a_page_the_parser_raises_on_fails_alone(tmp_path, free_port, monkeypatch):
+    monkeypatch.setattr(NovelpiaScraper, "NOVELPIA_BASE_URL", NovelpiaScraper.NOVELPIA_BASE_URL) # Restored afterwards; _crawl points it at the fixture
+    real_parse = NovelpiaScraper.parse_novel_page
+    def _parse(html_content, novel_id_str, backend=None):
+        if novel_id_str == "000002":
+            raise ValueError("parser bug")
+        return real_parse(html_content, novel_id_str, backend)
+    monkeypatch.setattr(NovelpiaScraper, "parse_novel_page", _parse)
+
+    results, state_store, lines = _crawl(tmp_path, free_port, ["000001", "000002", "000004"], BatchedParsePool(0))
+    assert results == {"000001": "found", "000002": "parse_error", "000004": "found"}
+    assert len(lines) == 2
+    assert _status(state_store, 2) == STATUS_PARSE_ERROR # Not a network error...
+    assert state_store.failed_ids() == [2] # ...but still re-fetched by menu option 7
+    state_store.close()
+
+def test_a_parse_error_keeps_what_was_known(tmp_path):
+    state_store = CrawlStateStore(str(tmp_path / "state.sqlite3"))
+    state_store.record("000005", STATUS_OK, {"id": "000005", "title": "t"})
+    state_store.flush()
+    state_store.record("000005", STATUS_PARSE_ERROR)
+    assert _status(state_store, 5) == STATUS_OK
+    state_store.close()
@@ -0,0 +1,28 @@
+import pytest
+
+from bench_parser import load_corpus, check_backend, _latest_version
+from fixture_server import FixtureServer
+from NovelpiaParser import available_backends, parse_novel_page, PAGE_FOUND, PAGE_DELETED, PAGE_WRONG_ACCESS, PAGE_NO_DATA
+
+_, GOLDEN_PAGES = load_corpus(_latest_version())
+
+@pytest.mark.parametrize("backend", available_backends())
+def test_backend_matches_the_golden_corpus(backend):
+    assert check_backend(backend, GOLDEN_PAGES) == []
+
+def test_backends_agree_on_fixture_pages():
+    server = FixtureServer(page_padding=0)
+    backends = available_backends()
+    for novel_id in range(1, 120):
+        html_content = server.render_page(novel_id)[1]
+        results = [parse_novel_page(html_content, f"{novel_id:06d}", backend) for backend in backends]
+        assert all(result == results[0] for result in results), novel_id
+
+def test_page_statuses():
+    server = FixtureServer(page_padding=0, max_id=100)
+    assert parse_novel_page(server.render_page(1)[1], "000001")[0] == PAGE_FOUND
+    assert parse_novel_page(server.render_page(3)[1], "000003")[0] == PAGE_DELETED
+    assert parse_novel_page(server.render_page(7)[1], "000007")[0] == PAGE_WRONG_ACCESS
+    assert parse_novel_page(server.render_page(53)[1], "000053")[0] == PAGE_NO_DATA
+    assert parse_novel_page(server.render_page(101)[1], "000101")[0] == PAGE_WRONG_ACCESS
+    assert parse_novel_page("", "000001") == (PAGE_NO_DATA, None)
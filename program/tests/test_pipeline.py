@@ -0,0 +1,52 @@
+import asyncio
+import itertools
+
+import pytest
+
+from NovelpiaScraper import run_id_pipeline
+
+def test_every_id_is_handled_once_with_bounded_lookahead():
+    produced = [0]
+    handled = []
+    in_flight = [0, 0] # current, peak
+    lookahead = [0]
+
+    def _ids():
+        for i in range(500):
+            produced[0] += 1
+            lookahead[0] = max(lookahead[0], produced[0] - len(handled))
+            yield f"{i:06d}"
+
+    async def _handle_novel(novel_id_str):
+        in_flight[0] += 1
+        in_flight[1] = max(in_flight[1], in_flight[0])
+        await asyncio.sleep(0.001)
+        in_flight[0] -= 1
+        handled.append(novel_id_str)
+        return True
+
+    assert asyncio.run(run_id_pipeline(_ids(), _handle_novel, worker_count=8, queue_size=16))
+    assert sorted(handled) == [f"{i:06d}" for i in range(500)]
+    assert in_flight[1] == 8
+    assert lookahead[0] <= 16 + 8 + 1 # The queue, one ID per worker and the one being put
+
+def test_a_handler_returning_false_stops_the_pipeline():
+    handled = []
+    novel_ids = (f"{i:06d}" for i in itertools.count())
+
+    async def _handle_novel(novel_id_str):
+        handled.append(novel_id_str)
+        return novel_id_str != "000010"
+
+    assert asyncio.run(run_id_pipeline(novel_ids, _handle_novel, worker_count=4, queue_size=4)) is False
+    assert "000010" in handled
+    assert len(handled) < 40 # The endless ID stream was not drained
+
+def test_handler_errors_propagate():
+    async def _handle_novel(novel_id_str):
+        if novel_id_str == "000003":
+            raise ValueError("boom")
+        return True
+
+    with pytest.raises(ValueError):
+        asyncio.run(run_id_pipeline((f"{i:06d}" for i in range(10)), _handle_novel, worker_count=2, queue_size=2))
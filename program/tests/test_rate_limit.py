@@ -0,0 +1,68 @@
+import time
+import asyncio
+import threading
+import email.utils
+
+import pytest
+
+from NovelpiaRateLimit import SharedRateLimiter, SEARCH_BUCKET, BUCKET_PARENTS, parse_retry_after
+
+@pytest.fixture
+def limiter_path(tmp_path):
+    return str(tmp_path / "rate_limits.sqlite3")
+
+def test_a_burst_then_the_refill_rate(limiter_path):
+    rate_limiter = SharedRateLimiter(limiter_path, {"example.com": (10.0, 2)})
+    try:
+        assert rate_limiter._take("example.com") == 0.0
+        assert rate_limiter._take("example.com") == 0.0
+        assert 0.05 < rate_limiter._take("example.com") <= 0.1
+    finally:
+        rate_limiter.close()
+
+def test_processes_share_one_budget(limiter_path):
+    first = SharedRateLimiter(limiter_path, {"example.com": (0.1, 1)})
+    second = SharedRateLimiter(limiter_path, {"example.com": (0.1, 1)})
+    try:
+        assert first._take("example.com") == 0.0
+        assert second._take("example.com") > 0.0
+    finally:
+        first.close()
+        second.close()
+
+def test_a_search_also_takes_from_the_host_bucket(limiter_path):
+    host = BUCKET_PARENTS[SEARCH_BUCKET]
+    rate_limiter = SharedRateLimiter(limiter_path, {SEARCH_BUCKET: (100.0, 5), host: (0.1, 2)})
+    try:
+        assert rate_limiter._take(SEARCH_BUCKET) == 0.0
+        assert rate_limiter._take(host) == 0.0 # The scraper's page fetch uses up the host's burst
+        assert rate_limiter._take(SEARCH_BUCKET) > 1.0 # The search bucket still has tokens, the host doesn't
+        assert rate_limiter._take(host) > 1.0
+    finally:
+        rate_limiter.close()
+
+def test_throttling_answers_block_the_bucket_off_the_loop(limiter_path):
+    rate_limiter = SharedRateLimiter(limiter_path, {"example.com": (100.0, 10)})
+    block_threads = []
+    block = rate_limiter.block
+    rate_limiter.block = lambda bucket, seconds: (block_threads.append(threading.get_ident()), block(bucket, seconds))
+
+    async def _report(status, retry_after):
+        await rate_limiter.report_response_async("example.com", status, retry_after)
+    try:
+        asyncio.run(_report(200, None))
+        asyncio.run(_report(503, None)) # An outage, not throttling
+        assert rate_limiter._take("example.com") == 0.0
+        asyncio.run(_report(429, "30"))
+        assert 29.0 < rate_limiter._take("example.com") <= 30.0
+        assert len(block_threads) == 1 and block_threads[0] != threading.get_ident()
+        assert rate_limiter.stats()["blocks"] == 1
+    finally:
+        rate_limiter.close()
+
+def test_retry_after_values():
+    assert parse_retry_after("120") == 120.0
+    assert parse_retry_after("86400") == 600.0 # Capped
+    assert 50.0 < parse_retry_after(email.utils.formatdate(time.time() + 60, usegmt=True)) <= 60.0
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
@@ -0,0 +1,52 @@
+import asyncio
+import json
+import sqlite3
+
+import NovelpiaScraper
+from fixture_server import FixtureServer
+from NovelpiaParser import parse_novel_page
+from NovelpiaScraper import refresh_metadata
+from NovelpiaState import STATE_DB_FILE
+
+NOVEL_IDS = (1, 2, 3, 4, 5) # 3 has been deleted since it was indexed
+
+def _refresh(server, port, capsys):
+    """One refresh_metadata() run against the fixture server; returns its result counts."""
+    async def _run():
+        await server.start(port=port)
+        try:
+            await refresh_metadata(1, 10)
+        finally:
+            await server.stop()
+    asyncio.run(_run())
+    results = [line for line in capsys.readouterr().out.splitlines() if line.startswith("Refresh results: ")]
+    return json.loads(results[-1][len("Refresh results: "):])
+
+def test_refresh_rewrites_only_changed_records(tmp_path, monkeypatch, capsys, free_port):
+    monkeypatch.chdir(tmp_path)
+    for name, value in (("RATE_LIMIT_ENABLED", False), ("HTML_CACHE_ENABLED", False), ("PARSER_PROCESS_COUNT", 0), ("REFRESH_REQUEST_BUDGET", None)):
+        monkeypatch.setattr(NovelpiaScraper, name, value)
+    server = FixtureServer(page_padding=0)
+    server.base_url = f"http://127.0.0.1:{free_port}" # What start() will set; the indexed cover URLs must match
+    monkeypatch.setattr(NovelpiaScraper, "NOVELPIA_BASE_URL", server.base_url)
+    indexed = {novel_id: parse_novel_page(server.render_page(novel_id if novel_id != 3 else 1)[1], f"{novel_id:06d}")[1] for novel_id in NOVEL_IDS}
+    with open(NovelpiaScraper.OUTPUT_FILE_METADATA, 'w', encoding='utf-8') as f_output:
+        f_output.writelines(json.dumps(indexed[novel_id], ensure_ascii=False) + '\n' for novel_id in NOVEL_IDS)
+
+    # First visit: no validators yet, so every page is fetched and compared by content hash
+    assert _refresh(server, free_port, capsys) == {"checked": 5, "not_modified": 0, "unchanged": 4, "changed": 0, "removed": 1, "network_error": 0, "parse_error": 0}
+
+    server.revisions[4] = 1 # Edited on the site: new like count and ETag
+    db = sqlite3.connect(STATE_DB_FILE)
+    with db:
+        db.execute("UPDATE refresh_schedule SET next_due = 0") # Due again now
+    db.close()
+    # Second visit: the ETags from the first are sent back, so only the edited page is re-sent
+    assert _refresh(server, free_port, capsys) == {"checked": 4, "not_modified": 3, "unchanged": 0, "changed": 1, "removed": 0, "network_error": 0, "parse_error": 0}
+    assert server.stats["not_modified"] == 3
+
+    with open(NovelpiaScraper.OUTPUT_FILE_METADATA, encoding='utf-8') as f_read:
+        records = [json.loads(line) for line in f_read]
+    assert [record["id"] for record in records] == ["000001", "000002", "000004", "000005"]
+    assert records[2] != indexed[4] and records[2]["id"] == "000004"
+    assert [records[0], records[1], records[3]] == [indexed[1], indexed[2], indexed[5]]
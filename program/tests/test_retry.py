@@ -0,0 +1,52 @@
+import asyncio
+from collections import Counter
+
+from NovelpiaScraper import RetryQueue, run_id_pipeline
+from NovelpiaState import CrawlStateStore, STATUS_OK
+
+def _crawl(novel_ids, failures, state_store, max_attempts=2):
+    """Runs the pipeline like crawl_shard does. `failures` maps an ID to how many of its fetches fail
+    (None = all of them). Returns (attempts per ID, the retry queue, the pipeline's result).
+    """
+    attempts = Counter()
+    retry_queue = RetryQueue(max_attempts, base_delay=0.01, max_delay=0.02, on_give_up=state_store.add_dead_letter)
+
+    async def _handle_novel(novel_id_str):
+        attempts[novel_id_str] += 1
+        failing = failures.get(novel_id_str, 0)
+        if failing is None or attempts[novel_id_str] <= failing:
+            await asyncio.sleep(0)
+            retry_queue.schedule(novel_id_str)
+            return True
+        retry_queue.completed(novel_id_str)
+        state_store.record(novel_id_str, STATUS_OK)
+        return True
+
+    finished = asyncio.run(run_id_pipeline(novel_ids, _handle_novel, worker_count=4, queue_size=2, retry_queue=retry_queue))
+    return attempts, retry_queue, finished
+
+def test_failed_fetches_are_retried_until_they_succeed(tmp_path):
+    state_store = CrawlStateStore(str(tmp_path / "state.sqlite3"))
+    novel_ids = [f"{i:06d}" for i in range(1, 21)]
+    attempts, retry_queue, finished = _crawl(novel_ids, {"000003": 1, "000011": 2}, state_store)
+    assert finished
+    assert attempts["000003"] == 2
+    assert attempts["000011"] == 3
+    assert all(attempts[novel_id] == 1 for novel_id in novel_ids if novel_id not in ("000003", "000011"))
+    assert retry_queue.counts == {"retries": 3, "recovered": 2, "dead_lettered": 0}
+    assert state_store.failed_ids() == []
+    state_store.close()
+
+def test_ids_that_keep_failing_go_on_the_dead_letter_list(tmp_path):
+    state_store = CrawlStateStore(str(tmp_path / "state.sqlite3"))
+    attempts, retry_queue, finished = _crawl([f"{i:06d}" for i in range(1, 11)], {"000004": None, "000007": None}, state_store)
+    assert finished # The pipeline waits for every retry, then ends instead of looping
+    assert attempts["000004"] == attempts["000007"] == 3 # First try + max_attempts retries
+    assert retry_queue.counts["dead_lettered"] == 2
+    assert state_store.failed_ids() == [4, 7]
+    assert state_store.dead_letter_count() == 2
+
+    # A later answer takes the ID off the list
+    state_store.record("000004", STATUS_OK)
+    assert state_store.failed_ids() == [7]
+    state_store.close()
@@ -0,0 +1,65 @@
+import random
+
+import NovelpiaScheduler
+from NovelpiaScheduler import DensityScheduler, next_refresh_interval, next_refresh_due, DENSITY_SPARSE_SAMPLE_SIZE
+from NovelpiaState import IdStateIndex, ID_DEAD
+
+def _scheduler(block_counts, dead_ids=(), seed=1):
+    id_index = IdStateIndex(None, 4000)
+    for novel_id in dead_ids:
+        id_index.set(novel_id, ID_DEAD)
+    return DensityScheduler(id_index, block_counts, 0, 3999, block_size=1000, seed=seed), id_index
+
+def test_dense_blocks_come_first_and_sparse_ones_are_sampled():
+    # Block 0 is nearly dead, block 2 mostly live, blocks 1 and 3 unvisited
+    scheduler, id_index = _scheduler({0: (1, 499), 2: (400, 100)}, dead_ids=range(0, 500))
+    try:
+        assert scheduler.deferred_at_start() == (1, 500 - DENSITY_SPARSE_SAMPLE_SIZE)
+        novel_ids = list(scheduler.iter_ids())
+        assert novel_ids[0] == 2000
+        assert len(novel_ids) == len(set(novel_ids))
+        sampled = [novel_id for novel_id in novel_ids if novel_id < 1000]
+        assert len(sampled) == DENSITY_SPARSE_SAMPLE_SIZE and min(sampled) >= 500 # Only pending IDs
+        assert set(novel_ids) - set(sampled) == set(range(1000, 4000))
+        assert scheduler.stats()["ids_left_in_sparse_blocks"] == 500 - DENSITY_SPARSE_SAMPLE_SIZE
+    finally:
+        id_index.close()
+
+def test_sweeping_sparse_blocks_defers_nothing(monkeypatch):
+    monkeypatch.setattr(NovelpiaScheduler, "DENSITY_SWEEP_SPARSE_BLOCKS", True)
+    scheduler, id_index = _scheduler({0: (1, 499)}, dead_ids=range(0, 500))
+    try:
+        assert scheduler.deferred_at_start() == (1, 0)
+        assert sorted(scheduler.iter_ids()) == list(range(500, 4000))
+    finally:
+        id_index.close()
+
+def test_observations_reorder_the_blocks():
+    scheduler, id_index = _scheduler({})
+    try:
+        novel_ids = scheduler.iter_ids()
+        first = next(novel_ids) # Every block is equal: the lowest goes first
+        assert first == 0
+        for novel_id in range(1000, 1150): # Block 1 turns out dead
+            scheduler.observe(novel_id, False)
+        for novel_id in range(2000, 2150): # Block 2 turns out live
+            scheduler.observe(novel_id, True)
+        rest = [next(novel_ids) for _ in range(100)]
+        assert rest[49] == 2000 # Block 0's chunk finishes, then block 2 is next
+    finally:
+        id_index.close()
+
+def test_refresh_interval_backs_off_within_bounds():
+    day = NovelpiaScheduler.DAY
+    assert next_refresh_interval(None, False, "연재중") == NovelpiaScheduler.REFRESH_MIN_INTERVAL
+    assert next_refresh_interval(None, False, "완결") == NovelpiaScheduler.REFRESH_SETTLED_MIN_INTERVAL
+    assert next_refresh_interval(4 * day, False, "연재중") == 8 * day
+    assert next_refresh_interval(4 * day, True, "연재중") == 2 * day
+    assert next_refresh_interval(1 * day, True, "연재중") == NovelpiaScheduler.REFRESH_MIN_INTERVAL
+    assert next_refresh_interval(100 * day, False, "완결") == NovelpiaScheduler.REFRESH_MAX_INTERVAL
+
+    rng = random.Random(3)
+    dues = [next_refresh_due(1000.0, 10 * day, rng) for _ in range(100)]
+    jitter = NovelpiaScheduler.REFRESH_JITTER * 10 * day
+    assert all(1000.0 + 10 * day - jitter <= due <= 1000.0 + 10 * day + jitter for due in dues)
+    assert len(set(dues)) == 100 # Novels checked together drift apart
@@ -0,0 +1,88 @@
+import json
+
+import NovelpiaState
+
+from NovelpiaState import (
+    CrawlStateStore, STATUS_OK, STATUS_DELETED, STATUS_WRONG_ACCESS, STATUS_NETWORK_ERROR,
+)
+
+def _statuses(state_store):
+    state_store.flush()
+    return dict(state_store.connection.execute("SELECT id, status FROM novels"))
+
+def test_legacy_files_are_imported_once(tmp_path):
+    forbidden_file = tmp_path / "forbidden.txt"
+    forbidden_file.write_text("000003\n000006\nnot an id\n", encoding='utf-8')
+    metadata_file = tmp_path / "metadata.jsonl"
+    metadata_file.write_text(
+        json.dumps({"id": "000001", "title": "a", "cover_local_path": "novelpia_covers/000001.jpg"}) + "\n"
+        + "{broken\n" + json.dumps({"id": "000002", "title": "b"}) + "\n", encoding='utf-8'
+    )
+    titles_file = tmp_path / "titles.txt"
+    titles_file.write_text("Some title, 000004\nAnother, title, 000005\n", encoding='utf-8')
+
+    state_store = CrawlStateStore(str(tmp_path / "state.sqlite3"))
+    assert state_store.import_forbidden_file(str(forbidden_file)) == 2
+    assert state_store.import_output_file(str(metadata_file), True) == 2
+    assert state_store.import_output_file(str(titles_file), False) == 2
+    assert state_store.import_forbidden_file(str(forbidden_file)) == 0 # Already imported
+    assert state_store.import_output_file(str(metadata_file), True) == 0
+    state_store.close()
+
+    state_store = CrawlStateStore(str(tmp_path / "state.sqlite3")) # Persisted
+    assert _statuses(state_store) == {1: STATUS_OK, 2: STATUS_OK, 3: STATUS_DELETED, 4: STATUS_OK, 5: STATUS_OK, 6: STATUS_DELETED}
+    assert state_store.count_in_output(str(metadata_file)) == 2
+    assert state_store.cover_states() == {1: "novelpia_covers/000001.jpg"}
+    state_store.close()
+
+def test_records_are_buffered_and_network_errors_never_overwrite(tmp_path):
+    state_store = CrawlStateStore(str(tmp_path / "state.sqlite3"), commit_every=100, commit_interval=3600)
+    state_store.record("000001", STATUS_OK, {"id": "000001"}, output_file="out.jsonl")
+    state_store.record("000002", STATUS_WRONG_ACCESS)
+    assert state_store.connection.execute("SELECT COUNT(*) FROM novels").fetchone()[0] == 0 # Not committed yet
+    state_store.record("000002", STATUS_NETWORK_ERROR)
+    state_store.record("000009", STATUS_NETWORK_ERROR)
+    assert _statuses(state_store) == {1: STATUS_OK, 2: STATUS_WRONG_ACCESS, 9: STATUS_NETWORK_ERROR}
+    assert state_store.failed_ids() == [9]
+    assert state_store.max_id() == 9
+    assert state_store.max_id(STATUS_OK, STATUS_DELETED) == 1
+    state_store.close()
+
+def test_block_counts(tmp_path):
+    state_store = CrawlStateStore(str(tmp_path / "state.sqlite3"))
+    for novel_id in range(0, 300):
+        state_store.record(novel_id, STATUS_OK if novel_id < 100 or novel_id % 10 == 0 else STATUS_DELETED)
+    assert state_store.block_counts(100, 0, 299) == {0: (100, 0), 1: (10, 90), 2: (10, 90)}
+    assert state_store.block_counts(100, 100, 199) == {1: (10, 90)}
+    state_store.close()
+
+def test_due_refreshes_come_most_overdue_first(tmp_path, monkeypatch):
+    monkeypatch.setattr(NovelpiaState, "REFRESH_PAGE_SIZE", 2) # Several keyset pages
+    state_store = CrawlStateStore(str(tmp_path / "state.sqlite3"))
+    try:
+        for novel_id in range(1, 8):
+            state_store.record(novel_id, STATUS_OK, {"id": f"{novel_id:06d}"}, output_file="metadata.jsonl")
+        for novel_id, next_due in ((2, 50.0), (3, 10.0), (4, 500.0), (5, 10.0), (6, 90.0)):
+            state_store.schedule_refresh(novel_id, next_due, 86400.0, "연재중")
+        state_store.record(8, STATUS_OK, {"id": "000008"}, output_file="other.jsonl")
+        assert tuple(state_store.refresh_backlog("metadata.jsonl", 100.0)) == (6, 7)
+
+        due = []
+        for row in state_store.iter_due_refreshes("metadata.jsonl", 0, 10, 100.0):
+            due.append(row[0])
+            state_store.schedule_refresh(row[0], 200.0, 172800.0) # Checked: no longer due, must not come back
+            state_store.flush()
+        # Never-refreshed novels (1, 7) first, then by due time; 4 is not due yet
+        assert due == [1, 7, 3, 5, 2, 6]
+        assert [row[0] for row in state_store.iter_due_refreshes("metadata.jsonl", 0, 10, 300.0, limit=3)] == [1, 2, 3]
+        assert list(state_store.iter_due_refreshes("metadata.jsonl", 0, 10, 100.0)) == []
+    finally:
+        state_store.close()
+
+def test_cover_states_set_later_win_over_buffered_records(tmp_path):
+    state_store = CrawlStateStore(str(tmp_path / "state.sqlite3"), commit_every=100, commit_interval=3600)
+    state_store.record("000001", STATUS_OK, {"id": "000001"}, cover_state="novelpia_covers/000001.png")
+    state_store.record("000002", STATUS_OK, {"id": "000002"}, cover_state="novelpia_covers/000002.png")
+    state_store.set_cover_states({"000001": "EVICTED", "000003": "EVICTED"}) # 3 was never recorded
+    assert state_store.cover_states() == {1: "EVICTED", 2: "novelpia_covers/000002.png"}
+    state_store.close()
@@ -0,0 +1,66 @@
+import asyncio
+import json
+
+import aiohttp
+import pytest
+
+from NovelpiaStats import StageHistogram, ScrapeStats, StatsExporter, LATENCY_BUCKETS
+
+def test_histogram_quantiles_interpolate_within_buckets():
+    histogram = StageHistogram((1.0, 2.0, 4.0))
+    assert histogram.quantile(0.5) is None
+    for value in (0.5, 1.5, 1.5, 3.0):
+        histogram.observe(value)
+    assert histogram.buckets == [1, 2, 1, 0]
+    assert histogram.quantile(0.25) == pytest.approx(1.0)
+    assert histogram.quantile(0.5) == pytest.approx(1.5)
+    assert histogram.quantile(1.0) == pytest.approx(3.0) # Never past the largest value seen
+    assert histogram.summary()["count"] == 4 and histogram.summary()["mean"] == pytest.approx(1.625)
+
+def test_diagnosis_follows_the_slowest_stage():
+    stats = ScrapeStats()
+    assert stats.diagnosis() is None
+    stats.increment("fetch_ok", 100)
+    for _ in range(10):
+        stats.observe("fetch", 0.2)
+        stats.observe("parse", 0.01)
+    assert stats.diagnosis() == "network-bound"
+    for _ in range(20):
+        stats.observe("parse", 1.0)
+    assert stats.diagnosis() == "cpu-bound"
+    stats.increment("fetch_throttled", 5)
+    assert stats.diagnosis() == "rate-limited"
+
+def test_snapshot_and_prometheus_views(tmp_path, free_port):
+    stats = ScrapeStats()
+    stats.observe("fetch", 0.003)
+    stats.observe("page_bytes", 5000)
+    stats.increment("found")
+    stats.add_gauge("concurrency", lambda: 7)
+    json_path = str(tmp_path / "stats.json")
+
+    async def _run():
+        exporter = StatsExporter(stats, json_path, interval=60.0, prometheus_port=free_port)
+        await exporter.start()
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(f"http://127.0.0.1:{free_port}/metrics") as response:
+                    metrics = await response.text()
+                async with session.get(f"http://127.0.0.1:{free_port}/stats.json") as response:
+                    served = await response.json()
+        finally:
+            await exporter.stop() # Writes the final snapshot
+        return metrics, served
+    metrics, served = asyncio.run(_run())
+
+    with open(json_path, encoding='utf-8') as f_read:
+        written = json.load(f_read)
+    for snapshot in (served, written):
+        assert snapshot["counters"] == {"found": 1}
+        assert snapshot["gauges"] == {"concurrency": 7}
+        assert snapshot["stages"]["fetch"]["count"] == 1 and snapshot["stages"]["fetch"]["unit"] == "seconds"
+    assert f'novelpia_fetch_seconds_bucket{{le="{LATENCY_BUCKETS[1]:g}"}} 0' in metrics
+    assert f'novelpia_fetch_seconds_bucket{{le="{LATENCY_BUCKETS[2]:g}"}} 1' in metrics
+    assert "novelpia_page_bytes_count 1" in metrics
+    assert 'novelpia_outcomes_total{outcome="found"} 1' in metrics
+    assert "novelpia_concurrency 7" in metrics